@@ -9,7 +9,7 @@ import settings
 from helpers import validate_command, execute_routeros_command, require_api_key, logger, execute_routeros_bulk_commands
 from main.admin.routes import init
 from main.api import init_api
-from main.command import CommandExecutor
+from main.api_handlers import run_host_command
 from main.dir_manager import VPNManager
 from main.log_manager import init_logger
 from main.middleware import init_middleware
@@ -97,17 +97,6 @@ def mtk_create_new_provision(provision_identity):
         return jsonify({"error": "Internal server error", "message": str(e)}), 500
 
 
-def run_host_command(command):
-    executor = CommandExecutor(private_key_path='/app/ssh/id_host_access')
-    try:
-        if executor.connect():
-            result = executor.execute_command(command)
-            return result
-        return {"success": False, "error": "Failed to connect to host"}
-    finally:
-        executor.close()
-
-
 @app.route('/mikrotik/openvpn/<client_name>')
 def get_client_config(client_name):
     return VPNManager.download_client_config(client_name)
@@ -34,4 +34,18 @@ tmp_upload_dir = None
 keyfile = None
 certfile = None
 
-preload_app = True
\ No newline at end of file
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Background threads belong to the workers: the preloaded master never starts any, and
+    # each worker connects to the management interface, schedules expiry events and fills
+    # its key pool as soon as it is forked
+    from main.api import vpn_manager
+    from main.dir_manager import VPNManager
+    vpn_manager.sessions.start()
+    vpn_manager.expiry.start()
+    # Keep pre-generated client keys ready so provisioning only has to sign
+    issuer = VPNManager.issuer()
+    if issuer.key_pool and issuer.available():
+        issuer.key_pool.start()
@@ -5,6 +5,7 @@ from typing import Dict, Any, Tuple, Optional, List
 import librouteros
 from flask import request, jsonify
 from settings import CONFIG
+from main import deadline
 
 logging.basicConfig(
     level=logging.INFO,
@@ -72,7 +73,7 @@ def execute_routeros_command(
             username=username,
             password=password,
             port=CONFIG["router_port"],
-            timeout=CONFIG["connection_timeout"]
+            timeout=deadline.timeout(CONFIG["connection_timeout"])
         )
 
         # Parse command into path components
@@ -199,7 +200,7 @@ def execute_routeros_bulk_commands(
             username=username,
             password=password,
             port=CONFIG["router_port"],
-            timeout=CONFIG["connection_timeout"]
+            timeout=deadline.timeout(CONFIG["connection_timeout"])
         )
 
         # Process each operation
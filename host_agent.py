@@ -0,0 +1,315 @@
+"""
+Host agent for the VPN dashboard.
+
+Runs on the OpenVPN host and answers JSON-RPC 2.0 requests on a Unix socket that is
+mounted into the container, so the app no longer needs an SSH session and a shell to
+inspect services, logs and certificates. Messages are newline-delimited JSON. A
+streaming method sends any number of ``{"id": ..., "stream": chunk}`` messages before
+its final result.
+
+Usage:
+    python3 host_agent.py --socket /run/g3-agent/agent.sock
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import re
+import socketserver
+import subprocess
+import tarfile
+import time
+
+DEFAULT_SOCKET = "/run/g3-agent/agent.sock"
+
+OPENVPN_DIR = "/etc/openvpn"
+EASYRSA_DIR = os.path.join(OPENVPN_DIR, "server", "easy-rsa")
+
+
+def _openssl_args(args):
+    # Version and certificate/CRL inspection only; nothing that writes a file
+    return bool(args) and args[0] in ("version", "x509", "crl") and not {"-out", "-keyout"} & set(args)
+
+
+def _tar_args(args):
+    # Only the config backup: tar -czf <OPENVPN_DIR>/backups/openvpn_config_<timestamp>.tar.gz <OPENVPN_DIR>
+    return (len(args) == 3 and args[0] == "-czf" and args[2] == OPENVPN_DIR
+            and os.path.dirname(args[1]) == os.path.join(OPENVPN_DIR, "backups")
+            and re.fullmatch(r"openvpn_config_\d{8}_\d{6}\.tar\.gz", os.path.basename(args[1])) is not None)
+
+
+def _easyrsa_args(args):
+    options = [a for a in args if a.startswith("--")]
+    commands = [a for a in args if not a.startswith("--")]
+    return (all(a == "--batch" or a.startswith("--days=") for a in options)
+            and bool(commands) and commands[0] in ("build-client-full", "revoke", "gen-crl")
+            and not any("/" in a for a in commands))
+
+
+# Executables the generic `exec` method may run: name -> (the absolute path that is run,
+# check of its arguments or None for read-only tools). argv[0] must be the bare name or
+# resolve to that path; anything else with the same basename is refused.
+ALLOWED_EXECUTABLES = {
+    "systemctl": ("/usr/bin/systemctl", None),
+    "openssl": ("/usr/bin/openssl", _openssl_args),
+    "openvpn": ("/usr/sbin/openvpn", lambda args: args == ["--version"]),
+    "grep": ("/usr/bin/grep", None),
+    "tail": ("/usr/bin/tail", None),
+    "ps": ("/usr/bin/ps", None),
+    "df": ("/usr/bin/df", None),
+    "ufw": ("/usr/sbin/ufw", lambda args: args[:1] == ["status"] and len(args) <= 2),
+    "tar": ("/usr/bin/tar", _tar_args),
+    "easyrsa": (os.path.join(EASYRSA_DIR, "easyrsa"), _easyrsa_args),
+}
+
+# Working directories `exec` accepts (besides none at all), for the executables that need one
+ALLOWED_CWDS = {"easyrsa": EASYRSA_DIR}
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+NOT_ALLOWED = -32000
+
+logger = logging.getLogger("host_agent")
+
+
+def encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def _require(params, name):
+    if name not in params:
+        raise RpcError(INVALID_PARAMS, f"Missing parameter: {name}")
+    return params[name]
+
+
+def _exec(params):
+    argv = _require(params, "argv")
+    if not isinstance(argv, list) or not argv or not all(isinstance(a, str) for a in argv):
+        raise RpcError(INVALID_PARAMS, "argv must be a non-empty list of strings")
+    name = os.path.basename(argv[0])
+    cwd = params.get("cwd")
+    if name not in ALLOWED_EXECUTABLES:
+        raise RpcError(NOT_ALLOWED, f"Executable not allowed: {argv[0]}")
+    path, check = ALLOWED_EXECUTABLES[name]
+    if argv[0] != name and os.path.normpath(os.path.join(cwd or "/", argv[0])) != path:
+        raise RpcError(NOT_ALLOWED, f"Executable not allowed: {argv[0]}")
+    if cwd is not None and cwd.rstrip("/") != ALLOWED_CWDS.get(name):
+        raise RpcError(NOT_ALLOWED, f"Working directory not allowed for {name}: {cwd}")
+    if check and not check(argv[1:]):
+        raise RpcError(NOT_ALLOWED, f"Arguments not allowed for {name}")
+
+    try:
+        proc = subprocess.run([path] + argv[1:], capture_output=True, text=True, cwd=cwd,
+                              timeout=params.get("timeout"))
+        return {"stdout": proc.stdout, "stderr": proc.stderr, "exit_code": proc.returncode}
+    except FileNotFoundError as e:
+        return {"stdout": "", "stderr": str(e), "exit_code": 127}
+    except subprocess.TimeoutExpired:
+        return {"stdout": "", "stderr": "Command timed out", "exit_code": 124}
+
+
+def _exec_batch(params):
+    commands = _require(params, "commands")
+    results = []
+    for argv in commands:
+        try:
+            results.append(_exec({"argv": argv, "timeout": params.get("timeout")}))
+        except RpcError as e:
+            results.append({"stdout": "", "stderr": e.message, "exit_code": 126})
+    return results
+
+
+def _service_status(params):
+    unit = _require(params, "unit")
+    proc = subprocess.run(
+        ["systemctl", "show", unit, "--property=ActiveState,MainPID,ExecMainStartTimestamp"],
+        capture_output=True, text=True
+    )
+    props = dict(line.split("=", 1) for line in proc.stdout.splitlines() if "=" in line)
+    return {
+        "unit": unit,
+        "active_state": props.get("ActiveState", "unknown"),
+        "main_pid": int(props.get("MainPID") or 0),
+        "start_timestamp": props.get("ExecMainStartTimestamp", "")
+    }
+
+
+def _read_tail(path, lines):
+    """Return the last `lines` lines of a file and the offset of its end"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        block = 8192
+        pos = end
+        data = b""
+        while pos > 0 and data.count(b"\n") <= lines:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+        text = data.decode("utf-8", errors="replace").splitlines()
+        return text[-lines:] if lines else [], end
+
+
+def _file_tail(params, emit):
+    path = _require(params, "path")
+    lines, offset = _read_tail(path, int(params.get("lines", 10)))
+    if not params.get("follow"):
+        return {"lines": lines}
+
+    emit({"lines": lines})
+    interval = float(params.get("interval", 1.0))
+    deadline = time.monotonic() + float(params.get("duration", 60))
+    while time.monotonic() < deadline:
+        if os.path.getsize(path) < offset:
+            offset = 0  # truncated or rotated
+        with open(path, "rb") as f:
+            f.seek(offset)
+            chunk = f.read()
+        if chunk:
+            # Only emit complete lines; keep a partial last line for the next round
+            complete = chunk[:chunk.rfind(b"\n") + 1]
+            if complete:
+                offset += len(complete)
+                emit({"lines": complete.decode("utf-8", errors="replace").splitlines()})
+        time.sleep(interval)
+    return {"offset": offset}
+
+
+def _cert_inspect(params):
+    path = _require(params, "path")
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes
+        cert = x509.load_pem_x509_certificate(data) if b"-----BEGIN" in data else x509.load_der_x509_certificate(data)
+        cn = cert.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)
+        return {
+            "cn": cn[0].value if cn else "",
+            "serial": format(cert.serial_number, "X"),
+            "not_before": cert.not_valid_before_utc.isoformat(),
+            "not_after": cert.not_valid_after_utc.isoformat(),
+            "fingerprint": cert.fingerprint(hashes.SHA256()).hex()
+        }
+    except ImportError:
+        proc = subprocess.run(
+            ["openssl", "x509", "-in", path, "-noout", "-subject", "-serial", "-startdate", "-enddate",
+             "-fingerprint", "-sha256"],
+            capture_output=True, text=True
+        )
+        fields = dict(line.split("=", 1) for line in proc.stdout.splitlines() if "=" in line)
+        return {
+            "cn": fields.get("subject", "").rsplit("CN", 1)[-1].lstrip(" =").strip(),
+            "serial": fields.get("serial", ""),
+            "not_before": fields.get("notBefore", ""),
+            "not_after": fields.get("notAfter", ""),
+            "fingerprint": fields.get("sha256 Fingerprint", fields.get("SHA256 Fingerprint", "")).replace(":", "").lower()
+        }
+
+
+def _backup(params, emit):
+    source = _require(params, "source")
+    dest_dir = _require(params, "dest_dir")
+    os.makedirs(dest_dir, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(dest_dir, f"openvpn_config_{timestamp}.tar.gz")
+
+    count = 0
+
+    def _progress(info):
+        nonlocal count
+        count += 1
+        if count % 100 == 0:
+            emit({"files": count})
+        return info
+
+    with tarfile.open(path, "w:gz") as tar:
+        tar.add(source, arcname=os.path.basename(source.rstrip("/")),
+                filter=lambda info: None if info.name.endswith(".tar.gz") else _progress(info))
+    return {"path": path, "files": count}
+
+
+# method name -> (handler, streaming)
+METHODS = {
+    "exec": (_exec, False),
+    "exec.batch": (_exec_batch, False),
+    "service.status": (_service_status, False),
+    "file.tail": (_file_tail, True),
+    "cert.inspect": (_cert_inspect, False),
+    "backup": (_backup, True),
+}
+
+
+class AgentHandler(socketserver.StreamRequestHandler):
+    def _send(self, message):
+        self.wfile.write(encode(message))
+        self.wfile.flush()
+
+    def handle(self):
+        # One connection may carry any number of requests, answered in order
+        for line in self.rfile:
+            request_id = None
+            try:
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    raise RpcError(PARSE_ERROR, "Invalid JSON")
+                if not isinstance(request, dict) or "method" not in request:
+                    raise RpcError(INVALID_REQUEST, "Invalid request")
+
+                request_id = request.get("id")
+                method = request["method"]
+                if method not in METHODS:
+                    raise RpcError(METHOD_NOT_FOUND, f"Unknown method: {method}")
+
+                handler, streaming = METHODS[method]
+                params = request.get("params") or {}
+                if streaming:
+                    result = handler(params, lambda chunk: self._send(
+                        {"jsonrpc": "2.0", "id": request_id, "stream": chunk}))
+                else:
+                    result = handler(params)
+                self._send({"jsonrpc": "2.0", "id": request_id, "result": result})
+            except RpcError as e:
+                self._send({"jsonrpc": "2.0", "id": request_id, "error": {"code": e.code, "message": e.message}})
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            except Exception as e:
+                logger.exception("Error handling agent request")
+                self._send({"jsonrpc": "2.0", "id": request_id,
+                            "error": {"code": INTERNAL_ERROR, "message": str(e)}})
+
+
+class HostAgentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path=DEFAULT_SOCKET, mode=0o660):
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    with HostAgentServer(socket_path, AgentHandler) as server:
+        os.chmod(socket_path, mode)
+        logger.info(f"Host agent listening on {socket_path}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VPN dashboard host agent")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket path")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    serve(args.socket)
@@ -6,6 +6,7 @@ from typing import Optional, List, Dict
 import pymysql
 from pymysql.cursors import DictCursor
 from lom_mtk.models import LomTechClient, LomTechPackage
+from lom_mtk.utility import request_timeout
 
 
 class LomTechDatabaseManager:
@@ -44,7 +45,8 @@ class LomTechDatabaseManager:
                 database=self.database,
                 port=self.port,
                 charset='utf8mb4',
-                cursorclass=DictCursor
+                cursorclass=DictCursor,
+                connect_timeout=request_timeout(10)
             )
             self.logger.info(f"Connected to database {self.database}")
             return True
@@ -2,7 +2,7 @@ import logging
 
 from librouteros import connect
 
-from lom_mtk.utility import LomTechLogger
+from lom_mtk.utility import LomTechLogger, request_timeout
 
 
 class LomTechMikrotik:
@@ -36,7 +36,8 @@ class LomTechMikrotik:
                 username=self.username,
                 password=self.password,
                 host=self.host,
-                port=self.port
+                port=self.port,
+                timeout=request_timeout(10)
             )
             self.logger.info("Connection successful")
             return True
@@ -1,5 +1,11 @@
 import logging
 
+try:
+    from main.deadline import timeout as request_timeout
+except ImportError:  # Used outside the dashboard: no request deadlines
+    def request_timeout(default):
+        return default
+
 
 class LomTechLogger:
     """Logger class for LomTech Mikrotik automation package."""
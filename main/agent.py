@@ -0,0 +1,134 @@
+import itertools
+import json
+import logging
+import socket
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import settings
+from host_agent import encode
+from main.exceptions import HostAgentError
+
+
+@dataclass
+class ServiceStatus:
+    unit: str
+    active_state: str
+    main_pid: int
+    start_timestamp: str
+
+
+@dataclass
+class CertInfo:
+    cn: str
+    serial: str
+    not_before: str
+    not_after: str
+    fingerprint: str
+
+
+class HostAgentClient:
+    """
+    Client for the host agent (see host_agent.py) listening on a mounted Unix socket.
+
+    Each call uses its own short-lived connection; connecting to a local Unix socket
+    is cheap compared to the work being replaced (an SSH exec plus a remote shell).
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+        self._ids_lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def _next_id(self) -> int:
+        with self._ids_lock:
+            return next(self._ids)
+
+    def _messages(self, method: str, params: Dict[str, Any], timeout: Optional[float]) -> Iterator[Dict[str, Any]]:
+        request_id = self._next_id()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout if timeout is not None else self.timeout)
+        try:
+            sock.connect(self.socket_path)
+            sock.sendall(encode({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}))
+            with sock.makefile("rb") as reader:
+                for line in reader:
+                    message = json.loads(line)
+                    if message.get("id") != request_id:
+                        continue
+                    yield message
+                    if "result" in message or "error" in message:
+                        return
+            raise HostAgentError("Host agent closed the connection")
+        except OSError as e:
+            raise HostAgentError(f"Host agent unavailable: {str(e)}")
+        finally:
+            sock.close()
+
+    @staticmethod
+    def _result(message: Dict[str, Any]) -> Any:
+        if "error" in message:
+            raise HostAgentError(message["error"].get("message"), message["error"].get("code"))
+        return message["result"]
+
+    def call(self, method: str, params: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Any:
+        """Call a method and return its final result"""
+        for message in self._messages(method, params or {}, timeout):
+            if "stream" not in message:
+                return self._result(message)
+
+    def stream(self, method: str, params: Optional[Dict[str, Any]] = None,
+               timeout: Optional[float] = None) -> Iterator[Any]:
+        """Call a streaming method, yielding each chunk and finally the result"""
+        for message in self._messages(method, params or {}, timeout):
+            if "stream" in message:
+                yield message["stream"]
+            else:
+                yield self._result(message)
+
+    def run(self, argv: List[str], timeout: Optional[float] = None) -> Tuple[str, str, int]:
+        """Run an argument vector on the host (no shell) and return (stdout, stderr, return_code)"""
+        result = self.call("exec", {"argv": argv, "timeout": timeout},
+                           timeout=timeout + self.timeout if timeout else None)
+        return result["stdout"], result["stderr"], result["exit_code"]
+
+    def run_many(self, commands: List[List[str]], timeout: Optional[float] = None) -> List[Tuple[str, str, int]]:
+        """Run several argument vectors in one request"""
+        results = self.call("exec.batch", {"commands": commands, "timeout": timeout},
+                            timeout=timeout * len(commands) + self.timeout if timeout else None)
+        return [(r["stdout"], r["stderr"], r["exit_code"]) for r in results]
+
+    def service_status(self, unit: str) -> ServiceStatus:
+        return ServiceStatus(**self.call("service.status", {"unit": unit}))
+
+    def tail(self, path: str, lines: int = 10) -> List[str]:
+        return self.call("file.tail", {"path": path, "lines": lines})["lines"]
+
+    def follow(self, path: str, lines: int = 10, duration: float = 60) -> Iterator[str]:
+        """Yield the last lines of a file, then new lines as they are written"""
+        params = {"path": path, "lines": lines, "follow": True, "duration": duration}
+        for chunk in self.stream("file.tail", params, timeout=duration + self.timeout):
+            yield from chunk.get("lines", [])
+
+    def inspect_cert(self, path: str) -> CertInfo:
+        return CertInfo(**self.call("cert.inspect", {"path": path}))
+
+    def backup(self, source: str, dest_dir: str) -> str:
+        result = None
+        for result in self.stream("backup", {"source": source, "dest_dir": dest_dir}, timeout=600):
+            pass
+        return result["path"]
+
+
+_client = None
+
+
+def get_host_agent() -> Optional[HostAgentClient]:
+    """Return the configured host agent client, or None when no agent socket is configured"""
+    global _client
+    if _client is None and settings.HOST_AGENT_SOCKET:
+        _client = HostAgentClient(settings.HOST_AGENT_SOCKET)
+    return _client
@@ -6,11 +6,15 @@ import re
 import time
 
 import psutil
-from flask import Flask, request, jsonify, Blueprint
+from flask import Flask, request, jsonify, Blueprint, Response
 from werkzeug.security import generate_password_hash
 
+import settings
 from main.api_handlers import parse_openvpn_config, verify_file_paths
+from main.artifacts import get_config_builder, stream_zip
 from main.auth import login_required
+from main.dir_manager import VPNManager
+from main.exceptions import CertificateError, PathError, PkiQueueTimeout
 from main.vpn import VpnManager
 
 USERS_DB = {
@@ -421,8 +425,8 @@ vpn_manager = VpnManager(
     config_dir='/etc/openvpn',  # Adjust paths as needed for your system
     log_file='/var/log/openvpn/openvpn-status.log',
     status_file='/var/log/openvpn/openvpn-status.log',
-    management_host='127.0.0.1',
-    management_port=7505,
+    management_host=settings.MANAGEMENT["host"],
+    management_port=settings.MANAGEMENT["port"],
     service_name='openvpn-server@server'
 )
 
@@ -458,6 +462,14 @@ def init_api(app: Flask):
         usage = vpn_manager.get_resource_usage()
         return jsonify(usage)
 
+    @bp.route('/api/resource_usage/history', methods=["GET", "POST"])
+    @login_required
+    def resource_usage_history():
+        return jsonify({
+            "resources": vpn_manager.resource_monitor.history(),
+            "bandwidth": vpn_manager.bandwidth.history()
+        })
+
     @bp.route('/api/active_connections', methods=["POST"])
     @login_required
     def active_connections():
@@ -487,21 +499,22 @@ def init_api(app: Flask):
     @bp.route('/api/stop_server', methods=['POST'])
     @login_required
     def stop_server():
-        _, _, return_code = vpn_manager._run_command(["systemctl", "stop", vpn_manager.service_name])
-        success = return_code == 0
+        success = vpn_manager.service.stop()
+        vpn_manager.command_cache.invalidate("service")
         return jsonify({"success": success})
 
     @bp.route('/api/service_pid', methods=['GET'])
     @login_required
     def service_pid():
-        stdout, _, _ = vpn_manager._run_command(["systemctl", "show", vpn_manager.service_name, "--property=MainPID"])
-        pid = None
-        if stdout:
-            match = re.search(r'MainPID=(\d+)', stdout)
-            if match and match.group(1) != '0':
-                pid = match.group(1)
+        state = vpn_manager.service.status()
+        pid = str(state.main_pid) if state.main_pid else None
         return jsonify({"pid": pid})
 
+    @bp.route('/api/command_cache', methods=['GET'])
+    @login_required
+    def command_cache_stats():
+        return jsonify(vpn_manager.command_cache.stats())
+
     @bp.route('/api/service_status', methods=['GET'])
     @login_required
     def service_status():
@@ -511,8 +524,8 @@ def init_api(app: Flask):
     @bp.route('/api/start_server', methods=['POST'])
     @login_required
     def start_server():
-        _, _, return_code = vpn_manager._run_command(["systemctl", "start", vpn_manager.service_name])
-        success = return_code == 0
+        success = vpn_manager.service.start()
+        vpn_manager.command_cache.invalidate("service")
         return jsonify({"success": success})
 
     @bp.route('/api/add_client', methods=['POST'])
@@ -526,6 +539,106 @@ def init_api(app: Flask):
         success = vpn_manager.add_client(username, email, full_name)
         return jsonify({"success": success})
 
+    @bp.route('/api/clients/bulk', methods=['POST'])
+    @login_required
+    def add_clients():
+        usernames = (request.json or {}).get('usernames')
+        if not isinstance(usernames, list) or not usernames:
+            return jsonify({"success": False, "message": "usernames must be a non-empty list"}), 400
+        if len(usernames) > settings.BULK_PROVISION_LIMIT:
+            return jsonify({
+                "success": False,
+                "message": f"At most {settings.BULK_PROVISION_LIMIT} usernames per request"
+            }), 400
+
+        try:
+            results = vpn_manager.add_clients(usernames)
+        except PkiQueueTimeout:
+            # The batch keeps running on the PKI queue; retrying now would only report "already exists"
+            return jsonify({
+                "success": False,
+                "pending": True,
+                "message": "The batch is still being processed; its clients will be available shortly"
+            }), 202
+        except CertificateError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+        except PathError:
+            return jsonify({"success": False, "message": "easy-rsa directory not found"}), 500
+        return jsonify({
+            "success": all(result["success"] for result in results),
+            "created": sum(1 for result in results if result["success"]),
+            "results": results
+        })
+
+    @bp.route('/api/clients/revoke', methods=['POST'])
+    @login_required
+    def revoke_clients():
+        data = request.json or {}
+        usernames = data.get('usernames')
+        if not isinstance(usernames, list) or not usernames:
+            return jsonify({"success": False, "message": "usernames must be a non-empty list"}), 400
+        try:
+            results = vpn_manager.revoke_clients(usernames, data.get('reason', ''))
+        except CertificateError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+        return jsonify({
+            "success": all(result["success"] for result in results),
+            "revoked": sum(1 for result in results if result["success"]),
+            "results": results
+        })
+
+    @bp.route('/api/certificates/expiring', methods=['GET'])
+    @login_required
+    def expiring_certificates():
+        try:
+            k = max(1, min(int(request.args.get('k', 10)), 1000))
+        except ValueError:
+            return jsonify({"success": False, "message": "k must be an integer"}), 400
+        return jsonify({
+            "next": vpn_manager.expiry.next_expiring(k),
+            "expired": vpn_manager.expiry.expired(),
+            "events": [event.to_dict() for event in vpn_manager.expiry.recent_events()],
+            **vpn_manager.expiry.stats()
+        })
+
+    @bp.route('/api/key_pool', methods=['GET'])
+    @login_required
+    def key_pool_stats():
+        pool = VPNManager.issuer().key_pool
+        return jsonify(pool.stats() if pool else {"enabled": False})
+
+    @bp.route('/api/clients/export', methods=['POST'])
+    @login_required
+    def export_clients():
+        data = request.json or {}
+        usernames, prefix = data.get('usernames'), data.get('prefix')
+        if usernames is None and prefix is None:
+            return jsonify({"success": False, "message": "usernames or prefix is required"}), 400
+        if usernames is not None and (not isinstance(usernames, list) or not usernames or
+                                      not all(isinstance(name, str) and name for name in usernames)):
+            return jsonify({"success": False, "message": "usernames must be a non-empty list of client names"}), 400
+        if prefix is not None and not isinstance(prefix, str):
+            return jsonify({"success": False, "message": "prefix must be a string"}), 400
+        if any('/' in name or name.startswith('.') for name in (usernames or []) + [prefix or ""]):
+            return jsonify({"success": False, "message": "Invalid client name"}), 400
+
+        try:
+            paths = get_config_builder().select(usernames, prefix)
+        except PathError:
+            return jsonify({"success": False, "message": "Client configuration directory not found"}), 404
+        if not paths:
+            return jsonify({"success": False, "message": "No matching client configurations"}), 404
+
+        # Streamed as it is built: memory stays flat however many configs are exported
+        return Response(
+            stream_zip((path.name, path) for path in paths),
+            mimetype="application/zip",
+            headers={
+                "Content-Disposition": f"attachment; filename=clients-{time.strftime('%Y%m%d-%H%M%S')}.zip",
+                "X-Client-Count": str(len(paths))
+            }
+        )
+
     @bp.route('/api/revoke_client', methods=['POST'])
     @login_required
     def revoke_client():
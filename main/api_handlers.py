@@ -4,7 +4,8 @@ import re
 import shutil
 import subprocess
 
-from main.command import CommandExecutor
+from main.command import get_ssh_pool
+from main.transport import get_transport
 
 OPENVPN_CONFIG_DIR = '/etc/openvpn'
 OPENVPN_SERVER_CONFIG = '/etc/openvpn/server/server.conf'
@@ -174,7 +175,7 @@ def write_openvpn_config(config):
 
         # Restart OpenVPN service
         try:
-            subprocess.run(['systemctl', 'restart', 'openvpn-server@server'], check=True)
+            get_transport().run(['systemctl', 'restart', 'openvpn-server@server'], check=True)
         except subprocess.CalledProcessError as e:
             # app.logger.error(f"Error restarting OpenVPN: {str(e)}")
             return False, "Configuration updated but failed to restart OpenVPN service."
@@ -191,11 +192,8 @@ def write_openvpn_config(config):
         return False, f"Failed to update configuration: {str(e)}"
 
 def run_host_command(command):
-    executor = CommandExecutor(private_key_path='/app/ssh/id_host_access')
-    try:
-        if executor.connect():
-            result = executor.execute_command(command)
-            return result
-        return {"success": False, "error": "Failed to connect to host"}
-    finally:
-        executor.close()
\ No newline at end of file
+    return get_ssh_pool().execute_command(command)
+
+
+def run_host_batch(commands):
+    return get_ssh_pool().execute_batch(commands)
@@ -0,0 +1,204 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import jinja2
+
+import settings
+from main.exceptions import PathError
+
+
+def extract_pem(text: str, label: str = "CERTIFICATE") -> str:
+    """Every `label` PEM block in text (dropping openssl's text dump and anything else around them)"""
+    blocks = re.findall(rf"-----BEGIN {label}-----.*?-----END {label}-----", text, re.DOTALL)
+    return "\n".join(blocks)
+
+
+class _ZipSink:
+    """Write-only file object zipfile streams into; the bytes are handed out (and forgotten) by drain()"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(files: Iterable[Tuple[str, Path]], chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive of (archive name, path) pairs as it is built.
+
+    The sink has no tell/seek, so zipfile writes each entry's sizes and CRC in a data
+    descriptor after its data instead of going back to patch the header; at most one
+    chunk of one file (plus deflate's window) is held at a time. Files that disappear
+    before they are read are left out.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for arcname, path in files:
+            try:
+                source = open(path, "rb")
+            except FileNotFoundError:
+                continue
+            with source:
+                st = os.fstat(source.fileno())
+                info = zipfile.ZipInfo(arcname, time.localtime(st.st_mtime)[:6])
+                info.external_attr = (st.st_mode & 0xFFFF) << 16
+                info.file_size = st.st_size
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with archive.open(info, "w") as entry:
+                    while True:
+                        data = source.read(chunk_size)
+                        if not data:
+                            break
+                        entry.write(data)
+                        out = sink.drain()
+                        if out:
+                            yield out
+            out = sink.drain()
+            if out:
+                yield out
+    yield sink.drain()
+
+
+class ClientConfigBuilder:
+    """
+    Builds client .ovpn files.
+
+    The inputs shared by every client (CA bundle, ta.key, remote endpoint) are read
+    and reduced to what the config needs once, then reused until the file's (inode,
+    mtime, size) changes. The template is compiled once by a standalone jinja
+    environment (re-compiled only if it changes on disk), so configs can also be
+    rendered outside a request. Written configs get a content-hash ETag for downloads.
+    """
+
+    def __init__(self, server_dir: Path, client_dir: Path, template: Path, tls_auth: bool = False):
+        self.server_dir = Path(server_dir)
+        self.client_dir = Path(client_dir)
+        self.template = Path(template)
+        self.tls_auth = tls_auth
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[tuple, object]] = {}
+        self._env = jinja2.Environment(loader=jinja2.FileSystemLoader(str(self.template.parent)), auto_reload=True)
+
+    @property
+    def pki_dir(self) -> Path:
+        return self.server_dir / "easy-rsa" / "pki"
+
+    def _load(self, path: Path, parse: Callable[[str], object]):
+        """parse(path's text), cached while the file is unchanged"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            raise PathError(path.name)
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        key = str(path)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] == stamp:
+                return cached[1]
+        value = parse(path.read_text())
+        with self._lock:
+            self._cache[key] = (stamp, value)
+        return value
+
+    def ca(self) -> str:
+        return self._load(self.pki_dir / "ca.crt", extract_pem)
+
+    def ta_key(self) -> str:
+        return self._load(self.server_dir / "ta.key", lambda text: extract_pem(text, "OpenVPN Static key V1"))
+
+    def remote(self) -> str:
+        def parse(text):
+            match = re.search(r'remote\s+(\d+\.\d+\.\d+\.\d+)', text)
+            return match.group(1) if match else "Invalid"
+        return self._load(self.server_dir / "client-common.txt", parse)
+
+    def render(self, cert: str, key: str) -> str:
+        return self._env.get_template(self.template.name).render(
+            ca=self.ca().strip(),
+            cert=extract_pem(cert).strip(),
+            key=key.strip(),
+            tls=self.ta_key().strip() if self.tls_auth else False,
+            ip=self.remote()
+        )
+
+    def path(self, name: str) -> Path:
+        return self.client_dir / f"{name}.ovpn"
+
+    def select(self, names: Optional[List[str]] = None, prefix: Optional[str] = None) -> List[Path]:
+        """Written configs of the given clients (those that exist), or of every client whose name starts with prefix"""
+        if names is not None:
+            return [path for path in map(self.path, dict.fromkeys(names)) if path.is_file()]
+        try:
+            with os.scandir(self.client_dir) as entries:
+                return sorted(Path(entry.path) for entry in entries
+                              if entry.name.endswith(".ovpn") and entry.name.startswith(prefix or "")
+                              and entry.is_file())
+        except FileNotFoundError:
+            raise PathError
+
+    def build(self, name: str, cert: Optional[str] = None, key: Optional[str] = None) -> Path:
+        """Render and atomically write a client's config; cert and key default to its files in the PKI"""
+        if not self.client_dir.exists():
+            raise PathError
+        try:
+            if cert is None:
+                cert = (self.pki_dir / "issued" / f"{name}.crt").read_text()
+            if key is None:
+                key = (self.pki_dir / "private" / f"{name}.key").read_text()
+        except FileNotFoundError as e:
+            raise PathError(Path(e.filename).name)
+        data = self.render(cert, key).encode()
+
+        path = self.path(name)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        # Seed the ETag cache so the first download does not have to hash the file again
+        st = os.stat(path)
+        with self._lock:
+            self._cache[f"etag:{path}"] = ((st.st_ino, st.st_mtime_ns, st.st_size), hashlib.sha256(data).hexdigest())
+        return path
+
+    def etag(self, path: Path) -> str:
+        """Strong ETag of a written config: the SHA-256 of its bytes, recomputed only when the file changes"""
+        st = os.stat(path)
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        key = f"etag:{path}"
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] == stamp:
+                return cached[1]
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        with self._lock:
+            self._cache[key] = (stamp, digest)
+        return digest
+
+
+_builder: Optional[ClientConfigBuilder] = None
+_builder_lock = threading.Lock()
+
+
+def get_config_builder() -> ClientConfigBuilder:
+    global _builder
+    with _builder_lock:
+        if _builder is None:
+            _builder = ClientConfigBuilder(settings.VPN_DIR / "server", settings.VPN_DIR / "client",
+                                           settings.CLIENT_CONFIG["template"],
+                                           tls_auth=settings.CLIENT_CONFIG["tls_auth"])
+        return _builder
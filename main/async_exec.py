@@ -0,0 +1,98 @@
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import settings
+from main import deadline
+from main.exceptions import DeadlineExceeded
+from main.transport import CommandTransport
+
+CommandResult = Tuple[str, str, int]
+
+
+def _host_key(transport: CommandTransport) -> str:
+    """Concurrency is limited per host; every transport here talks to exactly one"""
+    if transport.name == "ssh":
+        return settings.HOST_SSH["host"]
+    if transport.name == "agent":
+        return settings.HOST_AGENT_SOCKET or "agent"
+    return "localhost"
+
+
+class AsyncCommandExecutor:
+    """
+    Fan out independent host commands concurrently.
+
+    Coroutines run on a dedicated event loop thread. Each command is executed by the
+    (blocking) transport in a worker thread, gated by a per-host semaphore so we never
+    open more channels than the host allows. Synchronous callers such as the Flask
+    handlers use run_all(), which blocks until every command has finished, so N
+    commands cost about one round trip instead of N.
+    """
+
+    def __init__(self, transport: CommandTransport, limit: int = 8):
+        self.transport = transport
+        self.limit = limit
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._threads: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._pid = None
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            # The loop thread does not survive gunicorn's fork, so each worker starts its own
+            if self._loop is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._semaphores = {}
+                self._loop = asyncio.new_event_loop()
+                self._threads = concurrent.futures.ThreadPoolExecutor(max_workers=self.limit,
+                                                                      thread_name_prefix="host-cmd")
+                self._loop.set_default_executor(self._threads)
+                threading.Thread(target=self._loop.run_forever, daemon=True, name="host-cmd-loop").start()
+            return self._loop
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        # Only called from the loop thread, so no locking is needed
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.limit)
+        return self._semaphores[host]
+
+    async def run(self, argv: Sequence[str], cwd: Optional[str] = None,
+                  timeout: Optional[float] = None) -> CommandResult:
+        """Run one command; failures are returned as exit code 1 like VpnManager._run_command"""
+        async with self._semaphore(_host_key(self.transport)):
+            try:
+                return await asyncio.get_running_loop().run_in_executor(
+                    None, lambda: self.transport.run(list(argv), cwd=cwd, timeout=timeout))
+            except Exception as e:
+                self.logger.error(f"Error executing command {argv}: {str(e)}")
+                return "", str(e), 1
+
+    async def gather(self, commands: List[Sequence[str]], timeout: Optional[float] = None) -> List[CommandResult]:
+        return list(await asyncio.gather(*(self.run(argv, timeout=timeout) for argv in commands)))
+
+    def run_all(self, commands: List[Sequence[str]], timeout: Optional[float] = None) -> List[CommandResult]:
+        """
+        Sync facade: run independent commands concurrently and wait for all of them.
+
+        Returns:
+            List of (stdout, stderr, return_code) tuples in the same order as commands
+
+        Raises:
+            DeadlineExceeded: if the request's budget runs out before every command finished
+        """
+        if not commands:
+            return []
+        # The worker threads do not see the request's context, so size the timeout here
+        timeout = deadline.timeout(timeout)
+        future = asyncio.run_coroutine_threadsafe(self.gather(commands, timeout), self._ensure_loop())
+        try:
+            return future.result(timeout=deadline.remaining())
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise DeadlineExceeded()
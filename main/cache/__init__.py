@@ -4,6 +4,9 @@ import threading
 import time
 from datetime import datetime
 
+import settings
+from main.pki.watcher import DirectoryWatcher
+
 
 class UserCacheRefresher:
     def __init__(self, vpn_manager, cache_manager, refresh_interval=300):  # 5 minutes default
@@ -11,8 +14,21 @@ class UserCacheRefresher:
         self.cache_manager = cache_manager
         self.refresh_interval = refresh_interval
         self.thread = None
+        self.watcher = None
         self.running = False
         self.logger = logging.getLogger(__name__)
+        # Serialises full and incremental refreshes
+        self.lock = threading.Lock()
+        self._index_state = None
+        self._synced = False
+
+    @property
+    def _pki_dir(self):
+        return os.path.dirname(self.vpn_manager.cert_dir)
+
+    @property
+    def _revoked_dir(self):
+        return os.path.join(self._pki_dir, "revoked", "certs_by_serial")
 
     def start(self):
         if self.thread is not None and self.thread.is_alive():
@@ -23,8 +39,17 @@ class UserCacheRefresher:
         self.thread.daemon = True
         self.thread.start()
 
+        # Certificate changes are applied as they happen; the loop above is the safety net
+        self.watcher = DirectoryWatcher(
+            [self.vpn_manager.cert_dir, self._pki_dir, self._revoked_dir], self._on_change,
+            poll_interval=settings.CERT_WATCH_POLL_INTERVAL
+        )
+        self.watcher.start()
+
     def stop(self):
         self.running = False
+        if self.watcher:
+            self.watcher.stop()
         if self.thread:
             self.thread.join(timeout=1)
 
@@ -41,46 +66,104 @@ class UserCacheRefresher:
                     break
                 time.sleep(1)
 
+    def _index_snapshot(self):
+        return {entry.cn: (entry.status, entry.serial, entry.expires) for entry in self.vpn_manager.cert_index.latest()}
+
+    def _index_changes(self):
+        """Users whose index.txt entry changed since the last look"""
+        previous, self._index_state = self._index_state, self._index_snapshot()
+        if previous is None:
+            return set(self._index_state)
+        return {cn for cn in set(previous) | set(self._index_state) if previous.get(cn) != self._index_state.get(cn)}
+
+    def _on_change(self, changes):
+        """Apply watcher events: re-parse only the certificates involved and rebuild only their users"""
+        store = self.vpn_manager.cert_store
+        issued = changes.get(self.vpn_manager.cert_dir)
+        pki = changes.get(self._pki_dir)
+        revoked = changes.get(self._revoked_dir)
+        # An empty set means the watcher lost track of that directory and everything must be rechecked
+        crl_changed = pki is not None and (not pki or "crl.pem" in pki)
+        index_changed = pki is not None and (not pki or "index.txt" in pki)
+
+        with self.lock:
+            affected = set()
+            if issued is not None or crl_changed:
+                filenames = [] if issued is None else (issued or None)
+                affected |= store.sync(filenames, crl_changed=crl_changed)
+            if revoked:
+                affected |= store.usernames_for_serials(name[:-4] for name in revoked if name.endswith(".crt"))
+            if index_changed:
+                affected |= self._index_changes()
+            affected.discard("server")
+
+            if affected:
+                self.logger.info(f"Refreshing {len(affected)} cached user(s) after certificate changes")
+                self._store(self.vpn_manager._get_user_list_internal(affected), affected)
+                self.vpn_manager.expiry.refresh()
+
+    def _store(self, users, usernames=None):
+        """Write users to the cache and drop cached users (of `usernames`, or all) that no longer exist"""
+        self.cache_manager.store_users(users)
+        present = {user["username"] for user in users}
+        if usernames is None:
+            usernames = {user["username"] for user in self.cache_manager.get_users()}
+        self.cache_manager.delete_users(set(usernames) - present)
+
+    def _store_chunk(self, usernames):
+        usernames = set(usernames) - {"server"}
+        # Called from inside cert_store.sync(): read the rows it has just written rather than syncing again
+        self.cache_manager.store_users(self.vpn_manager._get_user_list_internal(usernames, sync=False))
+
     def _refresh_cache(self):
-        cert_dir = os.path.join(self.vpn_manager.config_dir, "server/easy-rsa/pki/issued")
-        crl_path = os.path.join(self.vpn_manager.config_dir, "server/easy-rsa/pki/crl.pem")
-
-        # Get last refresh time
-        last_refresh = self.cache_manager.get_last_refresh_time()
-        if last_refresh:
-            last_refresh_time = datetime.fromisoformat(last_refresh).timestamp()
-        else:
-            last_refresh_time = 0
-
-        # Check if any certificate files or CRL have been modified
-        needs_refresh = False
-
-        # Check CRL file modification time
-        if os.path.exists(crl_path):
-            crl_mtime = os.path.getmtime(crl_path)
-            if crl_mtime > last_refresh_time:
+        with self.lock:
+            # Get last refresh time
+            last_refresh = self.cache_manager.get_last_refresh_time()
+            if last_refresh:
+                last_refresh_time = datetime.fromisoformat(last_refresh).timestamp()
+            else:
+                last_refresh_time = 0
+
+            # Check if any certificate files or CRL have been modified
+            needs_refresh = False
+
+            # Check CRL file modification time; this also reloads the revoked serials the user listing shares
+            if self.vpn_manager.revocations.mtime > last_refresh_time:
                 self.logger.info("CRL file changed, refresh needed")
                 needs_refresh = True
 
-        # Check certificate files
-        if not needs_refresh and os.path.exists(cert_dir):
-            for cert_file in os.listdir(cert_dir):
-                if cert_file.endswith('.crt'):
-                    cert_path = os.path.join(cert_dir, cert_file)
-                    if os.path.getmtime(cert_path) > last_refresh_time:
-                        self.logger.info(f"Certificate file {cert_file} changed, refresh needed")
-                        needs_refresh = True
-                        break
-
-        # Refresh only if needed
-        if needs_refresh:
-            self.logger.info("Refreshing user cache due to file changes...")
-            users = self.vpn_manager._get_user_list_internal()
-            self.cache_manager.store_users(users)
-        else:
-            self.logger.info("No certificate changes detected, skipping refresh")
-            # Just update the timestamp
-            self.cache_manager.update_refresh_timestamp()
+            # easy-rsa's index.txt changes on every issue and revoke, so one stat replaces a scan of pki/issued
+            index = self.vpn_manager.cert_index
+            if not needs_refresh and index.exists:
+                if os.path.getmtime(index.path) > last_refresh_time:
+                    self.logger.info("Certificate index changed, refresh needed")
+                    needs_refresh = True
+
+            # Bring the certificate store up to date; only changed certificates are parsed. Once inotify
+            # is running it reports every change, so the directory is only scanned on the first pass.
+            changed = set()
+            if not self._synced or needs_refresh or not (self.watcher and self.watcher.mode == "inotify"):
+                store = self.vpn_manager.cert_store
+                # On a cold cache, publish users as each parsed chunk lands instead of after the whole scan
+                on_chunk = self._store_chunk if not self.cache_manager.get_users() else None
+                changed = store.sync(crl_changed=needs_refresh, on_chunk=on_chunk)
+                self._synced = True
+                if store.last_sync.get("parallel"):
+                    self.logger.info(f"Certificate scan: {store.last_sync}")
+            if changed and not index.exists:
+                self.logger.info(f"{len(changed)} certificate file(s) changed, refresh needed")
+                needs_refresh = True
+
+            # Refresh only if needed
+            if needs_refresh:
+                self.logger.info("Refreshing user cache due to file changes...")
+                users = self.vpn_manager._get_user_list_internal()
+                self._store(users)
+                self._index_state = self._index_snapshot()
+            else:
+                self.logger.info("No certificate changes detected, skipping refresh")
+                # Just update the timestamp
+                self.cache_manager.update_refresh_timestamp()
 
     def force_refresh(self):
         """Manually trigger a cache refresh"""
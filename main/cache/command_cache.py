@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+CommandResult = Tuple[str, str, int]
+
+
+@dataclass
+class CacheRule:
+    """Which read-only commands may be cached, for how long, and what invalidates them"""
+    prefix: Tuple[str, ...]
+    ttl: float
+    tags: Tuple[str, ...] = ()
+    # Flag whose value names a file; that file's stat becomes part of the cache key
+    watch_arg: Optional[str] = None
+    # Arguments that make the command write something, so it must never be cached
+    forbidden: Tuple[str, ...] = ()
+
+    def matches(self, argv: Sequence[str]) -> bool:
+        return tuple(argv[:len(self.prefix)]) == self.prefix and not any(a in self.forbidden for a in argv)
+
+    def watched_path(self, argv: Sequence[str]) -> Optional[str]:
+        if self.watch_arg and self.watch_arg in argv:
+            i = list(argv).index(self.watch_arg)
+            if i + 1 < len(argv):
+                return argv[i + 1]
+        return None
+
+
+DEFAULT_RULES = [
+    CacheRule(("openvpn", "--version"), ttl=3600, tags=("packages",)),
+    CacheRule(("openssl", "version"), ttl=3600, tags=("packages",)),
+    CacheRule(("ufw", "status"), ttl=60, tags=("firewall",)),
+    CacheRule(("systemctl", "show"), ttl=5, tags=("service",)),
+    CacheRule(("systemctl", "is-active"), ttl=5, tags=("service",)),
+    # Certificates and CRLs are keyed on the file's stat, so an unchanged file is never re-read
+    CacheRule(("openssl", "x509"), ttl=86400, tags=("certs",), watch_arg="-in", forbidden=("-out",)),
+    CacheRule(("openssl", "crl"), ttl=86400, tags=("crl",), watch_arg="-in", forbidden=("-out",)),
+]
+
+# Exit codes that mean the command never really ran (timeout, not executable, not found, ssh failure)
+_UNCACHEABLE_CODES = {124, 126, 127, 255}
+
+
+class CommandResultCache:
+    """
+    TTL cache for the results of read-only host commands.
+
+    Keys are the argument vector plus, for file probes, the (inode, mtime, size) of the
+    file they read. Entries expire after the matching rule's TTL and can be dropped
+    early by tag, e.g. after a service restart or a certificate change.
+    """
+
+    def __init__(self, rules: Optional[List[CacheRule]] = None, max_entries: int = 4096):
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self._entries: Dict[tuple, Tuple[float, Tuple[str, ...], CommandResult]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _rule_for(self, argv: Sequence[str]) -> Optional[CacheRule]:
+        for rule in self.rules:
+            if rule.matches(argv):
+                return rule
+        return None
+
+    @staticmethod
+    def _file_stamp(path: Optional[str]):
+        if not path:
+            return None
+        try:
+            st = os.stat(path)
+            return st.st_ino, st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _key(self, argv: Sequence[str], rule: CacheRule):
+        return tuple(argv), self._file_stamp(rule.watched_path(argv))
+
+    def get(self, argv: Sequence[str]) -> Optional[CommandResult]:
+        """Return a cached result for argv, or None (counted as a miss for cacheable commands)"""
+        rule = self._rule_for(argv)
+        if rule is None:
+            return None
+        key = self._key(argv, rule)
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[2]
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, argv: Sequence[str], result: CommandResult) -> None:
+        rule = self._rule_for(argv)
+        if rule is None or result[2] in _UNCACHEABLE_CODES or result[2] < 0:
+            return
+        key = self._key(argv, rule)
+        with self.lock:
+            if len(self._entries) >= self.max_entries:
+                self._prune()
+            self._entries[key] = (time.monotonic() + rule.ttl, rule.tags, result)
+
+    def _prune(self) -> None:
+        """Drop expired entries, then the ones closest to expiry until there is room again"""
+        now = time.monotonic()
+        for key in [key for key, entry in self._entries.items() if entry[0] <= now]:
+            del self._entries[key]
+        overflow = len(self._entries) - self.max_entries + 1
+        if overflow > 0:
+            for key in sorted(self._entries, key=lambda k: self._entries[k][0])[:overflow]:
+                del self._entries[key]
+
+    def get_or_run(self, argv: Sequence[str], runner: Callable[[Sequence[str]], CommandResult]) -> CommandResult:
+        result = self.get(argv)
+        if result is None:
+            result = runner(argv)
+            self.put(argv, result)
+        return result
+
+    def invalidate(self, *tags: str) -> int:
+        """Drop entries carrying any of the given tags (all entries if none are given)"""
+        with self.lock:
+            if not tags:
+                count = len(self._entries)
+                self._entries.clear()
+                return count
+            stale = [key for key, (_, entry_tags, _) in self._entries.items() if set(entry_tags) & set(tags)]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
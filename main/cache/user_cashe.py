@@ -41,6 +41,12 @@ class UserCacheManager:
                 ("last_full_refresh", datetime.now().isoformat())
             )
 
+    def delete_users(self, usernames):
+        if not usernames:
+            return
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            conn.executemany("DELETE FROM users WHERE username = ?", [(username,) for username in usernames])
+
     def get_users(self):
         with self.lock, sqlite3.connect(self.db_path) as conn:
             cursor = conn.execute("SELECT data FROM users")
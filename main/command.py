@@ -1,8 +1,90 @@
 import paramiko
 import os
 import logging
+import select
+import re
+import socket
+import threading
+import uuid
+
+import settings
+from main import deadline
+
 logging.getLogger("paramiko").setLevel(logging.WARNING)
 
+_BUFSIZE = 32768
+
+
+def _read_channel(chan, timeout=None):
+    """Read stdout/stderr of an exec channel until EOF and return (stdout, stderr, exit_code)"""
+    stdout, stderr = [], []
+    while True:
+        eof = chan.eof_received or chan.closed
+        while chan.recv_ready():
+            stdout.append(chan.recv(_BUFSIZE))
+        while chan.recv_stderr_ready():
+            stderr.append(chan.recv_stderr(_BUFSIZE))
+        if eof:
+            break
+        # The channel's pipe is signalled for stdout, stderr and EOF alike
+        readable, _, _ = select.select([chan], [], [], timeout)
+        if not readable:
+            raise socket.timeout(f"No output from host command within {timeout}s")
+    return b"".join(stdout), b"".join(stderr), chan.recv_exit_status()
+
+
+def _build_batch_script(commands, marker):
+    """Wrap commands in one shell script that frames each command's output with markers"""
+    lines = []
+    for i, command in enumerate(commands):
+        lines.append(f"printf '%s\\n' '{marker}:{i}:begin'; printf '%s\\n' '{marker}:{i}:begin' >&2")
+        # A subshell keeps `exit` or `cd` in one command from affecting the rest
+        lines.append(f"( {command}\n)")
+        lines.append(f"printf '\\n%s\\n' \"{marker}:{i}:end:$?\"; printf '\\n%s\\n' '{marker}:{i}:end' >&2")
+    return "\n".join(lines)
+
+
+def _split_batch_result(result, count, marker):
+    """Split the output of a framed batch script into one result dict per command"""
+    if 'stdout' not in result:
+        return [dict(result) for _ in range(count)]
+
+    stdout_frames = {
+        int(m.group(1)): (m.group(2), int(m.group(3)))
+        for m in re.finditer(rf"^{marker}:(\d+):begin\n(.*?)\n{marker}:\1:end:(\d+)$",
+                             result['stdout'], re.DOTALL | re.MULTILINE)
+    }
+    stderr_frames = {
+        int(m.group(1)): m.group(2)
+        for m in re.finditer(rf"^{marker}:(\d+):begin\n(.*?)\n{marker}:\1:end$",
+                             result['stderr'], re.DOTALL | re.MULTILINE)
+    }
+
+    results = []
+    for i in range(count):
+        if i not in stdout_frames:
+            results.append({
+                'success': False,
+                'error': result.get('error') or 'Command did not complete',
+                'stdout': '',
+                'stderr': stderr_frames.get(i, ''),
+                'exit_code': -1
+            })
+            continue
+        stdout, exit_code = stdout_frames[i]
+        results.append({
+            'success': exit_code == 0,
+            'stdout': stdout,
+            'stderr': stderr_frames.get(i, ''),
+            'exit_code': exit_code
+        })
+    return results
+
+
+def _batch_marker():
+    return f"__G3_BATCH_{uuid.uuid4().hex}__"
+
+
 class CommandExecutor:
     def __init__(self, private_key_path, host='host.docker.internal', username=None):
         self.client = paramiko.SSHClient()
@@ -19,7 +101,7 @@ class CommandExecutor:
                 hostname=self.host,
                 username=self.username,
                 key_filename=self.private_key_path,
-                timeout=10
+                timeout=deadline.timeout(10)
             )
             return True
         except Exception as e:
@@ -45,6 +127,208 @@ class CommandExecutor:
                 'exit_code': -1
             }
 
+    def execute_batch(self, commands):
+        """
+        Execute several commands on the host in a single exec channel.
+
+        Returns a list of result dicts (same shape as execute_command), one per command.
+        """
+        if not commands:
+            return []
+        marker = _batch_marker()
+        result = self.execute_command(_build_batch_script(commands, marker))
+        return _split_batch_result(result, len(commands), marker)
+
     def close(self):
         """Close the SSH connection"""
-        self.client.close()
\ No newline at end of file
+        self.client.close()
+
+
+class SSHTransportPool:
+    """
+    Process-wide pool of authenticated SSH transports to the host.
+
+    Commands run on a new channel of an already authenticated transport instead of
+    paying a full key exchange per call. Transports are health checked before use,
+    kept alive with SSH keepalives and replaced when they die. The number of
+    concurrent sessions is bounded per process (i.e. per gunicorn worker).
+    """
+
+    def __init__(self, private_key_path, host='host.docker.internal', username=None,
+                 max_transports=2, max_sessions=8, keepalive=30, connect_timeout=10, command_timeout=60):
+        self.host = host
+        self.username = username or os.environ.get('HOST_USER', 'root')
+        self.private_key_path = private_key_path
+        self.max_transports = max_transports
+        self.max_sessions = max_sessions
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self.command_timeout = command_timeout
+        self.logger = logging.getLogger(__name__)
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Condition()
+        self._sessions = threading.BoundedSemaphore(self.max_sessions)
+        self._clients = []
+        self._connecting = 0
+        self._next = 0
+
+    def _check_fork(self):
+        # gunicorn preloads the app and forks workers; sockets inherited from the
+        # master must not be shared, so every worker builds its own pool.
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _connect(self):
+        connect_timeout = deadline.timeout(self.connect_timeout)
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            hostname=self.host,
+            username=self.username,
+            key_filename=self.private_key_path,
+            timeout=connect_timeout,
+            banner_timeout=connect_timeout,
+            auth_timeout=connect_timeout
+        )
+        client.get_transport().set_keepalive(self.keepalive)
+        return client
+
+    @staticmethod
+    def _is_healthy(client):
+        transport = client.get_transport()
+        return transport is not None and transport.is_active() and transport.is_authenticated()
+
+    def _get_client(self):
+        """Return a healthy pooled client, connecting a new one if the pool has room"""
+        with self._lock:
+            while True:
+                for client in [c for c in self._clients if not self._is_healthy(c)]:
+                    self._clients.remove(client)
+                    client.close()
+
+                if len(self._clients) + self._connecting < self.max_transports:
+                    self._connecting += 1
+                    break
+                if self._clients:
+                    self._next = (self._next + 1) % len(self._clients)
+                    return self._clients[self._next]
+                # Every slot is still connecting; wait for one of them instead of opening more
+                if not self._lock.wait(deadline.timeout(self.connect_timeout)):
+                    raise TimeoutError("Timed out waiting for an SSH connection to the host")
+
+        # Connect outside the lock so a slow handshake does not hold up callers that can use the pool
+        try:
+            client = self._connect()
+        except BaseException:
+            with self._lock:
+                self._connecting -= 1
+                self._lock.notify_all()
+            raise
+        with self._lock:
+            self._connecting -= 1
+            self._clients.append(client)
+            self._lock.notify_all()
+        return client
+
+    def _discard(self, client):
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+        client.close()
+
+    def execute_command(self, command, timeout=None):
+        """Execute a system command on the host over a pooled transport"""
+        self._check_fork()
+        # Background callers have no request deadline; command_timeout still bounds the session wait and the read
+        timeout = deadline.timeout(timeout if timeout is not None else self.command_timeout)
+        if not self._sessions.acquire(timeout=timeout):
+            return {'success': False, 'error': 'Too many concurrent host sessions', 'exit_code': -1}
+
+        try:
+            # One retry covers a transport that died between health check and use
+            for attempt in range(2):
+                try:
+                    client = self._get_client()
+                except Exception as e:
+                    self.logger.error(f"SSH connection to {self.host} failed: {str(e)}")
+                    return {'success': False, 'error': f"Failed to connect to host: {str(e)}", 'exit_code': -1}
+
+                try:
+                    chan = client.get_transport().open_session(timeout=deadline.timeout(self.connect_timeout))
+                except (paramiko.SSHException, EOFError, OSError) as e:
+                    self.logger.warning(f"Dropping broken SSH transport to {self.host}: {str(e)}")
+                    self._discard(client)
+                    if attempt:
+                        return {'success': False, 'error': str(e), 'exit_code': -1}
+                    continue
+
+                try:
+                    chan.exec_command(command)
+                    stdout, stderr, exit_code = _read_channel(chan, timeout)
+                    return {
+                        'success': exit_code == 0,
+                        'stdout': stdout.decode('utf-8', errors='replace'),
+                        'stderr': stderr.decode('utf-8', errors='replace'),
+                        'exit_code': exit_code
+                    }
+                except Exception as e:
+                    return {'success': False, 'error': str(e), 'exit_code': -1}
+                finally:
+                    chan.close()
+        finally:
+            self._sessions.release()
+
+    def execute_batch(self, commands, timeout=None):
+        """
+        Execute several commands on the host in a single exec channel.
+
+        Returns a list of result dicts (same shape as execute_command), one per command.
+        """
+        if not commands:
+            return []
+        marker = _batch_marker()
+        result = self.execute_command(_build_batch_script(commands, marker), timeout=timeout)
+        return _split_batch_result(result, len(commands), marker)
+
+    def stats(self):
+        """Pool state for diagnostics"""
+        with self._lock:
+            return {
+                'transports': len(self._clients),
+                'healthy': sum(1 for c in self._clients if self._is_healthy(c)),
+                'max_transports': self.max_transports,
+                'max_sessions': self.max_sessions
+            }
+
+    def close(self):
+        """Close every pooled transport"""
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for client in clients:
+            client.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ssh_pool():
+    """Return the process-wide SSH transport pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            conf = settings.HOST_SSH
+            _pool = SSHTransportPool(
+                private_key_path=conf["key_path"],
+                host=conf["host"],
+                username=conf["username"],
+                max_transports=conf["max_transports"],
+                max_sessions=conf["max_sessions"],
+                keepalive=conf["keepalive"],
+                connect_timeout=conf["connect_timeout"],
+                command_timeout=settings.HOST_COMMAND_TIMEOUT
+            )
+        return _pool
@@ -0,0 +1,78 @@
+"""
+Per-request time budgets.
+
+The middleware starts a deadline when a request begins. Every outbound call (host
+commands, the management socket, RouterOS, MySQL) sizes its own timeout with
+``timeout(default)``, so one request can never block a worker for longer than its
+budget. Code that outlives the budget raises DeadlineExceeded; aggregating code
+catches it and returns what it has with ``"partial": True``.
+
+Outside a request (background threads, scripts) there is no deadline and
+``timeout(default)`` simply returns the default.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from main.exceptions import DeadlineExceeded
+
+# Absolute time.monotonic() value at which the current request's budget runs out
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+# Never hand out a timeout shorter than this; a zero timeout means "block forever" to some clients
+MIN_TIMEOUT = 0.1
+
+
+def start(budget: float) -> contextvars.Token:
+    """Start a budget of `budget` seconds for the current context"""
+    return _deadline.set(time.monotonic() + budget)
+
+
+def clear(token: Optional[contextvars.Token] = None) -> None:
+    if token is not None:
+        _deadline.reset(token)
+    else:
+        _deadline.set(None)
+
+
+@contextmanager
+def budget(seconds: float):
+    """Run a block under its own budget, never extending an outer one"""
+    outer = remaining()
+    token = start(seconds if outer is None else min(seconds, outer))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current budget, or None if there is no deadline"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check() -> None:
+    """Raise DeadlineExceeded if the budget has run out"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded()
+
+
+def timeout(default: Optional[float]) -> Optional[float]:
+    """
+    Timeout for the next blocking call: the smaller of `default` and the time left.
+
+    Raises:
+        DeadlineExceeded: if the budget has already run out
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded()
+    left = max(left, MIN_TIMEOUT)
+    return left if default is None else min(default, left)
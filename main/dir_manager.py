@@ -1,6 +1,7 @@
 import datetime
 import os
 import re
+import shutil
 import subprocess
 from pathlib import Path
 import socket
@@ -9,10 +10,19 @@ import os
 from pathlib import Path
 import mimetypes
 
-from flask import render_template
+from werkzeug.exceptions import HTTPException
 
 import settings
-from main.exceptions import PathError
+from main import deadline
+from main.artifacts import extract_pem, get_config_builder
+from main.exceptions import CertificateError, PathError
+from main.management import kill_clients
+from main.pki.crl import REASONS
+from main.pki.inspector import parse_certificate
+from main.pki.issuer import IssuedCertificate, get_certificate_issuer
+from main.pki.service import get_pki_service
+from main.sessions import get_session_table
+from main.transport import get_transport
 
 
 class VPNManager:
@@ -20,7 +30,15 @@ class VPNManager:
     
     @classmethod
     def getIpAddress(cls, provision_identity):
-        """Get client IP from OpenVPN status log file"""
+        """Get client IP from the live session table, or else from the OpenVPN status log file"""
+        sessions = get_session_table().by_cn(provision_identity)
+        if sessions is not None:
+            if not sessions:
+                return None
+            # Most recent session; virtual IP, or the real address if none was assigned
+            session = max(sessions, key=lambda s: s.connected_since or datetime.datetime.min)
+            return session.virtual_address or session.real_ip
+
         try:
             print(f"Getting IP for provision_identity: {provision_identity}")
             
@@ -136,7 +154,8 @@ class VPNManager:
                 abort(400, "Invalid client name")
                 
             # Get the path to the client's .ovpn file
-            client_file = settings.VPN_DIR.joinpath("client", f"{client_name}.ovpn")
+            builder = get_config_builder()
+            client_file = builder.path(client_name)
             
             # Check if the file exists
             if not client_file.exists() or not client_file.is_file():
@@ -145,14 +164,22 @@ class VPNManager:
             # Set the correct MIME type for .ovpn files
             mimetype = "application/x-openvpn-profile"
             
-            # Return the file for download with the proper filename
-            return send_file(
+            # Return the file for download with the proper filename. send_file hands the file to the
+            # server's sendfile support, and with conditional=True answers a matching If-None-Match
+            # (the config's content hash) with 304
+            response = send_file(
                 client_file,
                 mimetype=mimetype,
                 as_attachment=True,
-                download_name=f"{client_name}.ovpn"
+                download_name=f"{client_name}.ovpn",
+                etag=builder.etag(client_file),
+                conditional=True
             )
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
             
+        except HTTPException:
+            raise
         except Exception as e:
             abort(500, f"Error processing request: {str(e)}")
 
@@ -234,9 +261,107 @@ class VPNManager:
             if not arg.exists():
                 raise PathError(arg.name)
 
+    @classmethod
+    def issuer(cls):
+        return get_certificate_issuer(str(cls.get("server", "easy-rsa", "pki")), **settings.PKI_ISSUE)
+
+    @classmethod
+    def _submit(cls, fn, *args):
+        """
+        Run a PKI mutation on the ordered PKI queue and wait for its result, for no longer
+        than the request's deadline. A job that outlives the wait still runs to completion.
+        """
+        pki = get_pki_service()
+        timeout = deadline.timeout(settings.PKI_QUEUE_TIMEOUT)
+        return pki.wait(pki.submit(fn, *args), timeout)
+
+    @staticmethod
+    def sanitize(client):
+        return re.sub(r'[^0-9a-zA-Z_-]', '_', client)
+
+    @classmethod
+    def _issue(cls, names):
+        """
+        PKI queue job: issue certificates and write their client configs; returns an
+        IssuedCertificate or CertificateError per name. The configs are written here,
+        not by the caller, so they exist even if the caller stopped waiting.
+        """
+        issuer = cls.issuer()
+        if issuer.available():
+            results = issuer.issue_many(names)
+        else:
+            results = cls._issue_easyrsa(issuer, names)
+
+        for name, outcome in results.items():
+            if isinstance(outcome, CertificateError):
+                continue
+            try:
+                cls._save_client_config(outcome.name, outcome.cert_pem, outcome.key_pem)
+            except Exception as e:
+                results[name] = CertificateError(f"Certificate {outcome.serial} issued but config not saved: {e}")
+        return results
+
+    @classmethod
+    def _issue_easyrsa(cls, issuer, names):
+        """No usable CA key here (missing or passphrase-protected): let easy-rsa sign them"""
+        ersa = cls.get("server", "easy-rsa")
+        transport = get_transport()
+        results = {}
+        # The queue only orders this worker's jobs; the issuer's flock keeps other workers out
+        with issuer.locked():
+            for name in names:
+                _, err, code = transport.run([
+                    "./easyrsa",
+                    "--batch",
+                    "--days=3650",
+                    "build-client-full",
+                    name,
+                    "nopass"
+                ], cwd=str(ersa))
+                if code != 0:
+                    results[name] = CertificateError(err.strip() or f"easyrsa build-client-full failed for {name}")
+                    continue
+                cert, key = cls._read_issued(name)
+                record = parse_certificate(cert.encode())
+                results[name] = IssuedCertificate(name=name, serial=record.serial, cert_pem=cert, key_pem=key,
+                                                  not_after=record.not_after)
+        return results
+
+    @classmethod
+    def _revoke(cls, names, reason=""):
+        """PKI queue job: revoke certificates and install the new CRL; returns a serial or CertificateError per name"""
+        issuer = cls.issuer()
+        if issuer.available():
+            results = {name: outcome if isinstance(outcome, CertificateError) else outcome.serial
+                       for name, outcome in issuer.revoke_many(names, reason).items()}
+        else:
+            # No usable CA key here: revoke with easy-rsa, but still build the CRL only once
+            if reason and reason not in REASONS:
+                raise CertificateError(f"Unknown revocation reason: {reason}")
+            ersa = cls.get("server", "easy-rsa")
+            transport = get_transport()
+            results = {}
+            with issuer.locked():
+                for name in names:
+                    argv = ["./easyrsa", "--batch", "revoke", name] + ([reason] if reason else [])
+                    _, err, code = transport.run(argv, cwd=str(ersa))
+                    results[name] = None if code == 0 else CertificateError(err.strip() or "easyrsa revoke failed")
+                if any(not isinstance(outcome, CertificateError) for outcome in results.values()):
+                    _, err, code = transport.run(["./easyrsa", "--batch", "--days=3650", "gen-crl"], cwd=str(ersa))
+                    if code != 0:
+                        raise CertificateError(f"Certificates revoked but the CRL was not rebuilt: "
+                                               f"{err.strip() or 'easyrsa gen-crl failed'}")
+
+        if any(not isinstance(outcome, CertificateError) for outcome in results.values()):
+            try:
+                cls.install_crl()
+            except OSError as e:
+                raise CertificateError(f"Certificates revoked but the new CRL was not installed: {e}")
+        return results
+
     @classmethod
     def gen_cert(cls, client):
-        sanitized_client = re.sub(r'[^0-9a-zA-Z_-]', '_', client)
+        sanitized_client = cls.sanitize(client)
 
         if not sanitized_client:
             print("Invalid client name.")
@@ -245,92 +370,119 @@ class VPNManager:
         ersa = cls.get("server", "easy-rsa")
         if not ersa.exists():
             raise PathError
-        current_dir = os.getcwd()
-        os.chdir(ersa)
-        subprocess.run([
-            "./easyrsa",
-            "--batch",
-            "--days=3650",
-            "build-client-full",
-            sanitized_client,
-            "nopass"
-        ], check=True)
-        print(f"Certificate generated for {sanitized_client}")
-
-        common = cls.get("server", "client-common.txt")
-        ca = cls.get("server", "easy-rsa", "pki", "ca.crt")
-        cert = cls.get("server", "easy-rsa", "pki", "issued", sanitized_client + ".crt")
-        key = cls.get("server", "easy-rsa", "pki", "private", sanitized_client + ".key")
-        cls._check_exists(ersa, common, ca, cert, key)
-        match = re.search(r'remote\s+(\d+\.\d+\.\d+\.\d+)', common.read_text())
-        remote_ip = match.group(1) if match else "Invalid"
-        ca = ca.read_text()
-        cert = subprocess.run(f"sed -ne '/BEGIN CERTIFICATE/,$ p' {cert}", shell=True, check=True, text=True,
-                              capture_output=True).stdout
-
-        key = key.read_text()
-        tls_cmd = f"sed -ne '/BEGIN OpenVPN Static key/,$ p' {cls.get('server', 'ta.key')}"
-        print("on the halfWay")
-        tls = subprocess.run(tls_cmd, shell=True, check=True, text=True, capture_output=True).stdout
-        template = render_template("cert.ovpn",
-                                   ca=ca.strip(),
-                                   cert=cert.strip(),
-                                   key=key.strip(),
-                                   tls=False,
-                                   ip=remote_ip)
-        print(f"Template rendered for {template}")
-        cls.save_client(sanitized_client, template)
-        os.chdir(current_dir)
-        print(f"Client saved for {sanitized_client}")
+        issued = cls._submit(cls._issue, [sanitized_client])[sanitized_client]
+        if isinstance(issued, CertificateError):
+            raise issued
+        print(f"Certificate generated and client saved for {sanitized_client}")
         return True
 
     @classmethod
-    def revoke(cls, client_name):
-        try:
-            ersa = cls.get("server", "easy-rsa")
-            pki = ersa / "pki"
-            crl_source = pki / "crl.pem"
-            crl_dest = cls.get("server", "crl.pem")
-            group_name = "nogroup"  # Adjust if your OpenVPN uses a different group
-
-            if not ersa.exists():
-                raise FileNotFoundError(f"Easy-RSA path not found: {ersa}")
-
-            os.chdir(ersa)
-
-            # Revoke certificate
-            subprocess.run(["./easyrsa", "--batch", "revoke", client_name], check=True)
+    def gen_certs(cls, clients):
+        """
+        Provision many clients in one go: keys are generated in parallel and all
+        certificates are signed in one batch. Returns one result per requested client,
+        in order; a failure for one client does not stop the others.
+        """
+        results, names = [], set()
+        for client in clients:
+            name = cls.sanitize(str(client))
+            result = {"client": client, "name": name}
+            if not name:
+                result.update(success=False, error="Invalid client name")
+            elif name in names:
+                result.update(success=False, error="Duplicate client name in request")
+            names.add(name)
+            results.append(result)
+        pending = [result for result in results if "success" not in result]
 
-            # Generate new CRL valid for 10 years
-            subprocess.run(["./easyrsa", "--batch", "--days=3650", "gen-crl"], check=True)
+        ersa = cls.get("server", "easy-rsa")
+        if not ersa.exists():
+            raise PathError
+        issued = cls._submit(cls._issue, [result["name"] for result in pending])
+        for result in pending:
+            outcome = issued[result["name"]]
+            if isinstance(outcome, CertificateError):
+                result.update(success=False, error=str(outcome))
+                continue
+            result.update(success=True, serial=outcome.serial, expires=outcome.not_after.isoformat())
+        return results
 
-            # Remove certificate-related files
-            req_file = pki / "reqs" / f"{client_name}.req"
-            key_file = pki / "private" / f"{client_name}.key"
+    @classmethod
+    def _read_issued(cls, name):
+        """Certificate and key written by easy-rsa; the certificate file starts with a text dump"""
+        cert = cls.get("server", "easy-rsa", "pki", "issued", name + ".crt")
+        key = cls.get("server", "easy-rsa", "pki", "private", name + ".key")
+        cls._check_exists(cert, key)
+        return extract_pem(cert.read_text()), key.read_text()
 
-            for file_path in [crl_dest, req_file, key_file]:
-                try:
-                    if file_path.exists():
-                        file_path.unlink()
-                except Exception as e:
-                    print(f"Warning: Could not delete {file_path}: {e}")
+    @classmethod
+    def _save_client_config(cls, name, cert, key):
+        get_config_builder().build(name, cert, key)
 
-            # Copy updated CRL to OpenVPN server directory
-            subprocess.run(["cp", str(crl_source), str(crl_dest)], check=True)
+    @classmethod
+    def install_crl(cls):
+        """Atomically replace the CRL OpenVPN reads with pki/crl.pem, owned by the user OpenVPN runs as"""
+        source = cls.get("server", "easy-rsa", "pki", "crl.pem")
+        dest = Path(settings.CRL_INSTALL["path"])
+        tmp = dest.with_name(f".{dest.name}.{os.getpid()}")
+        try:
+            tmp.write_bytes(source.read_bytes())
+            try:
+                shutil.chown(tmp, settings.CRL_INSTALL["owner"], settings.CRL_INSTALL["group"])
+            except (LookupError, PermissionError) as e:
+                print(f"Warning: Could not set CRL owner: {e}")
+            tmp.chmod(0o644)
+            # OpenVPN re-reads crl-verify on every TLS handshake, so no restart is needed
+            os.replace(tmp, dest)
+        finally:
+            # Only left behind if something above failed
+            tmp.unlink(missing_ok=True)
 
-            # Set proper permissions (OpenVPN reads CRL as 'nobody')
-            subprocess.run(["chown", f"nobody:{group_name}", str(crl_dest)], check=True)
+    @classmethod
+    def revoke_many(cls, clients, reason=""):
+        """
+        Revoke many clients with one CRL rebuild: every certificate is marked revoked in
+        index.txt, crl.pem is regenerated and installed once, and only the revoked
+        clients' sessions are disconnected. Returns one result per client, in order.
+        """
+        ersa = cls.get("server", "easy-rsa")
+        if not ersa.exists():
+            raise PathError
+        revoked = cls._submit(cls._revoke, list(dict.fromkeys(clients)), reason)
+
+        results = []
+        for client in clients:
+            outcome = revoked[client]
+            if isinstance(outcome, CertificateError):
+                results.append({"name": client, "success": False, "error": str(outcome)})
+            else:
+                results.append({"name": client, "success": True, "serial": outcome})
+
+        revoked_names = list(dict.fromkeys(result["name"] for result in results if result["success"]))
+        if revoked_names:
+            # The new CRL stops reconnects; kill the live sessions and check they are gone
+            gone = kill_clients(revoked_names, verify=True)
+            for result in results:
+                if result["success"]:
+                    result["disconnected"] = gone.get(result["name"], False)
+        return results
 
+    @classmethod
+    def revoke(cls, client_name):
+        try:
+            result = cls.revoke_many([client_name])[0]
+            if not result["success"]:
+                print(f"Error during revocation process: {result['error']}")
+                return False
+            if not result["disconnected"]:
+                print(f"Warning: {client_name} may still have a live session")
             print(f"\n{client_name} revoked!")
-
-            # Restart OpenVPN service (optional but useful)
-            subprocess.run(["systemctl", "restart", "openvpn-server@server"], check=False)
-            subprocess.run(["systemctl", "restart", "openvpn"], check=False)
-
+            return True
         except subprocess.CalledProcessError as e:
             print(f"Error during revocation process: {e}")
         except Exception as ex:
             print(f"Unexpected error: {ex}")
+        return False
 
     @classmethod
     def delete_client(cls,client_name):
@@ -351,11 +503,8 @@ class VPNManager:
             return []
 
         try:
-            result = subprocess.run(
-                ['tail', f'-{lines}', str(log_path)],
-                capture_output=True, text=True, check=True
-            )
-            return result.stdout.splitlines()
+            stdout, _, _ = get_transport().run(['tail', f'-{lines}', log_path], check=True)
+            return stdout.splitlines()
         except subprocess.CalledProcessError:
             return ["Error reading logs"]
 
@@ -1,3 +1,26 @@
 class PathError(Exception):
     def __init__(self, message="Path not found!", *args, **kwargs):
         super().__init__(message, *args, *kwargs)
+
+
+class HostAgentError(Exception):
+    def __init__(self, message="Host agent error", code=None, *args):
+        super().__init__(message, *args)
+        self.code = code
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, message="Request deadline exceeded", *args):
+        super().__init__(message, *args)
+
+
+class CertificateError(Exception):
+    def __init__(self, message="Certificate issuance failed", *args):
+        super().__init__(message, *args)
+
+
+class PkiQueueTimeout(CertificateError):
+    """A queued PKI operation outlived the wait; it is still running and will complete"""
+
+    def __init__(self, message="PKI operation is still running", *args):
+        super().__init__(message, *args)
@@ -0,0 +1,505 @@
+import collections
+import fcntl
+import logging
+import os
+import queue
+import socket
+import tempfile
+import threading
+import time
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import settings
+from main import deadline
+
+logger = logging.getLogger(__name__)
+
+
+class _Request:
+    __slots__ = ("command", "lines", "ok", "sent_at", "callback", "done")
+
+    def __init__(self, command: str, callback: Optional[Callable[["_Request"], None]] = None):
+        self.command = command
+        self.lines: List[str] = []
+        self.ok = False
+        self.sent_at = 0.0
+        self.callback = callback
+        self.done = threading.Event()
+
+    def finish(self, ok: bool):
+        self.ok = ok
+        self.done.set()
+        if self.callback:
+            try:
+                self.callback(self)
+            except Exception as e:
+                logger.error(f"Error in management response callback: {str(e)}")
+
+
+class ManagementClient:
+    """
+    Long-lived client of one OpenVPN management interface.
+
+    OpenVPN serves a single management connection at a time, so across gunicorn
+    workers one process (whichever holds an flock on `<socket_path>.lock`) keeps the
+    TCP connection and re-exposes it on a unix socket; the other workers connect to
+    that socket and speak the same protocol. Every process frames lines from its
+    connection in one reader thread: ">" lines are real-time notifications handed to
+    subscribers, everything else answers the oldest outstanding request (OpenVPN
+    answers commands in order). A response ends at END, or is a single SUCCESS:/ERROR:
+    line. Requests are queued and written back to back, so a batch of commands costs
+    one round trip. A lost connection fails what is outstanding and is re-established
+    with exponential backoff; whoever gets the lock next takes over the TCP connection.
+    """
+
+    def __init__(self, host: str, port: int, socket_path: Optional[str] = None,
+                 reconnect_max: float = 30.0, stall_timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path or os.path.join(tempfile.gettempdir(), f"openvpn-management-{port}.sock")
+        self.reconnect_max = reconnect_max
+        self.stall_timeout = stall_timeout
+        self._lock = threading.Lock()  # Guards the socket, the request queue and connection state
+        self._sock: Optional[socket.socket] = None
+        self._pending: Deque[_Request] = collections.deque()
+        self._connected = threading.Event()
+        self._state = threading.Condition(self._lock)  # Notified when a connect attempt succeeds or fails
+        self._failed = False  # Whether the last connect attempt failed
+        self._stop = threading.Event()
+        self._subscribers: List[Callable[[str], None]] = []
+        self._connect_callbacks: List[Callable[[], None]] = []
+        self.generation = 0  # Bumped on every (re)connect
+        self._thread_pid = None
+        self._lock_file = None
+        self._server: Optional[socket.socket] = None
+        self._downstream: Set["_Downstream"] = set()
+        self._downstream_lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    @property
+    def leading(self) -> bool:
+        """Whether this process holds the TCP connection to OpenVPN"""
+        return self._lock_file is not None
+
+    def subscribe(self, callback: Callable[[str], None]):
+        """Call `callback(line)` for every real-time notification (">CLIENT:...", ">BYTECOUNT_CLI:...")"""
+        self._subscribers.append(callback)
+
+    def on_connect(self, callback: Callable[[], None]):
+        """Call `callback()` (on its own thread, so it may send commands) after every (re)connect"""
+        self._connect_callbacks.append(callback)
+
+    def _connected_callbacks(self):
+        for callback in self._connect_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error in management connect callback: {str(e)}")
+
+    def _after_fork(self):
+        # Threads do not survive a fork and a lock may have been held by one of them, so the
+        # child starts over with fresh locks and state; closing its copies of the parent's
+        # sockets and flock file leaves the parent's open
+        for resource in [self._sock, self._server, self._lock_file] + [d.sock for d in self._downstream]:
+            if resource is not None:
+                resource.close()
+        self._sock = self._server = self._lock_file = None
+        self._lock = threading.Lock()
+        self._state = threading.Condition(self._lock)
+        self._failed = False
+        self._pending = collections.deque()
+        self._connected = threading.Event()
+        self._stop = threading.Event()
+        self._downstream = set()
+        self._downstream_lock = threading.Lock()
+        self._thread_pid = None
+
+    def start(self):
+        # Started lazily in each worker (never in gunicorn's preloading master)
+        if self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        self._stop.clear()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            if self._sock is not None:
+                try:
+                    self._sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def _lead(self) -> bool:
+        lock_file = open(f"{self.socket_path}.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _connect(self) -> socket.socket:
+        if self._lead():
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=5)
+                try:
+                    self._serve()
+                except OSError:
+                    sock.close()
+                    raise
+                return sock
+            except OSError:
+                self._resign()
+                raise
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(5)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _resign(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        with self._downstream_lock:
+            downstream, self._downstream = self._downstream, set()
+        for conn in downstream:
+            conn.close()
+        if self._lock_file is not None:
+            self._lock_file.close()  # Releases the flock
+            self._lock_file = None
+
+    def _run(self):
+        backoff = 0.5
+        while not self._stop.is_set():
+            try:
+                sock = self._connect()
+            except OSError as e:
+                logger.debug(f"Management interface unavailable: {str(e)}")
+                with self._lock:
+                    self._failed = True
+                    self._state.notify_all()
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.reconnect_max)
+                continue
+
+            connected_at = time.monotonic()
+            with self._lock:
+                self._sock = sock
+                self.generation += 1
+                self._failed = False
+                self._connected.set()
+                self._state.notify_all()
+            if self._connect_callbacks:
+                threading.Thread(target=self._connected_callbacks, daemon=True).start()
+            try:
+                self._read(sock)
+            except OSError as e:
+                logger.warning(f"Management connection lost: {str(e)}")
+            finally:
+                with self._lock:
+                    self._connected.clear()
+                    self._sock = None
+                    pending, self._pending = self._pending, collections.deque()
+                sock.close()
+                for request in pending:
+                    request.finish(False)
+                self._resign()
+
+            # A connection that stayed up for a while resets the backoff
+            if time.monotonic() - connected_at > self.reconnect_max:
+                backoff = 0.5
+            else:
+                backoff = min(backoff * 2, self.reconnect_max)
+            if not self._stop.is_set():
+                self._stop.wait(backoff)
+
+    def _read(self, sock: socket.socket):
+        sock.settimeout(1.0)
+        buffer = b""
+        while not self._stop.is_set():
+            try:
+                data = sock.recv(65536)
+            except socket.timeout:
+                with self._lock:
+                    head = self._pending[0] if self._pending else None
+                if head and time.monotonic() - head.sent_at > self.stall_timeout:
+                    raise OSError(f"no response to '{head.command}' within {self.stall_timeout:g}s")
+                continue
+            if not data:
+                return
+            # Only the unterminated tail is carried over, so framing stays linear in the output size
+            *lines, buffer = (buffer + data).split(b"\n")
+            for raw in lines:
+                self._dispatch(raw.decode(errors="replace").rstrip("\r"))
+
+    def _dispatch(self, line: str):
+        if line.startswith(">"):
+            for callback in self._subscribers:
+                try:
+                    callback(line)
+                except Exception as e:
+                    logger.error(f"Error in management notification subscriber: {str(e)}")
+            self._broadcast(line)
+            return
+        with self._lock:
+            if not self._pending:
+                return  # Nothing asked for this (e.g. the rest of a response whose request was dropped)
+            request = self._pending[0]
+            request.lines.append(line)
+            complete = line == "END" or (len(request.lines) == 1 and line.startswith(("SUCCESS:", "ERROR:")))
+            if complete:
+                self._pending.popleft()
+        if complete:
+            request.finish(True)
+
+    def _submit(self, requests: List[_Request]) -> bool:
+        """Queue requests and write them in one go; False (with the requests failed) if not connected"""
+        with self._lock:
+            if self._sock is not None:
+                now = time.monotonic()
+                for request in requests:
+                    request.sent_at = now
+                self._pending.extend(requests)
+                try:
+                    self._sock.sendall("".join(f"{request.command}\n" for request in requests).encode())
+                    return True
+                except OSError as e:
+                    # The reader sees the broken connection and fails everything outstanding
+                    logger.warning(f"Error writing to management connection: {str(e)}")
+                    try:
+                        self._sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+                    return True
+        for request in requests:
+            request.finish(False)
+        return False
+
+    def wait_connected(self, timeout: float) -> bool:
+        """
+        Wait for the connection, up to timeout (bounded by the request deadline).
+
+        A connect in progress is waited out, but one that already failed is not: while
+        OpenVPN is down every caller would otherwise sit through the whole timeout.
+        """
+        self.start()
+        with self._lock:
+            self._state.wait_for(lambda: self._sock is not None or self._failed, deadline.timeout(timeout))
+            return self._sock is not None
+
+    def request(self, commands: List[str], timeout: float = 5) -> List[List[str]]:
+        """
+        Run commands, pipelined on the shared connection.
+
+        Returns the response lines of each command, in order; a command that could not be
+        sent, or whose response did not arrive in time, gets an empty list.
+        """
+        if not commands:
+            return []
+        if not self.wait_connected(timeout):
+            deadline.check()
+            logger.error("Error communicating with management interface: not connected")
+            return [[] for _ in commands]
+
+        requests = [_Request(command) for command in commands]
+        self._submit(requests)
+        end = time.monotonic() + deadline.timeout(timeout)
+        responses = []
+        for request in requests:
+            if not request.done.wait(max(0.0, end - time.monotonic())):
+                deadline.check()
+                logger.error(f"Timed out waiting for management response to '{request.command}'")
+            responses.append(request.lines if request.done.is_set() and request.ok else [])
+        return responses
+
+    # Multiplexer: the leading process serves its connection to the other workers
+
+    def _serve(self):
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        server.listen(64)
+        self._server = server
+        threading.Thread(target=self._accept, args=(server,), daemon=True).start()
+
+    def _accept(self, server: socket.socket):
+        while True:
+            try:
+                sock, _ = server.accept()
+            except OSError:
+                return  # Closed on resign
+            conn = _Downstream(self, sock)
+            with self._downstream_lock:
+                self._downstream.add(conn)
+            threading.Thread(target=conn.run, daemon=True).start()
+
+    def _broadcast(self, line: str):
+        with self._downstream_lock:
+            downstream = list(self._downstream)
+        for conn in downstream:
+            conn.send(line)
+
+    def _drop(self, conn: "_Downstream"):
+        with self._downstream_lock:
+            self._downstream.discard(conn)
+
+
+class _Downstream:
+    """
+    One worker's connection to the leading process's multiplexer.
+
+    Writes go through a bounded outbound queue drained by the connection's own writer
+    thread, with a send timeout, so a worker that stops reading never blocks the
+    leader's reader: its queue fills up or its send times out, and only its connection
+    is dropped.
+    """
+
+    def __init__(self, client: ManagementClient, sock: socket.socket, max_queued: int = 4096):
+        self.client = client
+        self.sock = sock
+        self.sock.settimeout(2)
+        self._outbound: "queue.Queue[Optional[bytes]]" = queue.Queue(max_queued)
+        self._closed = threading.Event()
+
+    def send(self, *lines: str):
+        if self._closed.is_set():
+            return
+        try:
+            self._outbound.put_nowait("".join(f"{line}\r\n" for line in lines).encode())
+        except queue.Full:
+            logger.warning("Dropping a worker's management connection that stopped reading")
+            self.close()
+
+    def _write(self):
+        while True:
+            data = self._outbound.get()
+            if data is None or self._closed.is_set():
+                return
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                self.close()
+                return
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        try:
+            self._outbound.put_nowait(None)  # Wakes the writer
+        except queue.Full:
+            pass
+        self.client._drop(self)
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def _respond(self, request: _Request):
+        if request.ok:
+            self.send(*request.lines)
+        else:
+            self.send("ERROR: management interface unavailable")
+
+    def run(self):
+        threading.Thread(target=self._write, daemon=True).start()
+        self.send(">INFO:OpenVPN Management Interface (shared)")
+        buffer = b""
+        try:
+            while True:
+                try:
+                    data = self.sock.recv(65536)
+                except socket.timeout:
+                    continue  # The timeout is there for writes; an idle worker just has nothing to ask
+                if not data:
+                    break
+                *lines, buffer = (buffer + data).split(b"\n")
+                commands = [raw.decode(errors="replace").rstrip("\r") for raw in lines]
+                commands = [command for command in commands if command]
+                if any(command in ("quit", "exit") for command in commands):
+                    break  # Ends this worker's session, not the shared connection
+                # Responses come back in order, so each is written as soon as it completes
+                self.client._submit([_Request(command, self._respond) for command in commands])
+        except OSError:
+            pass
+        finally:
+            self.close()
+
+
+_clients: Dict[Tuple[str, int], ManagementClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_management_client(host: Optional[str] = None, port: Optional[int] = None) -> ManagementClient:
+    """The shared client of the management interface at host:port (settings.MANAGEMENT by default)"""
+    host = host or settings.MANAGEMENT["host"]
+    port = port or settings.MANAGEMENT["port"]
+    with _clients_lock:
+        client = _clients.get((host, port))
+        if client is None:
+            client = _clients[(host, port)] = ManagementClient(host, port,
+                                                               socket_path=settings.MANAGEMENT.get("socket"))
+        return client
+
+
+def send_management_commands(commands: List[str], host: Optional[str] = None,
+                             port: Optional[int] = None) -> List[List[str]]:
+    """
+    Run several commands on the OpenVPN management interface in one round trip.
+
+    Returns the response lines of each command, in order; a command that could not
+    be sent (or whose connection failed) gets an empty list.
+    """
+    return get_management_client(host, port).request(commands)
+
+
+def connected_common_names(**kwargs) -> Optional[Set[str]]:
+    """Common names with a session right now, or None if the management interface did not answer"""
+    lines = send_management_commands(["status 3"], **kwargs)[0]
+    if not lines:
+        return None
+    return {line.split("\t")[1] for line in lines if line.startswith("CLIENT_LIST\t") and line.count("\t") > 1}
+
+
+def kill_clients(common_names: List[str], verify: bool = False, attempts: int = 3, **kwargs) -> Dict[str, bool]:
+    """
+    Disconnect every session of each common name.
+
+    Without `verify` the result is whether OpenVPN reported a kill for each name. With
+    it, the server's client list is checked afterwards (killing again if a session is
+    still there) and the result is whether no session of the name remains.
+    """
+    responses = send_management_commands([f"kill {cn}" for cn in common_names], **kwargs)
+    killed = {cn: bool(lines) and lines[0].startswith("SUCCESS:") for cn, lines in zip(common_names, responses)}
+    if not verify:
+        return killed
+
+    gone = dict(killed)
+    for attempt in range(attempts):
+        connected = connected_common_names(**kwargs)
+        if connected is None:
+            logger.warning("Could not verify disconnects: no answer from the management interface")
+            break
+        gone = {cn: cn not in connected for cn in common_names}
+        remaining = [cn for cn, done in gone.items() if not done]
+        if not remaining or attempt == attempts - 1:
+            break
+        time.sleep(0.2 * (attempt + 1))
+        send_management_commands([f"kill {cn}" for cn in remaining], **kwargs)
+    return gone
@@ -0,0 +1,329 @@
+import collections
+import datetime
+import fcntl
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import settings
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK")
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+@dataclass
+class ResourceSample:
+    timestamp: float
+    pid: Optional[int]
+    cpu: float
+    memory: float
+    disk: float
+
+    def to_dict(self) -> Dict[str, float]:
+        return asdict(self)
+
+
+class ResourceMonitor:
+    """
+    Background sampler for the OpenVPN process and its config volume.
+
+    Reads /proc/<pid>/stat, /proc/meminfo and statvfs in-process every `interval`
+    seconds. CPU% is computed from the change in the process's CPU ticks between two
+    samples (100% = one core, like ps/top). The last `history` samples are kept in a
+    ring buffer so readers never touch the host.
+    """
+
+    def __init__(self, config_dir: str, pid_source: Optional[Callable[[], int]] = None,
+                 interval: float = 5, history: int = 120, proc_root: str = "/proc"):
+        self.config_dir = config_dir
+        self.pid_source = pid_source
+        self.interval = interval
+        self.proc_root = proc_root
+        self.samples = collections.deque(maxlen=history)
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._last_ticks = None  # (pid, ticks, monotonic time)
+        self._pid = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+
+    def _alive(self, pid: Optional[int]) -> bool:
+        return bool(pid) and os.path.exists(os.path.join(self.proc_root, str(pid)))
+
+    def _find_pid(self) -> Optional[int]:
+        # Keep the last known process while it is still alive, so the PID source is only asked after a restart
+        if self._alive(self._pid):
+            return self._pid
+
+        if self.pid_source:
+            try:
+                pid = self.pid_source()
+                if self._alive(pid):
+                    return pid
+            except Exception as e:
+                self.logger.debug(f"PID source failed: {str(e)}")
+
+        for entry in os.listdir(self.proc_root):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(os.path.join(self.proc_root, entry, "comm")) as f:
+                    if f.read().strip() == "openvpn":
+                        return int(entry)
+            except OSError:
+                continue
+        return None
+
+    def _read_process(self, pid: int):
+        """Return (utime + stime ticks, rss bytes) for pid"""
+        with open(os.path.join(self.proc_root, str(pid), "stat")) as f:
+            data = f.read()
+        # The command name may contain spaces, so split after its closing parenthesis
+        fields = data[data.rindex(")") + 2:].split()
+        # fields[0] is the state (field 3 in proc(5)); utime/stime are fields 14/15, rss is 24
+        return int(fields[11]) + int(fields[12]), int(fields[21]) * _PAGE_SIZE
+
+    def _mem_total(self) -> int:
+        with open(os.path.join(self.proc_root, "meminfo")) as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    def _disk_percent(self) -> float:
+        st = os.statvfs(self.config_dir)
+        used = st.f_blocks - st.f_bfree
+        usable = used + st.f_bavail
+        # Same formula as df's Use% column
+        return round(used * 100.0 / usable, 1) if usable else 0.0
+
+    def sample(self) -> ResourceSample:
+        """Take one sample now and append it to the ring buffer"""
+        with self._lock:
+            now = time.monotonic()
+            cpu = memory = disk = 0.0
+            pid = self._find_pid()
+            self._pid = pid
+
+            if pid:
+                try:
+                    ticks, rss = self._read_process(pid)
+                    if self._last_ticks and self._last_ticks[0] == pid and now > self._last_ticks[2]:
+                        cpu = (ticks - self._last_ticks[1]) / _CLK_TCK / (now - self._last_ticks[2]) * 100
+                    self._last_ticks = (pid, ticks, now)
+                    mem_total = self._mem_total()
+                    memory = rss * 100.0 / mem_total if mem_total else 0.0
+                except (OSError, ValueError, IndexError):
+                    pid = None
+                    self._last_ticks = None
+
+            try:
+                disk = self._disk_percent()
+            except OSError as e:
+                self.logger.warning(f"Cannot stat {self.config_dir}: {str(e)}")
+
+            result = ResourceSample(timestamp=time.time(), pid=pid, cpu=round(cpu, 1),
+                                    memory=round(memory, 1), disk=disk)
+            self.samples.append(result)
+            return result
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                self.logger.error(f"Error sampling resources: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        # Threads do not survive gunicorn's fork, so each worker starts its own sampler
+        if self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        self._stop.clear()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def latest(self) -> ResourceSample:
+        """Most recent sample, sampling synchronously if none exists yet"""
+        self.start()
+        if self.samples:
+            return self.samples[-1]
+        return self.sample()
+
+    def history(self) -> List[Dict[str, float]]:
+        return [s.to_dict() for s in list(self.samples)]
+
+
+@dataclass
+class BandwidthSample:
+    timestamp: float
+    rx_bps: float  # Bytes per second received on the tun devices (client uploads)
+    tx_bps: float  # Bytes per second sent on the tun devices (client downloads)
+
+    def to_dict(self) -> Dict[str, float]:
+        return asdict(self)
+
+
+class BandwidthSampler:
+    """
+    Rate sampler for the OpenVPN tun devices.
+
+    Reads the byte counters of every interface whose name starts with `prefix` from
+    /proc/net/dev every `interval` seconds and turns counter deltas into rates. Rates
+    go into a fixed-size ring buffer. Byte totals go into hourly buckets in SQLite
+    (kept for `hours` hours) for the traffic charts, so they survive restarts and read
+    the same from every worker; only the sampler holding an flock on
+    `<db_path>.traffic.lock` writes them, so each byte is counted once.
+    """
+
+    def __init__(self, interval: float = 5, history: int = 120, hours: int = 24 * 31,
+                 link_capacity_mbps: float = 100, prefix: str = "tun", proc_root: str = "/proc",
+                 db_path: str = "user_cache.db"):
+        self.interval = interval
+        self.link_capacity = link_capacity_mbps * 1000 * 1000 / 8  # bytes per second
+        self.prefix = prefix
+        self.proc_root = proc_root
+        self.hours = hours
+        self.db_path = db_path
+        self.samples = collections.deque(maxlen=history)
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Tuple[int, int]] = {}
+        self._last_time = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+        self._lock_file = None
+        self._init_db()
+
+    def _init_db(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS traffic_hourly (hour INTEGER PRIMARY KEY, rx INTEGER, tx INTEGER)")
+
+    def _lead(self) -> bool:
+        """Whether this process records the hourly totals, taking the flock if nobody holds it"""
+        if self._lock_file is not None:
+            return True
+        lock_file = open(f"{self.db_path}.traffic.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _read_counters(self) -> Dict[str, Tuple[int, int]]:
+        counters = {}
+        with open(os.path.join(self.proc_root, "net", "dev")) as f:
+            for line in f.readlines()[2:]:
+                name, _, data = line.partition(":")
+                name = name.strip()
+                if name.startswith(self.prefix):
+                    fields = data.split()
+                    counters[name] = (int(fields[0]), int(fields[8]))
+        return counters
+
+    def _delta(self, current: int, previous: int, elapsed: float) -> int:
+        if current >= previous:
+            return current - previous
+        # The counter went backwards: either it wrapped, or the device was recreated
+        modulus = 2 ** 32 if previous < 2 ** 32 else 2 ** 64
+        wrapped = current + modulus - previous
+        if wrapped <= self.link_capacity * elapsed * 2:
+            return wrapped
+        return current
+
+    def _add_to_hour(self, now: float, rx: int, tx: int) -> None:
+        hour = int(now // 3600 * 3600)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("INSERT INTO traffic_hourly (hour, rx, tx) VALUES (?, ?, ?) "
+                         "ON CONFLICT(hour) DO UPDATE SET rx = rx + excluded.rx, tx = tx + excluded.tx",
+                         (hour, rx, tx))
+            conn.execute("DELETE FROM traffic_hourly WHERE hour < ?", (hour - self.hours * 3600,))
+
+    def sample(self) -> Optional[BandwidthSample]:
+        """Read the counters once; returns None on the first read, which only sets the baseline"""
+        with self._lock:
+            now = time.time()
+            counters = self._read_counters()
+            result = None
+            # A sampler that just took over skips its first delta, which the previous holder may have counted
+            took_over = self._lock_file is None and self._lead()
+
+            if self._last_time is not None and now > self._last_time:
+                elapsed = now - self._last_time
+                rx = tx = 0
+                for name, (cur_rx, cur_tx) in counters.items():
+                    # A device that appeared since the last read counts from zero
+                    prev_rx, prev_tx = self._counters.get(name, (0, 0))
+                    rx += self._delta(cur_rx, prev_rx, elapsed)
+                    tx += self._delta(cur_tx, prev_tx, elapsed)
+                if self._lock_file is not None and not took_over:
+                    self._add_to_hour(now, rx, tx)
+                result = BandwidthSample(timestamp=now, rx_bps=round(rx / elapsed, 1), tx_bps=round(tx / elapsed, 1))
+                self.samples.append(result)
+
+            self._counters = counters
+            self._last_time = now
+            return result
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                self.logger.error(f"Error sampling tun counters: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        # Threads do not survive gunicorn's fork, so each worker starts its own sampler
+        if self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        self._stop.clear()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def latest(self) -> Optional[BandwidthSample]:
+        self.start()
+        return self.samples[-1] if self.samples else None
+
+    def utilization(self) -> float:
+        """Percentage of the link capacity used by the busier direction in the latest sample"""
+        sample = self.latest()
+        if not sample or not self.link_capacity:
+            return 0.0
+        return round(min(100.0, max(sample.rx_bps, sample.tx_bps) * 100 / self.link_capacity), 1)
+
+    def history(self) -> List[Dict[str, float]]:
+        return [s.to_dict() for s in list(self.samples)]
+
+    def totals_between(self, start: datetime.datetime, end: datetime.datetime) -> Tuple[int, int]:
+        """Bytes (rx, tx) recorded in the hourly buckets that start within [start, end)"""
+        self.start()
+        with sqlite3.connect(self.db_path) as conn:
+            rx, tx = conn.execute("SELECT COALESCE(SUM(rx), 0), COALESCE(SUM(tx), 0) FROM traffic_hourly "
+                                  "WHERE hour >= ? AND hour < ?", (start.timestamp(), end.timestamp())).fetchone()
+        return rx, tx
+
+
+def create_resource_monitor(config_dir: str, pid_source: Optional[Callable[[], int]] = None) -> ResourceMonitor:
+    conf = settings.METRICS
+    return ResourceMonitor(config_dir, pid_source=pid_source, interval=conf["interval"],
+                           history=conf["history"], proc_root=conf["proc_root"])
+
+
+def create_bandwidth_sampler(db_path: str = "user_cache.db") -> BandwidthSampler:
+    conf = settings.METRICS
+    return BandwidthSampler(interval=conf["bandwidth_interval"], history=conf["history"],
+                            link_capacity_mbps=conf["link_capacity_mbps"], prefix=conf["interface_prefix"],
+                            proc_root=conf["proc_root"], db_path=db_path)
@@ -1,6 +1,8 @@
-from flask import Flask, request, abort
+from flask import Flask, request, abort, jsonify
 
 import settings
+from main import deadline
+from main.exceptions import DeadlineExceeded
 
 
 def init_middleware(app: Flask):
@@ -10,3 +12,15 @@ def init_middleware(app: Flask):
         origin = request.headers.get('Origin')
         if origin and origin not in allowed_origins:
             abort(403, description="Origin not allowed")
+
+    @app.before_request
+    def start_deadline():
+        deadline.start(settings.REQUEST_DEADLINE)
+
+    @app.teardown_request
+    def clear_deadline(exc=None):
+        deadline.clear()
+
+    @app.errorhandler(DeadlineExceeded)
+    def deadline_exceeded(e):
+        return jsonify({"status": "error", "message": str(e), "partial": True}), 504
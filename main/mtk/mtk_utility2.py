@@ -6,7 +6,9 @@ from helpers import logger
 
 import routeros_api
 
+from main import deadline
 from main.dir_manager import VPNManager
+from settings import CONFIG
 
 VALID_API_KEYS = {os.environ.get("API_KEY", "test-api-key")}
 
@@ -29,7 +31,9 @@ class RadiusManager:
             host=RADIUS_DB["host"],
             user=RADIUS_DB["user"],
             password=RADIUS_DB["password"],
-            database=RADIUS_DB["database"]
+            database=RADIUS_DB["database"],
+            # mysql-connector only takes whole seconds
+            connection_timeout=max(1, int(deadline.timeout(CONFIG["connection_timeout"])))
         )
     
     @staticmethod
@@ -372,8 +376,9 @@ def connect_to_router(router_credentials) -> routeros_api.api.RouterOsApi:
             port=router_credentials.get("port", 8728),  # Default port is 8728 for API
             use_ssl=router_credentials.get("use_ssl", False),
             ssl_verify=router_credentials.get("ssl_verify", True),
-            # timeout=5  # Add a timeout of 5 seconds
         )
+        # Covers the connect and every later API call on this socket
+        connection.socket_timeout = deadline.timeout(CONFIG["connection_timeout"])
         MTK.conn = connection
         api = connection.get_api()
         logger.info(f"Successfully connected to router at {host}")
@@ -0,0 +1,6 @@
+from main.pki.crl import RevocationList, get_revocation_list
+from main.pki.index import CertificateIndex, IndexEntry
+from main.pki.inspector import CertRecord, CertificateInspector, get_certificate_inspector, parse_certificate
+from main.pki.issuer import CertificateIssuer, IssuedCertificate, get_certificate_issuer
+from main.pki.service import PkiService, get_pki_service
+from main.pki.expiry import ExpiryEvent, ExpiryTracker
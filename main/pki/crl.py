@@ -0,0 +1,127 @@
+import datetime
+import os
+import threading
+from typing import Dict, FrozenSet, Iterable, Optional, Union
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+
+from main.pki.index import IndexEntry
+from main.pki.inspector import serial_hex
+
+# easy-rsa's revoke reasons (as written to index.txt) to CRL reason codes
+REASONS = {
+    "unspecified": x509.ReasonFlags.unspecified,
+    "keyCompromise": x509.ReasonFlags.key_compromise,
+    "CACompromise": x509.ReasonFlags.ca_compromise,
+    "affiliationChanged": x509.ReasonFlags.affiliation_changed,
+    "superseded": x509.ReasonFlags.superseded,
+    "cessationOfOperation": x509.ReasonFlags.cessation_of_operation,
+    "certificateHold": x509.ReasonFlags.certificate_hold,
+}
+
+
+class RevocationList:
+    """
+    Revoked serials from a CRL file, parsed in-process.
+
+    The CRL is parsed once into a set of serials (upper-case hex, as in index.txt)
+    and re-parsed only when the file's inode, mtime or size changes, so
+    is_revoked() is a set lookup.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._serials: FrozenSet[str] = frozenset()
+        self.last_update: Optional[datetime.datetime] = None
+        self.next_update: Optional[datetime.datetime] = None
+
+    def _load(self) -> bool:
+        """Re-parse the CRL if it changed; returns True if it was (re)loaded"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            changed = self._stamp is not None
+            self._stamp, self._serials = None, frozenset()
+            self.last_update = self.next_update = None
+            return changed
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return False
+
+        with open(self.path, "rb") as f:
+            data = f.read()
+        crl = x509.load_pem_x509_crl(data) if b"-----BEGIN" in data else x509.load_der_x509_crl(data)
+        self._serials = frozenset(serial_hex(revoked.serial_number) for revoked in crl)
+        self.last_update = crl.last_update_utc
+        self.next_update = crl.next_update_utc
+        self._stamp = stamp
+        return True
+
+    def refresh(self) -> bool:
+        with self._lock:
+            return self._load()
+
+    @property
+    def mtime(self) -> float:
+        """Modification time of the loaded CRL (0 if there is none)"""
+        with self._lock:
+            self._load()
+            return self._stamp[1] / 1e9 if self._stamp else 0
+
+    def serials(self) -> FrozenSet[str]:
+        with self._lock:
+            self._load()
+            return self._serials
+
+    def is_revoked(self, serial: Union[int, str]) -> bool:
+        if isinstance(serial, int):
+            serial = serial_hex(serial)
+        else:
+            serial = serial.upper()
+            if len(serial) % 2:
+                serial = "0" + serial
+        return serial in self.serials()
+
+    def __len__(self):
+        return len(self.serials())
+
+
+_lists: Dict[str, RevocationList] = {}
+_lists_lock = threading.Lock()
+
+
+def get_revocation_list(path: str) -> RevocationList:
+    """Shared RevocationList per CRL path, so the user listing and the cache refresher parse it once"""
+    with _lists_lock:
+        if path not in _lists:
+            _lists[path] = RevocationList(path)
+        return _lists[path]
+
+
+def build_crl(ca_cert: x509.Certificate, ca_key, revoked: Iterable[IndexEntry], days: int,
+              number: Optional[int] = None) -> bytes:
+    """Sign a PEM CRL listing the given revoked index entries, as `easyrsa gen-crl` would"""
+    now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    builder = (
+        x509.CertificateRevocationListBuilder()
+        .issuer_name(ca_cert.subject)
+        .last_update(now)
+        .next_update(now + datetime.timedelta(days=days))
+        .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(ca_key.public_key()), critical=False)
+    )
+    if number is not None:
+        builder = builder.add_extension(x509.CRLNumber(number), critical=False)
+    for entry in revoked:
+        item = (
+            x509.RevokedCertificateBuilder()
+            .serial_number(int(entry.serial, 16))
+            .revocation_date(entry.revoked_at or now)
+        )
+        reason = REASONS.get(entry.revocation_reason)
+        if reason and reason != x509.ReasonFlags.unspecified:
+            item = item.add_extension(x509.CRLReason(reason), critical=False)
+        builder = builder.add_revoked_certificate(item.build())
+    return builder.sign(ca_key, hashes.SHA256()).public_bytes(serialization.Encoding.PEM)
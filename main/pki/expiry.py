@@ -0,0 +1,321 @@
+import datetime
+import fcntl
+import heapq
+import logging
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+EXPIRING = "expiring"
+EXPIRED = "expired"
+
+# (cn, serial, not_after) for every certificate that should be tracked
+Inventory = Iterable[Tuple[str, str, datetime.datetime]]
+
+
+@dataclass(frozen=True)
+class ExpiryEvent:
+    kind: str  # EXPIRING or EXPIRED
+    cn: str
+    serial: str
+    not_after: datetime.datetime
+    fired_at: datetime.datetime
+
+    def to_dict(self) -> Dict:
+        return {
+            "kind": self.kind,
+            "username": self.cn,
+            "serial": self.serial,
+            "expires": self.not_after.isoformat(),
+            "fired_at": self.fired_at.isoformat()
+        }
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class ExpiryTracker:
+    """
+    Tracks when client certificates expire.
+
+    Valid certificates sit in a min-heap of (notAfter, CN, serial); expired ones are
+    popped off the top, so the k soonest expiries are read by walking the heap from
+    the root without touching the rest. A second heap holds scheduled "expiring"
+    (notAfter - warning) and "expired" (notAfter) events.
+
+    Every worker keeps its own heaps for queries, but events are fired by one process
+    only: the scheduler thread of whichever holds an flock on `<db_path>.expiry.lock`
+    records each due event in SQLite (once per kind, CN and serial) and hands it to
+    the subscribers registered in that process. The other workers drop their due events
+    and read the recorded ones back through recent_events().
+
+    The inventory is re-read only when `version()` changes, and then only the
+    certificates that were added, re-issued or revoked are pushed; stale heap entries
+    are skipped lazily.
+    """
+
+    def __init__(self, inventory: Callable[[], Inventory], version: Callable[[], Hashable],
+                 warning: datetime.timedelta = datetime.timedelta(days=30), poll_interval: float = 300,
+                 db_path: str = "user_cache.db", history: int = 100,
+                 retention: datetime.timedelta = datetime.timedelta(days=90)):
+        self.inventory = inventory
+        self.version = version
+        self.warning = warning
+        self.poll_interval = poll_interval
+        self.db_path = db_path
+        self.history = history  # Events returned by recent_events()
+        self.retention = retention  # How long fired events are kept
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._version = None
+        self._current: Dict[str, Tuple[datetime.datetime, str]] = {}
+        self._heap: List[Tuple[datetime.datetime, str, str]] = []
+        self._schedule: List[Tuple[datetime.datetime, str, str, str]] = []
+        self._expired: Dict[str, Tuple[datetime.datetime, str]] = {}
+        self._subscribers: List[Callable[[ExpiryEvent], None]] = [self._log_event]
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread_pid = None
+        self._lock_file = None
+        self._init_db()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _init_db(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS expiry_events (
+                    kind TEXT,
+                    cn TEXT,
+                    serial TEXT,
+                    not_after TEXT,
+                    fired_at TEXT,
+                    PRIMARY KEY (kind, cn, serial)
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS expiry_events_fired_at ON expiry_events (fired_at)")
+
+    def _after_fork(self):
+        # The child starts its own scheduler; a lock held by one of the parent's threads must not carry over
+        if self._lock_file is not None:
+            self._lock_file.close()  # The parent's descriptor keeps its flock
+            self._lock_file = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread_pid = None
+
+    def _log_event(self, event: ExpiryEvent):
+        if event.kind == EXPIRED:
+            self.logger.warning(f"Certificate for {event.cn} expired at {event.not_after.isoformat()}")
+        else:
+            self.logger.warning(f"Certificate for {event.cn} expires at {event.not_after.isoformat()}")
+
+    def subscribe(self, callback: Callable[[ExpiryEvent], None]):
+        self._subscribers.append(callback)
+
+    def _live(self, not_after: datetime.datetime, cn: str, serial: str) -> bool:
+        """Whether a heap entry is still the CN's current certificate"""
+        return self._current.get(cn) == (not_after, serial)
+
+    def _event_cert(self, event: Tuple[datetime.datetime, str, str, str]) -> Optional[datetime.datetime]:
+        """notAfter of a scheduled event's certificate if that certificate is still current, else None"""
+        fire_at, kind, cn, serial = event
+        not_after = fire_at if kind == EXPIRED else fire_at + self.warning
+        if self._live(not_after, cn, serial) or self._expired.get(cn) == (not_after, serial):
+            return not_after
+        return None
+
+    def _track(self, cn: str, serial: str, not_after: datetime.datetime, now: datetime.datetime):
+        self._current[cn] = (not_after, serial)
+        self._expired.pop(cn, None)
+        heapq.heappush(self._heap, (not_after, cn, serial))
+        # Only events still ahead are scheduled; certificates found already past them are not announced
+        for fire_at, kind in ((not_after - self.warning, EXPIRING), (not_after, EXPIRED)):
+            if fire_at > now:
+                heapq.heappush(self._schedule, (fire_at, kind, cn, serial))
+
+    def _compact(self):
+        if len(self._heap) > 2 * len(self._current) + 64:
+            self._heap = [item for item in self._heap if self._live(*item)]
+            heapq.heapify(self._heap)
+        if len(self._schedule) > 4 * len(self._current) + 64:
+            self._schedule = [event for event in self._schedule if self._event_cert(event)]
+            heapq.heapify(self._schedule)
+
+    def _pop_expired(self, now: datetime.datetime):
+        while self._heap and (self._heap[0][0] <= now or not self._live(*self._heap[0])):
+            not_after, cn, serial = heapq.heappop(self._heap)
+            if self._live(not_after, cn, serial):
+                self._expired[cn] = self._current.pop(cn)
+
+    def refresh(self) -> bool:
+        """Apply inventory changes; returns True if anything was re-read"""
+        version = self.version()
+        if version == self._version:
+            return False
+        # Read outside the lock: the inventory may parse index.txt or sync the certificate store,
+        # and queries and the scheduler should not wait behind that I/O
+        latest = {cn: (not_after, serial) for cn, serial, not_after in self.inventory() if not_after}
+        with self._lock:
+            if version == self._version:
+                return False  # Another thread applied it meanwhile
+            now = _now()
+            for cn in set(self._current) - set(latest):
+                del self._current[cn]
+            for cn in set(self._expired) - set(latest):
+                del self._expired[cn]
+            for cn, (not_after, serial) in latest.items():
+                if self._current.get(cn) != (not_after, serial) and self._expired.get(cn) != (not_after, serial):
+                    self._track(cn, serial, not_after, now)
+            self._pop_expired(now)
+            self._compact()
+            self._version = version
+        self._wake.set()
+        return True
+
+    def _walk(self, limit: Optional[int] = None, until: Optional[datetime.datetime] = None):
+        """Yield live heap entries in expiry order, visiting only the nodes above the result"""
+        frontier = [(self._heap[0], 0)] if self._heap else []
+        found = 0
+        while frontier and (limit is None or found < limit):
+            item, i = heapq.heappop(frontier)
+            if until is not None and item[0] > until:
+                break
+            if self._live(*item):
+                found += 1
+                yield item
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(self._heap):
+                    heapq.heappush(frontier, (self._heap[child], child))
+
+    def next_expiring(self, k: int = 10) -> List[Dict]:
+        """The k valid certificates that expire soonest"""
+        self.start()
+        self.refresh()
+        now = _now()
+        with self._lock:
+            self._pop_expired(now)
+            items = list(self._walk(limit=k))
+        return [{
+            "username": cn,
+            "serial": serial,
+            "expires": not_after.isoformat(),
+            "days_left": (not_after - now).days
+        } for not_after, cn, serial in items]
+
+    def expiring_within(self, window: datetime.timedelta) -> int:
+        self.start()
+        self.refresh()
+        now = _now()
+        with self._lock:
+            self._pop_expired(now)
+            return sum(1 for _ in self._walk(until=now + window))
+
+    def expired(self) -> List[str]:
+        self.start()
+        self.refresh()
+        with self._lock:
+            self._pop_expired(_now())
+            return sorted(self._expired)
+
+    def _lead(self) -> bool:
+        """Whether this process fires events, taking the flock if nobody holds it"""
+        if self._lock_file is not None:
+            return True
+        lock_file = open(f"{self.db_path}.expiry.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _record(self, events: List[ExpiryEvent]) -> List[ExpiryEvent]:
+        """Store fired events; returns those not already recorded (e.g. by a previous leader)"""
+        new = []
+        with sqlite3.connect(self.db_path) as conn:
+            for event in events:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO expiry_events (kind, cn, serial, not_after, fired_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (event.kind, event.cn, event.serial, event.not_after.isoformat(), event.fired_at.isoformat()))
+                if cursor.rowcount:
+                    new.append(event)
+            conn.execute("DELETE FROM expiry_events WHERE fired_at < ?", ((_now() - self.retention).isoformat(),))
+        return new
+
+    def recent_events(self) -> List[ExpiryEvent]:
+        """The most recent fired events, newest first, whichever process fired them"""
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute(
+                "SELECT kind, cn, serial, not_after, fired_at FROM expiry_events "
+                "ORDER BY fired_at DESC LIMIT ?", (self.history,)).fetchall()
+        return [ExpiryEvent(kind, cn, serial, datetime.datetime.fromisoformat(not_after),
+                            datetime.datetime.fromisoformat(fired_at))
+                for kind, cn, serial, not_after, fired_at in rows]
+
+    def _fire_due(self, leading: bool = True) -> Optional[datetime.datetime]:
+        """Fire every due event (or, when not leading, just drop them); returns when the next one is due"""
+        now = _now()
+        due = []
+        with self._lock:
+            while self._schedule and self._schedule[0][0] <= now:
+                event = heapq.heappop(self._schedule)
+                not_after = self._event_cert(event)
+                if not_after:
+                    due.append(ExpiryEvent(event[1], event[2], event[3], not_after, now))
+            self._pop_expired(now)
+            next_at = self._schedule[0][0] if self._schedule else None
+
+        if not leading or not due:
+            return next_at
+        for event in self._record(due):
+            for callback in self._subscribers:
+                try:
+                    callback(event)
+                except Exception as e:
+                    self.logger.error(f"Error in certificate expiry subscriber: {str(e)}")
+        return next_at
+
+    def start(self):
+        # Started lazily in each worker (never in gunicorn's preloading master); only the
+        # flock holder's scheduler fires events
+        if self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        self._stop.clear()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+                next_at = self._fire_due(self._lead())
+            except Exception as e:
+                self.logger.error(f"Error in certificate expiry tracker: {str(e)}")
+                next_at = None
+            wait = self.poll_interval
+            if next_at is not None:
+                wait = min(wait, max(0.0, (next_at - _now()).total_seconds()))
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def stats(self) -> Dict:
+        self.start()
+        self.refresh()
+        with self._lock:
+            self._pop_expired(_now())
+            return {
+                "tracked": len(self._current),
+                "expired": len(self._expired),
+                "scheduled_events": len(self._schedule),
+                "warning_days": self.warning.days
+            }
@@ -0,0 +1,166 @@
+import datetime
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from main.pki.inspector import OPENSSL_DATE_FORMAT
+
+VALID = "V"
+REVOKED = "R"
+EXPIRED = "E"
+
+
+def parse_index_time(value: str) -> Optional[datetime.datetime]:
+    """Parse an index.txt time (YYMMDDHHMMSSZ or YYYYMMDDHHMMSSZ) into an aware UTC datetime"""
+    value = value.strip()
+    if not value:
+        return None
+    fmt = "%y%m%d%H%M%SZ" if len(value) == 13 else "%Y%m%d%H%M%SZ"
+    try:
+        return datetime.datetime.strptime(value, fmt).replace(tzinfo=datetime.timezone.utc)
+    except ValueError:
+        return None
+
+
+def format_index_time(value: datetime.datetime) -> str:
+    """Format a datetime the way openssl ca writes index.txt (UTCTime until 2050)"""
+    value = value.astimezone(datetime.timezone.utc)
+    return value.strftime("%y%m%d%H%M%SZ" if value.year < 2050 else "%Y%m%d%H%M%SZ")
+
+
+def _subject_cn(subject: str) -> str:
+    # Subjects look like /C=US/O=Org/CN=alice; the last CN wins
+    cn = ""
+    for part in subject.split("/"):
+        if part.startswith("CN="):
+            cn = part[3:]
+    return cn
+
+
+@dataclass
+class IndexEntry:
+    status: str  # V (valid), R (revoked) or E (expired)
+    expires: Optional[datetime.datetime]
+    revoked_at: Optional[datetime.datetime]
+    revocation_reason: str
+    serial: str
+    filename: str
+    subject: str
+
+    @property
+    def cn(self) -> str:
+        return _subject_cn(self.subject)
+
+    @property
+    def is_valid(self) -> bool:
+        return self.status == VALID
+
+    @property
+    def expiry_date(self) -> str:
+        return self.expires.strftime(OPENSSL_DATE_FORMAT) if self.expires else "unknown"
+
+    @classmethod
+    def parse(cls, line: str) -> Optional["IndexEntry"]:
+        fields = line.rstrip("\n").split("\t")
+        if len(fields) < 6 or fields[0] not in (VALID, REVOKED, EXPIRED):
+            return None
+        revoked, _, reason = fields[2].partition(",")
+        return cls(
+            status=fields[0],
+            expires=parse_index_time(fields[1]),
+            revoked_at=parse_index_time(revoked),
+            revocation_reason=reason,
+            serial=fields[3].upper(),
+            filename=fields[4],
+            subject=fields[5]
+        )
+
+    def to_line(self) -> str:
+        revoked = ""
+        if self.revoked_at:
+            revoked = format_index_time(self.revoked_at)
+            if self.revocation_reason:
+                revoked += f",{self.revocation_reason}"
+        expires = format_index_time(self.expires) if self.expires else ""
+        return "\t".join([self.status, expires, revoked, self.serial, self.filename, self.subject]) + "\n"
+
+
+class CertificateIndex:
+    """
+    Certificate inventory read from easy-rsa's pki/index.txt.
+
+    The file is parsed in one pass into lookups by serial and by CN and re-read only
+    when its (inode, mtime, size) changes. A CN can appear several times (revoked and
+    re-issued); by_cn holds the most recent entry.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._entries: List[IndexEntry] = []
+        self._by_serial: Dict[str, IndexEntry] = {}
+        self._by_cn: Dict[str, IndexEntry] = {}
+        self._version = 0
+
+    def _load(self) -> None:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            if self._stamp is not None:
+                self._version += 1
+            self._stamp, self._entries, self._by_serial, self._by_cn = None, [], {}, {}
+            return
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return
+
+        entries = []
+        with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                entry = IndexEntry.parse(line)
+                if entry:
+                    entries.append(entry)
+        self._entries = entries
+        self._by_serial = {entry.serial: entry for entry in entries}
+        self._by_cn = {entry.cn: entry for entry in entries}
+        self._stamp = stamp
+        self._version += 1
+
+    def refresh(self) -> "CertificateIndex":
+        with self._lock:
+            self._load()
+        return self
+
+    def entries(self) -> List[IndexEntry]:
+        with self._lock:
+            self._load()
+            return list(self._entries)
+
+    def latest(self) -> List[IndexEntry]:
+        """The most recent entry for every CN"""
+        with self._lock:
+            self._load()
+            return list(self._by_cn.values())
+
+    def by_serial(self, serial: str) -> Optional[IndexEntry]:
+        with self._lock:
+            self._load()
+            return self._by_serial.get(serial.upper())
+
+    def by_cn(self, cn: str) -> Optional[IndexEntry]:
+        with self._lock:
+            self._load()
+            return self._by_cn.get(cn)
+
+    @property
+    def version(self) -> int:
+        """Bumped every time the file is re-read, so callers can tell cheaply whether it changed"""
+        with self._lock:
+            self._load()
+            return self._version
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
@@ -0,0 +1,100 @@
+import datetime
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+
+# openssl's date format, kept so API output does not change
+OPENSSL_DATE_FORMAT = "%b %d %H:%M:%S %Y GMT"
+
+
+@dataclass(frozen=True)
+class CertRecord:
+    cn: str
+    serial: str  # Upper-case hex, even length, as in easy-rsa's index.txt
+    not_before: datetime.datetime
+    not_after: datetime.datetime
+    fingerprint: str  # SHA-256, lower-case hex
+
+    @property
+    def expiry_date(self) -> str:
+        return self.not_after.strftime(OPENSSL_DATE_FORMAT)
+
+    @property
+    def created_at(self) -> str:
+        return self.not_before.replace(tzinfo=None).isoformat()
+
+
+def serial_hex(serial: int) -> str:
+    value = format(serial, "X")
+    return value if len(value) % 2 == 0 else "0" + value
+
+
+def parse_certificate(data: bytes) -> CertRecord:
+    """Parse a PEM or DER certificate into a CertRecord"""
+    if b"-----BEGIN" in data:
+        cert = x509.load_pem_x509_certificate(data)
+    else:
+        cert = x509.load_der_x509_certificate(data)
+    cn = cert.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)
+    return CertRecord(
+        cn=str(cn[0].value) if cn else "",
+        serial=serial_hex(cert.serial_number),
+        not_before=cert.not_valid_before_utc,
+        not_after=cert.not_valid_after_utc,
+        fingerprint=cert.fingerprint(hashes.SHA256()).hex()
+    )
+
+
+class CertificateInspector:
+    """
+    In-process certificate parser, memoized per file.
+
+    Results are keyed by path and reused while the file's (inode, mtime, size) is
+    unchanged, so re-inspecting an unchanged PKI costs one stat per certificate.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records: Dict[str, Tuple[tuple, CertRecord]] = {}
+
+    @staticmethod
+    def _stamp(st: os.stat_result) -> tuple:
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def inspect(self, path: str) -> Optional[CertRecord]:
+        """Return the record for a certificate file, or None if it is missing or unreadable"""
+        try:
+            with open(path, "rb") as f:
+                stamp = self._stamp(os.fstat(f.fileno()))
+                with self._lock:
+                    cached = self._records.get(path)
+                if cached and cached[0] == stamp:
+                    return cached[1]
+                record = parse_certificate(f.read())
+        except (OSError, ValueError):
+            with self._lock:
+                self._records.pop(path, None)
+            return None
+
+        with self._lock:
+            self._records[path] = (stamp, record)
+        return record
+
+    def forget(self, path: str) -> None:
+        with self._lock:
+            self._records.pop(path, None)
+
+    def __len__(self):
+        return len(self._records)
+
+
+_inspector = CertificateInspector()
+
+
+def get_certificate_inspector() -> CertificateInspector:
+    """Process-wide inspector, so every caller shares one memo"""
+    return _inspector
@@ -0,0 +1,343 @@
+import concurrent.futures
+import datetime
+import fcntl
+import logging
+import multiprocessing
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+
+from main.exceptions import CertificateError
+from main.pki.crl import REASONS, build_crl
+from main.pki.index import REVOKED, VALID, IndexEntry
+from main.pki.inspector import serial_hex
+from main.pki.keypool import KeyPool, KeySpec
+
+
+def generate_key_pem(spec: KeySpec) -> bytes:
+    """Generate an unencrypted PKCS#8 private key; top-level so it can run in a worker process"""
+    kind, param = spec
+    if kind == "ec":
+        key = ec.generate_private_key(getattr(ec, param.upper())())
+    else:
+        key = rsa.generate_private_key(public_exponent=65537, key_size=int(param))
+    return key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                             serialization.NoEncryption())
+
+
+@dataclass(frozen=True)
+class IssuedCertificate:
+    name: str
+    serial: str
+    cert_pem: str
+    key_pem: str
+    not_after: datetime.datetime
+
+
+class CertificateIssuer:
+    """
+    Signs (and revokes) client certificates in-process with the easy-rsa CA.
+
+    Produces what `easyrsa build-client-full <name> nopass` would: the key in
+    private/, the request in reqs/, the certificate in issued/ and certs_by_serial/,
+    a V line in index.txt and the next value in serial. Index and serial updates
+    happen under an flock on pki/.issuer.lock, so several workers can issue at once.
+    With a key pool, keys come from pre-generated stock and requests only sign.
+    """
+
+    def __init__(self, pki_dir: str, days: int = 3650, key_size: int = 2048,
+                 ca_passphrase: Optional[str] = None, workers: Optional[int] = None,
+                 key_pool_size: int = 0, key_pool_low_water: int = 0, crl_days: int = 3650):
+        self.pki_dir = pki_dir
+        self.days = days
+        self.crl_days = crl_days
+        self.key_size = key_size
+        self.ca_passphrase = ca_passphrase
+        self.workers = workers
+        self.logger = logging.getLogger(__name__)
+        self.key_pool = None
+        if key_pool_size > 0:
+            self.key_pool = KeyPool(self._path("private", "keypool"), self.key_spec, self.generate_keys,
+                                    size=key_pool_size, low_water=key_pool_low_water)
+        self._lock = threading.Lock()  # Serialises issuance within this process
+        self._ca_lock = threading.Lock()
+        self._ca = None
+        self._ca_stamp = None
+
+    def _path(self, *parts) -> str:
+        return os.path.join(self.pki_dir, *parts)
+
+    def _load_ca(self):
+        """The CA certificate and key, re-read only when either file changes"""
+        cert_path, key_path = self._path("ca.crt"), self._path("private", "ca.key")
+        try:
+            stamp = tuple((st.st_ino, st.st_mtime_ns, st.st_size) for st in map(os.stat, (cert_path, key_path)))
+        except OSError as e:
+            raise CertificateError(f"CA not found: {str(e)}")
+        with self._ca_lock:
+            if stamp != self._ca_stamp:
+                try:
+                    with open(cert_path, "rb") as f:
+                        cert = x509.load_pem_x509_certificate(f.read())
+                    with open(key_path, "rb") as f:
+                        password = self.ca_passphrase.encode() if self.ca_passphrase else None
+                        key = serialization.load_pem_private_key(f.read(), password=password)
+                except (TypeError, ValueError) as e:
+                    raise CertificateError(f"Cannot load CA: {str(e)}")
+                self._ca, self._ca_stamp = (cert, key), stamp
+            return self._ca
+
+    def available(self) -> bool:
+        """Whether the CA key can be used here (it may be missing or passphrase-protected)"""
+        try:
+            self._load_ca()
+            return True
+        except CertificateError:
+            return False
+
+    def key_spec(self) -> KeySpec:
+        """Client keys follow the CA's algorithm, like easy-rsa's EASYRSA_ALGO"""
+        _, ca_key = self._load_ca()
+        if isinstance(ca_key, ec.EllipticCurvePrivateKey):
+            return "ec", ca_key.curve.name
+        return "rsa", self.key_size
+
+    def generate_keys(self, count: int) -> List[bytes]:
+        """Generate `count` private keys, across a process pool when there is more than one"""
+        spec = self.key_spec()
+        if count <= 1:
+            return [generate_key_pem(spec) for _ in range(count)]
+        workers = max(1, min(self.workers or os.cpu_count() or 1, count))
+        # spawn rather than fork: this runs in a multi-threaded worker
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            return list(pool.map(generate_key_pem, [spec] * count))
+
+    @contextmanager
+    def locked(self):
+        """Exclusive use of the PKI, across threads and worker processes; anything running easy-rsa takes it too"""
+        with self._lock, open(self._path(".issuer.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _taken(self) -> set:
+        """Names easy-rsa would refuse to issue again: a valid index entry or an existing issued file"""
+        taken = set()
+        try:
+            with open(self._path("index.txt"), "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    entry = IndexEntry.parse(line)
+                    if entry and entry.is_valid:
+                        taken.add(entry.cn)
+        except FileNotFoundError:
+            pass
+        return taken
+
+    @staticmethod
+    def _write(path: str, data: bytes, mode: int = 0o644) -> None:
+        tmp = f"{path}.tmp{os.getpid()}"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _sign(self, name: str, key_pem: bytes) -> Tuple[IssuedCertificate, IndexEntry, int]:
+        ca_cert, ca_key = self._load_ca()
+        key = serialization.load_pem_private_key(key_pem, password=None)
+        subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)])
+        csr = x509.CertificateSigningRequestBuilder().subject_name(subject).sign(key, hashes.SHA256())
+
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        serial = x509.random_serial_number()
+        # Extensions from easy-rsa's x509-types/COMMON and x509-types/client
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(subject)
+            .issuer_name(ca_cert.subject)
+            .public_key(key.public_key())
+            .serial_number(serial)
+            .not_valid_before(now)
+            .not_valid_after(now + datetime.timedelta(days=self.days))
+            .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=False)
+            .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+            .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(ca_key.public_key()), critical=False)
+            .add_extension(x509.ExtendedKeyUsage([ExtendedKeyUsageOID.CLIENT_AUTH]), critical=False)
+            .add_extension(x509.KeyUsage(
+                digital_signature=True, content_commitment=False, key_encipherment=False, data_encipherment=False,
+                key_agreement=False, key_cert_sign=False, crl_sign=False, encipher_only=False, decipher_only=False
+            ), critical=False)
+            .sign(ca_key, hashes.SHA256())
+        )
+        cert_pem = cert.public_bytes(serialization.Encoding.PEM)
+        serial_str = serial_hex(serial)
+
+        self._write(self._path("private", f"{name}.key"), key_pem, 0o600)
+        self._write(self._path("reqs", f"{name}.req"), csr.public_bytes(serialization.Encoding.PEM))
+        self._write(self._path("issued", f"{name}.crt"), cert_pem)
+        self._write(self._path("certs_by_serial", f"{serial_str}.pem"), cert_pem)
+
+        issued = IssuedCertificate(name=name, serial=serial_str, cert_pem=cert_pem.decode(),
+                                   key_pem=key_pem.decode(), not_after=cert.not_valid_after_utc)
+        entry = IndexEntry(status=VALID, expires=cert.not_valid_after_utc, revoked_at=None, revocation_reason="",
+                           serial=serial_str, filename="unknown", subject=f"/CN={name}")
+        return issued, entry, serial
+
+    def issue_many(self, names: List[str], keys: Optional[List[bytes]] = None
+                   ) -> Dict[str, Union[IssuedCertificate, CertificateError]]:
+        """
+        Issue a certificate for each name; returns a result or a CertificateError per name.
+
+        Keys are generated in parallel first (or taken from `keys`); signing and the
+        index.txt/serial update then happen as one locked batch.
+        """
+        requested = list(names)
+        results: Dict[str, Union[IssuedCertificate, CertificateError]] = {}
+        self._load_ca()
+        for directory in ("private", "reqs", "issued", "certs_by_serial"):
+            os.makedirs(self._path(directory), exist_ok=True)
+
+        if keys is None:
+            # Don't spend key generation on names that are already taken
+            taken = self._taken()
+            names = [name for name in names if name not in taken]
+            keys = self.key_pool.claim(len(names)) if self.key_pool else []
+            keys += self.generate_keys(len(names) - len(keys))
+        with self.locked():
+            taken = self._taken()
+            lines, last_serial = [], None
+            for name, key_pem in zip(names, keys):
+                if name in taken or os.path.exists(self._path("issued", f"{name}.crt")):
+                    continue
+                try:
+                    issued, entry, last_serial = self._sign(name, key_pem)
+                except (OSError, ValueError) as e:
+                    results[name] = CertificateError(f"Failed to issue {name}: {str(e)}")
+                    continue
+                taken.add(name)
+                lines.append(entry.to_line())
+                results[name] = issued
+
+            if lines:
+                # Rewritten and renamed rather than appended, so readers never see half a batch
+                try:
+                    with open(self._path("index.txt"), "rb") as f:
+                        current = f.read()
+                except FileNotFoundError:
+                    current = b""
+                if current and not current.endswith(b"\n"):
+                    current += b"\n"
+                self._write(self._path("index.txt"), current + "".join(lines).encode())
+                # openssl ca leaves the serial after the last one it used
+                self._write(self._path("serial"), (serial_hex(last_serial + 1) + "\n").encode())
+                if not os.path.exists(self._path("index.txt.attr")):
+                    self._write(self._path("index.txt.attr"), b"unique_subject = no\n")
+        for name in requested:
+            results.setdefault(name, CertificateError(f"Certificate for {name} already exists"))
+        return results
+
+    def _read_crl_number(self) -> Optional[int]:
+        try:
+            with open(self._path("crlnumber")) as f:
+                return int(f.read().strip(), 16)
+        except (OSError, ValueError):
+            return None  # easy-rsa's openssl config leaves the CRL unnumbered without this file
+
+    def generate_crl(self) -> bytes:
+        """Rebuild pki/crl.pem from the revoked entries in index.txt; call with the issuance lock held"""
+        ca_cert, ca_key = self._load_ca()
+        entries = []
+        try:
+            with open(self._path("index.txt"), "r", encoding="utf-8", errors="replace") as f:
+                entries = [entry for entry in map(IndexEntry.parse, f) if entry and entry.status == REVOKED]
+        except FileNotFoundError:
+            pass
+        number = self._read_crl_number()
+        crl = build_crl(ca_cert, ca_key, entries, self.crl_days, number)
+        self._write(self._path("crl.pem"), crl)
+        if number is not None:
+            self._write(self._path("crlnumber"), (serial_hex(number + 1) + "\n").encode())
+        return crl
+
+    def _retire(self, name: str, serial: str) -> None:
+        """Move a revoked certificate's files to revoked/*_by_serial, as easy-rsa 3.1 does"""
+        for source, target in (
+                (("issued", f"{name}.crt"), ("revoked", "certs_by_serial", f"{serial}.crt")),
+                (("private", f"{name}.key"), ("revoked", "private_by_serial", f"{serial}.key")),
+                (("reqs", f"{name}.req"), ("revoked", "reqs_by_serial", f"{serial}.req"))):
+            if os.path.exists(self._path(*source)):
+                os.makedirs(self._path(*target[:-1]), exist_ok=True)
+                os.replace(self._path(*source), self._path(*target))
+
+    def revoke_many(self, names: List[str], reason: str = "") -> Dict[str, Union[IndexEntry, CertificateError]]:
+        """
+        Revoke the current certificate of each name and regenerate crl.pem once.
+
+        index.txt is rewritten in one go and the CRL is rebuilt only if something was
+        revoked. Returns the revoked index entry or a CertificateError per name.
+        """
+        if reason and reason not in REASONS:
+            raise CertificateError(f"Unknown revocation reason: {reason}")
+        results: Dict[str, Union[IndexEntry, CertificateError]] = {}
+        self._load_ca()
+        wanted = set(names)
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+
+        with self.locked():
+            try:
+                with open(self._path("index.txt"), "r", encoding="utf-8", errors="replace") as f:
+                    lines = f.readlines()
+            except FileNotFoundError:
+                lines = []
+
+            # The last valid entry for a name is its current certificate
+            current = {}
+            for i, line in enumerate(lines):
+                entry = IndexEntry.parse(line)
+                if entry and entry.is_valid and entry.cn in wanted:
+                    current[entry.cn] = (i, entry)
+
+            for name, (i, entry) in current.items():
+                entry.status, entry.revoked_at, entry.revocation_reason = REVOKED, now, reason
+                lines[i] = entry.to_line()
+                results[name] = entry
+
+            if results:
+                self._write(self._path("index.txt"), "".join(lines).encode())
+                for name, entry in results.items():
+                    try:
+                        self._retire(name, entry.serial)
+                    except OSError as e:
+                        self.logger.warning(f"Could not move files of revoked certificate {name}: {str(e)}")
+                self.generate_crl()
+
+        for name in names:
+            results.setdefault(name, CertificateError(f"No valid certificate for {name}"))
+        return results
+
+    def issue(self, name: str, key_pem: Optional[bytes] = None) -> IssuedCertificate:
+        result = self.issue_many([name], None if key_pem is None else [key_pem])[name]
+        if isinstance(result, CertificateError):
+            raise result
+        return result
+
+
+_issuers: Dict[str, CertificateIssuer] = {}
+_issuers_lock = threading.Lock()
+
+
+def get_certificate_issuer(pki_dir: str, **kwargs) -> CertificateIssuer:
+    """Shared issuer for a PKI directory, so the parsed CA is reused"""
+    with _issuers_lock:
+        if pki_dir not in _issuers:
+            _issuers[pki_dir] = CertificateIssuer(pki_dir, **kwargs)
+        return _issuers[pki_dir]
@@ -0,0 +1,178 @@
+import errno
+import fcntl
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Tuple, Union
+
+# ("rsa", bits) or ("ec", curve name)
+KeySpec = Tuple[str, Union[int, str]]
+
+
+class KeyPool:
+    """
+    Spool of pre-generated client private keys.
+
+    Keys wait in `spool_dir` (mode 0700, each key 0600) named after their key spec,
+    so a pool filled for an RSA CA is never used once the CA changes algorithm. A key
+    is claimed by renaming it out of the spool and deleted as soon as it has been read:
+    a rename succeeds for exactly one claimant, so no key is handed out twice, even
+    across worker processes. A background thread refills the spool to `size` whenever
+    it falls below `low_water`; only one process refills at a time.
+    """
+
+    def __init__(self, spool_dir: str, spec: Callable[[], KeySpec], generate: Callable[[int], List[bytes]],
+                 size: int = 50, low_water: int = 10, batch: int = 10):
+        self.spool_dir = spool_dir
+        self.spec = spec
+        self.generate = generate
+        self.size = size
+        self.low_water = low_water
+        self.batch = max(1, batch)
+        self.logger = logging.getLogger(__name__)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread_pid = None
+        self._refilling = False
+        self._counts = {"claimed": 0, "misses": 0, "generated": 0}
+        self._counts_lock = threading.Lock()
+
+    @staticmethod
+    def _prefix(spec: KeySpec) -> str:
+        return f"{spec[0]}-{spec[1]}-"
+
+    def _ensure_dir(self) -> None:
+        os.makedirs(self.spool_dir, mode=0o700, exist_ok=True)
+        os.chmod(self.spool_dir, 0o700)
+
+    def _available(self, prefix: str) -> List[str]:
+        try:
+            return [name for name in os.listdir(self.spool_dir) if name.startswith(prefix) and name.endswith(".key")]
+        except FileNotFoundError:
+            return []
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._counts_lock:
+            self._counts[key] += n
+
+    def start(self):
+        # Started in each worker from post_fork or by the first claim(), never in the preloading master
+        if self.size <= 0 or self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        self._stop.clear()
+        self._wake.set()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def claim(self, count: int = 1) -> List[bytes]:
+        """Take up to `count` keys out of the pool; fewer (possibly none) when it runs short"""
+        self.start()
+        keys = []
+        try:
+            prefix = self._prefix(self.spec())
+        except Exception:
+            return keys
+        for name in self._available(prefix):
+            if len(keys) >= count:
+                break
+            source = os.path.join(self.spool_dir, name)
+            claimed = f"{source}.claimed-{os.getpid()}-{threading.get_ident()}"
+            try:
+                os.rename(source, claimed)
+            except OSError as e:
+                if e.errno == errno.ENOENT:
+                    continue  # Another worker got it first
+                raise
+            try:
+                with open(claimed, "rb") as f:
+                    keys.append(f.read())
+            finally:
+                os.unlink(claimed)
+
+        self._count("claimed", len(keys))
+        self._count("misses", count - len(keys))
+        if len(self._available(prefix)) < self.low_water:
+            self._wake.set()
+        return keys
+
+    def _store(self, key_pem: bytes, prefix: str) -> None:
+        path = os.path.join(self.spool_dir, f"{prefix}{uuid.uuid4().hex}.key")
+        tmp = f"{path}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(key_pem)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, path)
+
+    def refill(self) -> int:
+        """Top the spool up to `size`; returns the number of keys added"""
+        self._ensure_dir()
+        with open(os.path.join(self.spool_dir, ".refill.lock"), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0  # Another process is refilling
+            self._refilling = True
+            try:
+                spec = self.spec()
+                prefix = self._prefix(spec)
+                # Keys for a previous CA algorithm will never be claimed, and leftovers of interrupted
+                # writes or claims are not claimable either
+                for name in os.listdir(self.spool_dir):
+                    path = os.path.join(self.spool_dir, name)
+                    if name.endswith(".key") and not name.startswith(prefix):
+                        os.unlink(path)
+                    elif not name.endswith(".key") and name != ".refill.lock" and \
+                            time.time() - os.path.getmtime(path) > 300:
+                        os.unlink(path)
+
+                added = 0
+                while not self._stop.is_set():
+                    missing = self.size - len(self._available(prefix))
+                    if missing <= 0:
+                        break
+                    for key_pem in self.generate(min(missing, self.batch)):
+                        self._store(key_pem, prefix)
+                        added += 1
+                self._count("generated", added)
+                return added
+            finally:
+                self._refilling = False
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(timeout=60)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                if len(self._available(self._prefix(self.spec()))) < self.low_water:
+                    added = self.refill()
+                    if added:
+                        self.logger.info(f"Key pool refilled with {added} key(s)")
+            except Exception as e:
+                self.logger.error(f"Error refilling key pool: {str(e)}")
+                time.sleep(5)
+
+    def stats(self) -> Dict:
+        try:
+            available = len(self._available(self._prefix(self.spec())))
+        except Exception:
+            available = 0
+        with self._counts_lock:
+            counts = dict(self._counts)
+        return {
+            "available": available,
+            "size": self.size,
+            "low_water": self.low_water,
+            "refilling": self._refilling,
+            **counts  # Since this worker started
+        }
@@ -0,0 +1,70 @@
+import concurrent.futures
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+from main.exceptions import PkiQueueTimeout
+
+
+class PkiService:
+    """
+    Ordered queue for PKI mutations (issue, revoke, gen-crl).
+
+    Mutations run one at a time, in submission order, on a single worker thread,
+    and callers get a Future to wait on with a timeout. easy-rsa and our own index.txt
+    updates are not safe for concurrent writers; the issuer's flock extends the same
+    guarantee across gunicorn workers. Reads do not go through the queue: index.txt
+    and crl.pem are only ever replaced by rename, so readers (CertificateIndex,
+    RevocationList) always see a complete snapshot.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._pid = None
+        self._pending = 0
+
+    def _ensure_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._lock:
+            # The worker thread does not survive gunicorn's fork, so each worker starts its own
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._pending = 0
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="pki")
+            return self._executor
+
+    def submit(self, fn: Callable, *args, **kwargs) -> concurrent.futures.Future:
+        """Queue a mutation; it runs after every mutation submitted before it"""
+        executor = self._ensure_executor()
+        with self._lock:
+            self._pending += 1
+        future = executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    def pending(self) -> int:
+        """Mutations queued or running in this worker"""
+        with self._lock:
+            return self._pending
+
+    @staticmethod
+    def wait(future: concurrent.futures.Future, timeout: float):
+        """Result of a queued mutation; PkiQueueTimeout if it has not finished within `timeout`"""
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            # The operation stays queued and will still complete
+            raise PkiQueueTimeout(f"PKI operation did not finish within {timeout:.1f}s")
+
+
+_service = PkiService()
+
+
+def get_pki_service() -> PkiService:
+    return _service
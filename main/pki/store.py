@@ -0,0 +1,193 @@
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from main.pki.crl import RevocationList
+from main.pki.inspector import CertRecord, CertificateInspector
+from main.pki.scan import ParallelScan
+
+
+class CertificateStore:
+    """
+    Persistent per-certificate metadata for pki/issued, kept in SQLite.
+
+    Rows are keyed by filename and carry the file's inode, mtime and size, so a sync
+    only re-parses certificates whose stat changed. sync() accepts the set of
+    filenames a watcher saw change; without it every file is stat'ed (but still only
+    changed files are parsed). The revoked flag is kept in step with the CRL.
+    """
+
+    _UPSERT = (
+        "INSERT OR REPLACE INTO certificates "
+        "(filename, inode, mtime_ns, size, cn, serial, not_before, not_after, fingerprint, revoked) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+
+    def __init__(self, cert_dir: str, revocations: RevocationList, inspector: CertificateInspector,
+                 db_path: str = "user_cache.db", workers: Optional[int] = None, chunk_size: int = 500,
+                 parallel_threshold: int = 2000):
+        self.cert_dir = cert_dir
+        self.revocations = revocations
+        self.inspector = inspector
+        self.db_path = db_path
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.parallel_threshold = parallel_threshold
+        # Re-entrant so on_chunk callbacks can read records() while a sync is running
+        self.lock = threading.RLock()
+        self.last_sync = {}
+        self._init_db()
+
+    def _init_db(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS certificates (
+                    filename TEXT PRIMARY KEY,
+                    inode INTEGER,
+                    mtime_ns INTEGER,
+                    size INTEGER,
+                    cn TEXT,
+                    serial TEXT,
+                    not_before TEXT,
+                    not_after TEXT,
+                    fingerprint TEXT,
+                    revoked INTEGER DEFAULT 0
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS certificates_serial ON certificates (serial)")
+
+    @staticmethod
+    def username(filename: str) -> str:
+        return filename[:-4]  # Remove .crt extension
+
+    def _listing(self) -> Set[str]:
+        try:
+            return {f for f in os.listdir(self.cert_dir) if f.endswith(".crt")}
+        except OSError:
+            return set()
+
+    def _revoked_serials(self) -> frozenset:
+        try:
+            return self.revocations.serials()
+        except (OSError, ValueError):
+            return frozenset()
+
+    def sync(self, filenames: Optional[Iterable[str]] = None, crl_changed: bool = False,
+             on_chunk: Optional[Callable[[Set[str]], None]] = None) -> Set[str]:
+        """
+        Bring the table up to date and return the usernames whose metadata changed.
+
+        When at least `parallel_threshold` certificates need parsing (first build or a
+        full rebuild) they are parsed across a process pool and written chunk by chunk.
+
+        Args:
+            filenames: Certificate files known to have changed; None stats the whole directory
+            crl_changed: Re-apply the CRL to every row's revoked flag
+            on_chunk: Called with the usernames of each chunk as soon as it has been written
+        """
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            timings = {}
+            started = time.monotonic()
+            known = {row[0]: tuple(row[1:]) for row in conn.execute(
+                "SELECT filename, inode, mtime_ns, size FROM certificates")}
+            candidates = set(known) | self._listing() if filenames is None else \
+                {f for f in filenames if f.endswith(".crt")}
+            revoked = self._revoked_serials()
+            changed = set()
+
+            # Phase 1: stat, and drop rows for files that are gone
+            to_parse = []
+            for filename in candidates:
+                try:
+                    st = os.stat(os.path.join(self.cert_dir, filename))
+                except OSError:
+                    if filename in known:
+                        conn.execute("DELETE FROM certificates WHERE filename = ?", (filename,))
+                        changed.add(self.username(filename))
+                    continue
+                if known.get(filename) != (st.st_ino, st.st_mtime_ns, st.st_size):
+                    to_parse.append(filename)
+            timings["stat"] = time.monotonic() - started
+
+            # Phase 2: parse and write
+            mark = time.monotonic()
+            if len(to_parse) >= self.parallel_threshold:
+                scan = ParallelScan(self.cert_dir, to_parse, workers=self.workers, chunk_size=self.chunk_size)
+                for rows in scan.chunks():
+                    conn.executemany(self._UPSERT, [row + (int(row[5] in revoked),) for row in rows])
+                    conn.commit()
+                    usernames = {self.username(row[0]) for row in rows}
+                    changed |= usernames
+                    if on_chunk:
+                        on_chunk(usernames)
+                timings.update({f"scan_{key}": value for key, value in scan.timings.items()})
+            else:
+                for filename in to_parse:
+                    path = os.path.join(self.cert_dir, filename)
+                    record = self.inspector.inspect(path)
+                    if record is None:
+                        continue
+                    st = os.stat(path)
+                    conn.execute(self._UPSERT, (
+                        filename, st.st_ino, st.st_mtime_ns, st.st_size, record.cn, record.serial,
+                        record.not_before.isoformat(), record.not_after.isoformat(), record.fingerprint,
+                        int(record.serial in revoked)
+                    ))
+                    changed.add(self.username(filename))
+            timings["parse_and_write"] = time.monotonic() - mark
+
+            # Phase 3: revocation flags
+            if crl_changed:
+                mark = time.monotonic()
+                for filename, serial, was_revoked in conn.execute(
+                        "SELECT filename, serial, revoked FROM certificates").fetchall():
+                    if bool(was_revoked) != (serial in revoked):
+                        conn.execute("UPDATE certificates SET revoked = ? WHERE filename = ?",
+                                     (int(serial in revoked), filename))
+                        changed.add(self.username(filename))
+                timings["crl"] = time.monotonic() - mark
+
+            timings["total"] = time.monotonic() - started
+            self.last_sync = {
+                "checked": len(candidates),
+                "parsed": len(to_parse),
+                "parallel": len(to_parse) >= self.parallel_threshold,
+                "timings": {key: round(value, 3) for key, value in timings.items()}
+            }
+            return changed
+
+    def records(self, usernames: Optional[Iterable[str]] = None) -> Dict[str, CertRecord]:
+        """CertRecords by username, for the given users or all of them, in one query"""
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute(
+                "SELECT filename, cn, serial, not_before, not_after, fingerprint FROM certificates").fetchall()
+        wanted = set(usernames) if usernames is not None else None
+        records = {}
+        for filename, cn, serial, not_before, not_after, fingerprint in rows:
+            username = self.username(filename)
+            if wanted is None or username in wanted:
+                records[username] = CertRecord(
+                    cn=cn,
+                    serial=serial,
+                    not_before=datetime.datetime.fromisoformat(not_before),
+                    not_after=datetime.datetime.fromisoformat(not_after),
+                    fingerprint=fingerprint
+                )
+        return records
+
+    def usernames_for_serials(self, serials: Iterable[str]) -> Set[str]:
+        serials = [serial.upper() for serial in serials]
+        if not serials:
+            return set()
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute(
+                f"SELECT filename FROM certificates WHERE serial IN ({', '.join('?' * len(serials))})", serials)
+            return {self.username(row[0]) for row in rows}
+
+    def all(self) -> List[Dict]:
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute("SELECT * FROM certificates ORDER BY filename")]
@@ -0,0 +1,170 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, Set
+
+# inotify(7) event bits
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | \
+             IN_DELETE_SELF | IN_MOVE_SELF
+
+_EVENT = struct.Struct("iIII")
+
+# Changes per watched directory: {directory: {filename, ...}}; an empty set means "rescan everything"
+Changes = Dict[str, Set[str]]
+
+
+def _load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+    # Only Linux has inotify
+    return libc if hasattr(libc, "inotify_init1") else None
+
+
+class DirectoryWatcher:
+    """
+    Report file changes in a few directories to a callback.
+
+    Uses inotify through ctypes where available and falls back to comparing
+    directory snapshots every `poll_interval` seconds. Events are collected for
+    `debounce` seconds so a burst (easy-rsa writes several files per operation)
+    becomes one callback.
+    """
+
+    def __init__(self, directories: List[str], on_change: Callable[[Changes], None],
+                 poll_interval: float = 30, debounce: float = 0.5):
+        self.directories = directories
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.logger = logging.getLogger(__name__)
+        self._stop = threading.Event()
+        self._thread = None
+        self.mode = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        libc = _load_libc()
+        if libc is not None:
+            try:
+                self.mode = "inotify"
+                self._run_inotify(libc)
+                return
+            except OSError as e:
+                self.logger.warning(f"inotify unavailable, polling certificate directories instead: {str(e)}")
+        self.mode = "poll"
+        self._run_poll()
+
+    def _emit(self, changes: Changes):
+        if not changes:
+            return
+        try:
+            self.on_change(changes)
+        except Exception as e:
+            self.logger.error(f"Error handling certificate changes: {str(e)}")
+
+    def _add_watches(self, libc, fd) -> Dict[int, str]:
+        watches = {}
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                continue
+            wd = libc.inotify_add_watch(fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                raise OSError(err, f"inotify_add_watch({directory}): {os.strerror(err)}")
+            watches[wd] = directory
+        return watches
+
+    def _run_inotify(self, libc):
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        try:
+            watches = self._add_watches(libc, fd)
+            pending: Changes = {}
+            flush_at = None
+
+            while not self._stop.is_set():
+                wait = 1.0 if flush_at is None else max(0.0, flush_at - time.monotonic())
+                readable, _, _ = select.select([fd], [], [], wait)
+                if readable:
+                    data = os.read(fd, 65536)
+                    offset = 0
+                    while offset < len(data):
+                        wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                        name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+                        offset += _EVENT.size + length
+                        directory = watches.get(wd)
+                        if mask & IN_Q_OVERFLOW:
+                            # Events were lost: ask for a rescan of everything
+                            pending = {d: set() for d in self.directories}
+                        elif directory and mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                            pending[directory] = set()
+                        elif directory and name and pending.get(directory, None) != set():
+                            pending.setdefault(directory, set()).add(os.fsdecode(name))
+                    if flush_at is None:
+                        flush_at = time.monotonic() + self.debounce
+
+                if flush_at is not None and time.monotonic() >= flush_at:
+                    changes, pending, flush_at = pending, {}, None
+                    # A directory that was missing or replaced needs (re-)watching
+                    # (adding a watch that already exists just returns its descriptor)
+                    if any(not files for files in changes.values()) or len(watches) < len(self.directories):
+                        watches = self._add_watches(libc, fd)
+                    self._emit(changes)
+        finally:
+            os.close(fd)
+
+    def _snapshot(self) -> Dict[str, Dict[str, tuple]]:
+        snapshot = {}
+        for directory in self.directories:
+            entries = {}
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        st = entry.stat(follow_symlinks=False)
+                        entries[entry.name] = (st.st_ino, st.st_mtime_ns, st.st_size)
+            except OSError:
+                pass
+            snapshot[directory] = entries
+        return snapshot
+
+    def _run_poll(self):
+        previous = self._snapshot()
+        while not self._stop.wait(self.poll_interval):
+            current = self._snapshot()
+            changes = {}
+            for directory in self.directories:
+                old, new = previous.get(directory, {}), current.get(directory, {})
+                names = {name for name in set(old) | set(new) if old.get(name) != new.get(name)}
+                if names:
+                    changes[directory] = names
+            previous = current
+            self._emit(changes)
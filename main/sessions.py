@@ -0,0 +1,342 @@
+import datetime
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Set, Tuple
+
+import settings
+from main import deadline
+from main.management import ManagementClient, get_management_client
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Session:
+    cid: int
+    cn: str
+    real_address: str  # ip:port
+    virtual_address: str
+    connected_since: Optional[datetime.datetime]
+    bytes_received: int = 0
+    bytes_sent: int = 0
+    interval_received: int = 0  # Bytes in the last bytecount interval
+    interval_sent: int = 0
+    interval_seconds: float = 0.0
+    updated_at: float = 0.0  # time.monotonic() of the last byte count
+
+    @property
+    def real_ip(self) -> str:
+        return self.real_address.rsplit(":", 1)[0] if self.real_address.count(":") == 1 else self.real_address
+
+    def rates(self) -> Tuple[float, float]:
+        """(received, sent) bytes per second over the last interval"""
+        if not self.interval_seconds:
+            return 0.0, 0.0
+        return self.interval_received / self.interval_seconds, self.interval_sent / self.interval_seconds
+
+
+class SessionTable:
+    """
+    Live table of connected clients, kept from management-interface notifications.
+
+    On every (re)connect the table is seeded from `status 3` and `bytecount N` is
+    enabled; from then on it follows >CLIENT:ESTABLISHED/DISCONNECT (with their ENV
+    blocks), >CLIENT:ADDRESS and >BYTECOUNT_CLI, so reads never poll OpenVPN. OpenVPN
+    only sends the >CLIENT: notifications under --management-client-auth, so the table
+    is also reconciled against `status 3` every `reconcile_interval` seconds (3 byte
+    count intervals by default); that drops clients that left without a DISCONNECT.
+    Sessions are keyed by CID, with an index by common name (one CN can hold several
+    sessions under duplicate-cn). While the connection is down or not yet seeded the
+    table is not live and callers fall back to asking OpenVPN.
+    """
+
+    def __init__(self, client: ManagementClient, bytecount_interval: int = 5,
+                 reconcile_interval: Optional[float] = None):
+        self.client = client
+        self.bytecount_interval = bytecount_interval
+        self.reconcile_interval = reconcile_interval or 3 * bytecount_interval
+        self._thread_pid = None
+        self._lock = threading.Lock()
+        self._by_cid: Dict[int, Session] = {}
+        self._by_cn: Dict[str, Set[int]] = {}
+        self._seeded_generation = None
+        self._seeded = threading.Event()
+        # Notification block being read: (kind, cid) and its ENV lines
+        self._block: Optional[Tuple[str, int]] = None
+        self._env: Dict[str, str] = {}
+        # Changes seen while a seed is in flight, so the seed does not undo them
+        self._seeding = False
+        self._changed_during_seed: Set[int] = set()
+        client.subscribe(self._on_notification)
+        client.on_connect(self._seed)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The child reconnects and reseeds; a lock held by one of the parent's threads must not carry over
+        self._lock = threading.Lock()
+        self._by_cid = {}
+        self._by_cn = {}
+        self._seeded_generation = None
+        self._seeded = threading.Event()
+        self._block = None
+        self._env = {}
+        self._seeding = False
+        self._changed_during_seed = set()
+        self._thread_pid = None
+
+    def start(self):
+        # Lazily, in the worker: the first read starts the connection and the reconcile loop
+        self.client.start()
+        if self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        threading.Thread(target=self._reconcile_loop, daemon=True).start()
+
+    def _reconcile_loop(self):
+        while True:
+            time.sleep(self.reconcile_interval)
+            if self.live:
+                try:
+                    self._seed(reconnected=False)
+                except Exception as e:
+                    logger.error(f"Error reconciling the session table: {str(e)}")
+
+    @property
+    def live(self) -> bool:
+        return self.client.connected and self._seeded_generation == self.client.generation
+
+    def _wait_live(self, timeout: float = 1.0) -> bool:
+        # Waits only for a seed that can still arrive: not while OpenVPN is down, nor after the
+        # seed of this connection gave up (it sets _seeded too)
+        self.start()
+        if self.live:
+            return True
+        if self.client.wait_connected(timeout):
+            self._seeded.wait(deadline.timeout(timeout))
+        return self.live
+
+    # Index maintenance; callers hold self._lock
+
+    def _put(self, session: Session):
+        old = self._by_cid.get(session.cid)
+        if old and old.cn != session.cn:
+            self._unindex(old)
+        self._by_cid[session.cid] = session
+        self._by_cn.setdefault(session.cn, set()).add(session.cid)
+
+    def _unindex(self, session: Session):
+        cids = self._by_cn.get(session.cn)
+        if cids:
+            cids.discard(session.cid)
+            if not cids:
+                del self._by_cn[session.cn]
+
+    def _remove(self, cid: int):
+        session = self._by_cid.pop(cid, None)
+        if session:
+            self._unindex(session)
+
+    # Seeding
+
+    def _seed(self, reconnected: bool = True):
+        """Load `status 3` into the table: after a (re)connect, and periodically to reconcile"""
+        generation = self.client.generation
+        commands = ["status 3"]
+        if reconnected:
+            self._seeded.clear()
+            commands.insert(0, f"bytecount {self.bytecount_interval}")
+        with self._lock:
+            self._seeding = True
+            self._changed_during_seed = set()
+        lines = self.client.request(commands, timeout=10)[-1]
+        if not lines or lines[0].startswith("ERROR"):
+            with self._lock:
+                self._seeding = False
+            self._seeded.set()
+            logger.warning("Could not seed the session table from the management interface")
+            return
+
+        parsed = self._parse_status(lines)
+        if parsed is None:
+            with self._lock:
+                self._seeding = False
+            self._seeded.set()
+            logger.warning("status 3 has no client IDs (OpenVPN older than 2.4?); session table disabled")
+            return
+
+        seeded = {session.cid: session for session in parsed}
+        with self._lock:
+            for cid in list(self._by_cid):
+                if cid not in seeded and cid not in self._changed_during_seed:
+                    self._remove(cid)
+            for cid, session in seeded.items():
+                if cid in self._changed_during_seed:
+                    continue  # A notification already brought this session up to date (or ended it)
+                old = self._by_cid.get(cid)
+                if old and old.cn == session.cn:
+                    # Keep the interval counters already collected from notifications
+                    session = replace(old, real_address=session.real_address,
+                                      virtual_address=session.virtual_address or old.virtual_address,
+                                      bytes_received=max(old.bytes_received, session.bytes_received),
+                                      bytes_sent=max(old.bytes_sent, session.bytes_sent))
+                self._put(session)
+            self._seeding = False
+            self._seeded_generation = generation
+        self._seeded.set()
+        if reconnected:
+            logger.info(f"Session table seeded with {len(seeded)} session(s)")
+
+    @staticmethod
+    def _parse_status(lines: List[str]) -> Optional[List[Session]]:
+        """Sessions in `status 3` output; None if it does not carry client IDs"""
+        columns = None
+        sessions = []
+        now = time.monotonic()
+        for line in lines:
+            fields = line.split("\t")
+            if fields[:2] == ["HEADER", "CLIENT_LIST"]:
+                columns = {name: i - 1 for i, name in enumerate(fields[1:], 1)}
+                continue
+            if fields[0] != "CLIENT_LIST" or columns is None or "Client ID" not in columns:
+                continue
+
+            def field(name, default=""):
+                i = columns.get(name)
+                return fields[i] if i is not None and i < len(fields) else default
+
+            if field("Common Name") in ("", "UNDEF"):
+                continue
+            since = field("Connected Since (time_t)")
+            sessions.append(Session(
+                cid=int(field("Client ID")),
+                cn=field("Common Name"),
+                real_address=field("Real Address"),
+                virtual_address=field("Virtual Address"),
+                connected_since=datetime.datetime.fromtimestamp(int(since)) if since.isdigit() else None,
+                bytes_received=int(field("Bytes Received", "0") or 0),
+                bytes_sent=int(field("Bytes Sent", "0") or 0),
+                updated_at=now
+            ))
+        if columns is None or "Client ID" not in columns:
+            return None
+        return sessions
+
+    # Notifications
+
+    def _on_notification(self, line: str):
+        if line.startswith(">BYTECOUNT_CLI:"):
+            self._on_bytecount(line[len(">BYTECOUNT_CLI:"):])
+        elif line.startswith(">CLIENT:ENV,"):
+            entry = line[len(">CLIENT:ENV,"):]
+            if entry == "END":
+                block, env = self._block, self._env
+                self._block, self._env = None, {}
+                if block:
+                    self._apply(block[0], block[1], env)
+            else:
+                key, _, value = entry.partition("=")
+                self._env[key] = value
+        elif line.startswith(">CLIENT:ADDRESS,"):
+            parts = line[len(">CLIENT:ADDRESS,"):].split(",")
+            if len(parts) >= 3 and parts[0].isdigit() and parts[2] == "1":
+                with self._lock:
+                    session = self._by_cid.get(int(parts[0]))
+                    if session:
+                        self._put(replace(session, virtual_address=parts[1]))
+        elif line.startswith(">CLIENT:"):
+            kind, _, rest = line[len(">CLIENT:"):].partition(",")
+            cid = rest.split(",", 1)[0]
+            self._block = (kind, int(cid)) if cid.isdigit() else None
+            self._env = {}
+
+    def _apply(self, kind: str, cid: int, env: Dict[str, str]):
+        with self._lock:
+            if self._seeding:
+                self._changed_during_seed.add(cid)
+            if kind == "DISCONNECT":
+                self._remove(cid)
+                return
+            if kind not in ("ESTABLISHED", "CONNECT", "REAUTH"):
+                return
+            cn = env.get("common_name") or env.get("username", "")
+            ip = env.get("trusted_ip") or env.get("untrusted_ip", "")
+            port = env.get("trusted_port") or env.get("untrusted_port", "")
+            since = env.get("time_unix", "")
+            old = self._by_cid.get(cid)
+            self._put(Session(
+                cid=cid,
+                cn=cn,
+                real_address=f"{ip}:{port}" if port else ip,
+                virtual_address=env.get("ifconfig_pool_remote_ip") or (old.virtual_address if old else ""),
+                connected_since=datetime.datetime.fromtimestamp(int(since)) if since.isdigit() else
+                (old.connected_since if old else datetime.datetime.now()),
+                bytes_received=old.bytes_received if old else 0,
+                bytes_sent=old.bytes_sent if old else 0,
+                updated_at=time.monotonic()
+            ))
+
+    def _on_bytecount(self, payload: str):
+        parts = payload.split(",")
+        if len(parts) != 3 or not all(part.isdigit() for part in parts):
+            return
+        cid, received, sent = map(int, parts)
+        now = time.monotonic()
+        with self._lock:
+            session = self._by_cid.get(cid)
+            if session is None:
+                return  # Not established yet (or seeded later); the seed picks it up
+            self._put(replace(
+                session,
+                bytes_received=received,
+                bytes_sent=sent,
+                interval_received=max(0, received - session.bytes_received),
+                interval_sent=max(0, sent - session.bytes_sent),
+                interval_seconds=now - session.updated_at if session.updated_at else 0.0,
+                updated_at=now
+            ))
+
+    # Reads; each returns None while the table is not live
+
+    def sessions(self) -> Optional[List[Session]]:
+        if not self._wait_live():
+            return None
+        with self._lock:
+            return sorted(self._by_cid.values(), key=lambda session: (session.cn, session.cid))
+
+    def by_cn(self, cn: str) -> Optional[List[Session]]:
+        if not self._wait_live():
+            return None
+        with self._lock:
+            return [self._by_cid[cid] for cid in sorted(self._by_cn.get(cn, ()))]
+
+    def totals(self) -> Optional[Dict[str, float]]:
+        """Cumulative and current bytes across every session"""
+        sessions = self.sessions()
+        if sessions is None:
+            return None
+        rates = [session.rates() for session in sessions]
+        return {
+            "sessions": len(sessions),
+            "bytes_received": sum(session.bytes_received for session in sessions),
+            "bytes_sent": sum(session.bytes_sent for session in sessions),
+            "rate_received": sum(rate[0] for rate in rates),
+            "rate_sent": sum(rate[1] for rate in rates)
+        }
+
+
+_tables: Dict[Tuple[str, int], SessionTable] = {}
+_tables_lock = threading.Lock()
+
+
+def get_session_table(host: Optional[str] = None, port: Optional[int] = None) -> SessionTable:
+    """The live session table of the management interface at host:port (settings.MANAGEMENT by default)"""
+    client = get_management_client(host, port)
+    with _tables_lock:
+        table = _tables.get((client.host, client.port))
+        if table is None:
+            table = _tables[(client.host, client.port)] = SessionTable(
+                client, bytecount_interval=settings.MANAGEMENT["bytecount_interval"])
+        return table
@@ -0,0 +1,286 @@
+import datetime
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import settings
+from main import deadline
+from main.agent import get_host_agent
+from main.transport import CommandTransport
+
+try:
+    from jeepney import DBusAddress, MatchRule, Properties, message_bus, new_method_call
+    from jeepney.io.blocking import open_dbus_connection
+    from jeepney.wrappers import unwrap_msg
+except ImportError:  # Optional: without jeepney we fall back to the host agent or systemctl
+    open_dbus_connection = None
+
+
+@dataclass
+class ServiceState:
+    unit: str
+    active_state: str = "unknown"
+    main_pid: int = 0
+    started_at: Optional[datetime.datetime] = None
+
+    @property
+    def is_active(self) -> bool:
+        return self.active_state == "active"
+
+    def uptime_seconds(self) -> float:
+        if not self.is_active or not self.started_at:
+            return 0
+        return max(0.0, (datetime.datetime.now(datetime.timezone.utc) - self.started_at).total_seconds())
+
+
+def _parse_systemctl_timestamp(value: str) -> Optional[datetime.datetime]:
+    """Parse systemctl's 'Mon 2025-04-28 10:00:00 UTC' format into an aware datetime"""
+    value = value.strip()
+    if not value or value == "n/a":
+        return None
+    try:
+        parts = value.split()
+        naive = datetime.datetime.strptime(" ".join(parts[1:3]), "%Y-%m-%d %H:%M:%S")
+    except (ValueError, IndexError):
+        return None
+    if len(parts) > 3 and parts[3] == "UTC":
+        return naive.replace(tzinfo=datetime.timezone.utc)
+    return naive.astimezone()
+
+
+def _parse_show_output(unit: str, stdout: str) -> ServiceState:
+    props = dict(line.split("=", 1) for line in stdout.splitlines() if "=" in line)
+    return ServiceState(
+        unit=unit,
+        active_state=props.get("ActiveState", "unknown"),
+        main_pid=int(props.get("MainPID") or 0),
+        started_at=_parse_systemctl_timestamp(props.get("ExecMainStartTimestamp", ""))
+    )
+
+
+class SystemctlBackend:
+    """Query and control units with one `systemctl` call per operation over a command transport"""
+
+    def __init__(self, transport: CommandTransport):
+        self.transport = transport
+
+    def status(self, unit: str) -> ServiceState:
+        stdout, _, _ = self.transport.run([
+            "systemctl", "show", unit, "--property=ActiveState,MainPID,ExecMainStartTimestamp"
+        ])
+        return _parse_show_output(unit, stdout)
+
+    def control(self, unit: str, action: str) -> bool:
+        _, _, return_code = self.transport.run(["systemctl", action, unit])
+        return return_code == 0
+
+
+class AgentBackend(SystemctlBackend):
+    """Read unit status through the host agent's structured service.status call"""
+
+    def __init__(self, transport: CommandTransport):
+        super().__init__(transport)
+        self.agent = get_host_agent()
+
+    def status(self, unit: str) -> ServiceState:
+        result = self.agent.service_status(unit)
+        return ServiceState(
+            unit=unit,
+            active_state=result.active_state,
+            main_pid=result.main_pid,
+            started_at=_parse_systemctl_timestamp(result.start_timestamp)
+        )
+
+
+class DBusBackend:
+    """Talk to the host's systemd over its D-Bus system bus socket"""
+
+    SYSTEMD = "org.freedesktop.systemd1"
+
+    def __init__(self, bus_address: str, job_timeout: float = 90):
+        self.bus_address = bus_address
+        self.job_timeout = job_timeout
+        self.manager = DBusAddress("/org/freedesktop/systemd1", bus_name=self.SYSTEMD,
+                                   interface="org.freedesktop.systemd1.Manager")
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._paths = {}
+
+    def _connection(self):
+        # A connection inherited across gunicorn's fork must not be shared with the master
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = open_dbus_connection(bus=self.bus_address)
+            self._pid = os.getpid()
+        return self._conn
+
+    def _call(self, message):
+        with self._lock:
+            try:
+                return unwrap_msg(self._connection().send_and_get_reply(message, timeout=5))
+            except (OSError, TimeoutError):
+                # Drop the connection so the next call reconnects
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                raise
+
+    def unit_path(self, unit: str) -> str:
+        if unit not in self._paths:
+            self._paths[unit] = self._call(new_method_call(self.manager, "LoadUnit", "s", (unit,)))[0]
+        return self._paths[unit]
+
+    def status(self, unit: str) -> ServiceState:
+        path = self.unit_path(unit)
+        unit_props = self._call(Properties(DBusAddress(
+            path, bus_name=self.SYSTEMD, interface="org.freedesktop.systemd1.Unit")).get("ActiveState"))
+        service_props = self._call(Properties(DBusAddress(
+            path, bus_name=self.SYSTEMD, interface="org.freedesktop.systemd1.Service")).get_all())[0]
+
+        start_usec = service_props.get("ExecMainStartTimestamp", ("t", 0))[1]
+        return ServiceState(
+            unit=unit,
+            active_state=unit_props[0][1],
+            main_pid=service_props.get("MainPID", ("u", 0))[1],
+            started_at=datetime.datetime.fromtimestamp(start_usec / 1e6, datetime.timezone.utc) if start_usec else None
+        )
+
+    def control(self, unit: str, action: str) -> bool:
+        """
+        Queue a start/stop/restart job and wait for its JobRemoved result, like systemctl does.
+
+        If the job has not finished within the timeout, the unit's current state decides.
+        """
+        method = {"start": "StartUnit", "stop": "StopUnit", "restart": "RestartUnit"}[action]
+        conn = open_dbus_connection(bus=self.bus_address)
+        try:
+            rule = MatchRule(type="signal", sender=self.SYSTEMD, interface="org.freedesktop.systemd1.Manager",
+                             member="JobRemoved", path="/org/freedesktop/systemd1")
+            unwrap_msg(conn.send_and_get_reply(message_bus.AddMatch(rule), timeout=5))
+            unwrap_msg(conn.send_and_get_reply(new_method_call(self.manager, "Subscribe"), timeout=5))
+            # Subscribed before the job is queued, so its JobRemoved cannot be missed
+            with conn.filter(rule, bufsize=256) as queue:
+                job = unwrap_msg(conn.send_and_get_reply(
+                    new_method_call(self.manager, method, "ss", (unit, "replace")), timeout=5))[0]
+                end = time.monotonic() + deadline.timeout(self.job_timeout)
+                while time.monotonic() < end:
+                    try:
+                        message = conn.recv_until_filtered(queue, timeout=end - time.monotonic())
+                    except TimeoutError:
+                        break
+                    _, path, _, result = message.body
+                    if path == job:
+                        if result != "done":
+                            logging.getLogger(__name__).error(f"{action} job for {unit} finished with '{result}'")
+                        return result == "done"
+        finally:
+            conn.close()
+
+        state = self.status(unit)
+        if action == "stop":
+            return state.active_state not in ("active", "reloading")
+        return state.active_state in ("active", "activating", "reloading")
+
+    def watch(self, unit: str, on_change: Callable[[], None], stop: threading.Event) -> None:
+        """Block until stopped, calling on_change whenever the unit's properties change"""
+        conn = open_dbus_connection(bus=self.bus_address)
+        try:
+            rule = MatchRule(type="signal", sender=self.SYSTEMD, interface="org.freedesktop.DBus.Properties",
+                             member="PropertiesChanged", path=self.unit_path(unit))
+            unwrap_msg(conn.send_and_get_reply(message_bus.AddMatch(rule)))
+            # systemd only emits unit signals while at least one client is subscribed
+            unwrap_msg(conn.send_and_get_reply(new_method_call(self.manager, "Subscribe")))
+            with conn.filter(rule) as queue:
+                while not stop.is_set():
+                    try:
+                        conn.recv_until_filtered(queue, timeout=1)
+                    except TimeoutError:
+                        continue
+                    on_change()
+        finally:
+            conn.close()
+
+
+class ServiceController:
+    """
+    Status and control of one systemd unit.
+
+    With the D-Bus backend the state is kept in memory and refreshed from unit
+    change signals, so status polls cost nothing. Other backends fetch ActiveState,
+    MainPID and ExecMainStartTimestamp in a single call per status().
+    """
+
+    def __init__(self, unit: str, backend, fallback: Optional[SystemctlBackend] = None):
+        self.unit = unit
+        self.backend = backend
+        self.fallback = fallback
+        self.logger = logging.getLogger(__name__)
+        self._state: Optional[ServiceState] = None
+        self._watch_pid = None
+        self._stop = threading.Event()
+
+    def _refresh(self) -> ServiceState:
+        try:
+            self._state = self.backend.status(self.unit)
+        except Exception as e:
+            if not self.fallback:
+                raise
+            self.logger.warning(f"Service status backend failed for {self.unit}, using systemctl: {str(e)}")
+            return self.fallback.status(self.unit)
+        return self._state
+
+    def _watch_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.backend.watch(self.unit, self._refresh, self._stop)
+            except Exception as e:
+                self.logger.warning(f"Lost systemd signal subscription for {self.unit}: {str(e)}")
+                self._state = None
+                self._stop.wait(5)
+
+    def _ensure_watching(self) -> bool:
+        if not hasattr(self.backend, "watch"):
+            return False
+        # Threads do not survive gunicorn's fork, so each worker starts its own watcher
+        if self._watch_pid != os.getpid():
+            self._watch_pid = os.getpid()
+            self._state = None
+            threading.Thread(target=self._watch_loop, daemon=True).start()
+        return True
+
+    def status(self) -> ServiceState:
+        if self._ensure_watching() and self._state is not None:
+            return self._state
+        return self._refresh()
+
+    def _control(self, action: str) -> bool:
+        try:
+            success = self.backend.control(self.unit, action)
+        except Exception as e:
+            self.logger.error(f"Failed to {action} {self.unit}: {str(e)}")
+            success = self.fallback.control(self.unit, action) if self.fallback else False
+        self._state = None
+        return success
+
+    def start(self) -> bool:
+        return self._control("start")
+
+    def stop(self) -> bool:
+        return self._control("stop")
+
+    def restart(self) -> bool:
+        return self._control("restart")
+
+
+def create_service_controller(unit: str, transport: CommandTransport) -> ServiceController:
+    """Pick the cheapest available backend: D-Bus, then the host agent, then systemctl"""
+    bus_address = settings.SYSTEMD_BUS_ADDRESS
+    if open_dbus_connection is not None and bus_address and \
+            os.path.exists(bus_address.split("unix:path=", 1)[-1].split(",")[0]):
+        return ServiceController(unit, DBusBackend(bus_address), fallback=SystemctlBackend(transport))
+    if get_host_agent():
+        return ServiceController(unit, AgentBackend(transport), fallback=SystemctlBackend(transport))
+    return ServiceController(unit, SystemctlBackend(transport))
@@ -0,0 +1,183 @@
+import logging
+import shlex
+import subprocess
+import threading
+from typing import List, Optional, Tuple
+
+import settings
+from main import deadline
+from main.agent import HostAgentClient, get_host_agent
+from main.cache.command_cache import CommandResultCache
+from main.command import get_ssh_pool
+from main.exceptions import HostAgentError
+
+CommandResult = Tuple[str, str, int]
+
+
+def _default_timeout(timeout: Optional[float]) -> float:
+    # Background callers have no request deadline, so every command gets a bound anyway
+    return timeout if timeout is not None else settings.HOST_COMMAND_TIMEOUT
+
+
+class CommandTransport:
+    """
+    How host commands are executed. Commands are always argument vectors; each backend
+    decides whether a shell is involved at all.
+    """
+
+    name = "base"
+
+    def _run(self, argv: List[str], cwd: Optional[str], timeout: Optional[float]) -> CommandResult:
+        raise NotImplementedError
+
+    def _run_many(self, commands: List[List[str]], timeout: Optional[float]) -> List[CommandResult]:
+        return [self._run(argv, None, timeout) for argv in commands]
+
+    def run(self, argv: List[str], cwd: Optional[str] = None, timeout: Optional[float] = None,
+            check: bool = False) -> CommandResult:
+        """
+        Run a command on the host.
+
+        Args:
+            argv: Command and arguments
+            cwd: Working directory for the command
+            timeout: Seconds to wait for the command (settings.HOST_COMMAND_TIMEOUT by default)
+            check: Raise CalledProcessError on a non-zero exit code
+
+        Returns:
+            Tuple of (stdout, stderr, return_code)
+
+        Raises:
+            DeadlineExceeded: if the current request's budget has run out
+        """
+        stdout, stderr, code = self._run([str(a) for a in argv], cwd, deadline.timeout(_default_timeout(timeout)))
+        if check and code != 0:
+            raise subprocess.CalledProcessError(code, argv, stdout, stderr)
+        return stdout, stderr, code
+
+    def run_many(self, commands: List[List[str]], timeout: Optional[float] = None) -> List[CommandResult]:
+        """Run independent commands, in a single round trip where the backend allows it"""
+        if not commands:
+            return []
+        return self._run_many([[str(a) for a in argv] for argv in commands],
+                              deadline.timeout(_default_timeout(timeout)))
+
+
+class LocalTransport(CommandTransport):
+    """Run commands directly with subprocess, for when the app runs on the OpenVPN host"""
+
+    name = "local"
+
+    def _run(self, argv, cwd, timeout):
+        try:
+            proc = subprocess.run(argv, capture_output=True, text=True, cwd=cwd, timeout=timeout)
+            return proc.stdout, proc.stderr, proc.returncode
+        except FileNotFoundError as e:
+            return "", str(e), 127
+        except subprocess.TimeoutExpired:
+            return "", f"Command timed out after {timeout}s", 124
+
+
+class SSHTransport(CommandTransport):
+    """Run commands on the host over the pooled SSH transports"""
+
+    name = "ssh"
+
+    @staticmethod
+    def _command_line(argv, cwd):
+        command = shlex.join(argv)
+        return f"cd {shlex.quote(cwd)} && {command}" if cwd else command
+
+    @staticmethod
+    def _result(res):
+        return res.get("stdout", ""), res.get("stderr", res.get("error", "")), res['exit_code']
+
+    def _run(self, argv, cwd, timeout):
+        return self._result(get_ssh_pool().execute_command(self._command_line(argv, cwd), timeout=timeout))
+
+    def _run_many(self, commands, timeout):
+        results = get_ssh_pool().execute_batch([self._command_line(argv, None) for argv in commands],
+                                               timeout=timeout)
+        return [self._result(res) for res in results]
+
+
+class AgentTransport(CommandTransport):
+    """Run commands through the host agent, falling back to another transport if it is down"""
+
+    name = "agent"
+
+    def __init__(self, client: HostAgentClient, fallback: Optional[CommandTransport] = None):
+        self.client = client
+        self.fallback = fallback
+        self.logger = logging.getLogger(__name__)
+
+    def _run(self, argv, cwd, timeout):
+        try:
+            timeout = _default_timeout(timeout)
+            result = self.client.call("exec", {"argv": argv, "cwd": cwd, "timeout": timeout},
+                                      timeout=timeout + self.client.timeout)
+            return result["stdout"], result["stderr"], result["exit_code"]
+        except HostAgentError as e:
+            if not self.fallback:
+                raise
+            self.logger.warning(f"Host agent failed for {argv}, using {self.fallback.name}: {str(e)}")
+            return self.fallback._run(argv, cwd, timeout)
+
+    def _run_many(self, commands, timeout):
+        try:
+            return self.client.run_many(commands, timeout=_default_timeout(timeout))
+        except HostAgentError as e:
+            if not self.fallback:
+                raise
+            self.logger.warning(f"Host agent failed for command batch, using {self.fallback.name}: {str(e)}")
+            return self.fallback._run_many(commands, timeout)
+
+
+class CachedTransport(CommandTransport):
+    """Serve read-only probes from a CommandResultCache and pass everything else through"""
+
+    def __init__(self, transport: CommandTransport, cache: CommandResultCache):
+        self.transport = transport
+        self.cache = cache
+        self.name = transport.name
+
+    def _run(self, argv, cwd, timeout):
+        if cwd:
+            return self.transport._run(argv, cwd, timeout)
+        return self.cache.get_or_run(argv, lambda a: self.transport._run(a, None, timeout))
+
+    def _run_many(self, commands, timeout):
+        results = [self.cache.get(argv) for argv in commands]
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses:
+            fresh = self.transport._run_many([commands[i] for i in misses], timeout)
+            for i, result in zip(misses, fresh):
+                self.cache.put(commands[i], result)
+                results[i] = result
+        return results
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def create_transport(mode: str) -> CommandTransport:
+    """Build the transport for a HOST_TRANSPORT mode ('local', 'ssh' or 'agent')"""
+    if mode == "local":
+        return LocalTransport()
+    if mode == "ssh":
+        return SSHTransport()
+    if mode == "agent":
+        if not settings.HOST_AGENT_SOCKET:
+            raise ValueError("HOST_TRANSPORT=agent requires HOST_AGENT_SOCKET")
+        return AgentTransport(get_host_agent(), fallback=SSHTransport())
+    raise ValueError(f"Unknown host transport: {mode}")
+
+
+def get_transport() -> CommandTransport:
+    """Return the process-wide transport selected by settings.HOST_TRANSPORT"""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = create_transport(settings.HOST_TRANSPORT)
+        return _transport
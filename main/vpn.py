@@ -2,15 +2,26 @@ import datetime
 import logging
 import os
 import re
-import socket
 import subprocess
 from typing import List, Dict, Any, Optional, Tuple
 
-from main.api_handlers import run_host_command
+import settings
+from main.artifacts import get_config_builder
+from main.async_exec import AsyncCommandExecutor
 from main.cache import UserCacheRefresher
+from main.cache.command_cache import CommandResultCache
 from main.cache.user_cashe import UserCacheManager
 from main.config import ConfigManager
+from main.exceptions import DeadlineExceeded
+from main.management import get_management_client
+from main.metrics import create_bandwidth_sampler, create_resource_monitor
 from main.model_classes import VPNUser
+from main.pki import CertificateIndex, get_certificate_inspector, get_revocation_list
+from main.pki.expiry import ExpiryTracker
+from main.pki.store import CertificateStore
+from main.sessions import Session, get_session_table
+from main.systemd import ServiceState, create_service_controller
+from main.transport import get_transport, CachedTransport
 from .dir_manager import VPNManager as vpnM
 
 class VpnManager:
@@ -43,16 +54,37 @@ class VpnManager:
         self.status_file = status_file
         self.management_host = management_host
         self.management_port = management_port
+        self.management = get_management_client(management_host, management_port)
+        # Connected clients, kept current from management notifications instead of polling `status`;
+        # it connects on first use in each worker, never in the preloading master
+        self.sessions = get_session_table(management_host, management_port)
         self.service_name = service_name
         self.logger = logging.getLogger('openvpn_manager')
+        self.command_cache = CommandResultCache()
+        self.transport = CachedTransport(get_transport(), self.command_cache)
+        self.service = create_service_controller(service_name, self.transport)
+        self.executor = AsyncCommandExecutor(self.transport, limit=settings.HOST_COMMAND_CONCURRENCY)
+        self.cert_inspector = get_certificate_inspector()
+        self.resource_monitor = create_resource_monitor(config_dir, pid_source=lambda: self.service.status().main_pid)
+        self.cert_dir = os.path.join(self.config_dir, "server/easy-rsa/pki/issued")
+        self.crl_path = os.path.join(self.config_dir, "server/easy-rsa/pki/crl.pem")
+        self.cert_index = CertificateIndex(os.path.join(self.config_dir, "server/easy-rsa/pki/index.txt"))
+        self.revocations = get_revocation_list(self.crl_path)
         self.user_cache = UserCacheManager()
+        self.bandwidth = create_bandwidth_sampler(db_path=self.user_cache.db_path)
+        self.cert_store = CertificateStore(self.cert_dir, self.revocations, self.cert_inspector,
+                                           db_path=self.user_cache.db_path, **settings.CERT_SCAN)
+        self.expiry = ExpiryTracker(
+            self._expiry_inventory, self._expiry_version,
+            warning=datetime.timedelta(days=settings.CERT_EXPIRY["warning_days"]),
+            poll_interval=settings.CERT_EXPIRY["poll_interval"],
+            db_path=self.user_cache.db_path
+        )
         self.cache_refresher = UserCacheRefresher(self, self.user_cache)
         self.cache_refresher.start()
         self.config_manager = ConfigManager(self.server_conf_dir)
         # Ensure the required directories exist and are accessible
 
-        self.cert_dir = os.path.join(self.config_dir, "server/easy-rsa/pki/issued")
-        self.crl_path = os.path.join(self.config_dir, "server/easy-rsa/pki/crl.pem")
         self._check_paths()
 
     def _check_paths(self) -> None:
@@ -68,7 +100,7 @@ class VpnManager:
 
     def _run_command(self, command: List[str]) -> Tuple[str, str, int]:
         """
-        Run a shell command on the host machine using Docker socket.
+        Run a command on the host machine through the configured transport.
 
         Args:
             command: List of command and arguments to execute
@@ -76,71 +108,45 @@ class VpnManager:
         Returns:
             Tuple of (stdout, stderr, return_code)
         """
-
-        command = " ".join(command)
-
         try:
-
-            res = run_host_command(command)
-            stdout = res["stdout"]
-            stderr = res["stderr"]
-            return stdout, stderr, res['exit_code']
+            return self.transport.run(command)
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             self.logger.error(f"Error executing command {command}: {str(e)}")
             return "", str(e), 1
 
-    def _connect_management_interface(self) -> Optional[socket.socket]:
+    def _run_commands(self, commands: List[List[str]]) -> List[Tuple[str, str, int]]:
         """
-        Connect to the OpenVPN management interface.
+        Run several independent commands on the host in a single round trip.
+
+        Args:
+            commands: List of commands, each a list of command and arguments
 
         Returns:
-            Socket connection to management interface or None if failed
+            List of (stdout, stderr, return_code) tuples in the same order as commands
         """
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.connect((self.management_host, self.management_port))
-            # Read the welcome message
-            sock.recv(4096)
-            return sock
+            return self.transport.run_many(commands)
+        except DeadlineExceeded:
+            raise
         except Exception as e:
-            self.logger.error(f"Failed to connect to management interface: {str(e)}")
-            return None
+            self.logger.error(f"Error executing command batch {commands}: {str(e)}")
+            return [("", str(e), 1) for _ in commands]
 
     def _send_management_command(self, command: str) -> List[str]:
         """
         Send a command to the OpenVPN management interface and get the response.
 
+        Goes through the shared, long-lived management connection (see ManagementClient).
+
         Args:
             command: Command to send
 
         Returns:
             List of response lines from the management interface
         """
-        sock = self._connect_management_interface()
-        if not sock:
-            return []
-
-        try:
-            # Send command
-            sock.send(f"{command}\n".encode())
-
-            # Wait for response
-            response = b""
-            while True:
-                data = sock.recv(4096)
-                if not data:
-                    break
-                response += data
-                # Check if response is complete (ends with "END" or "SUCCESS:")
-                if b"END\r\n" in response or b"SUCCESS:" in response:
-                    break
-
-            return response.decode().splitlines()
-        except Exception as e:
-            self.logger.error(f"Error communicating with management interface: {str(e)}")
-            return []
-        finally:
-            sock.close()
+        return self.management.request([command])[0]
 
     def get_server_status(self) -> Dict[str, Any]:
         """
@@ -149,36 +155,18 @@ class VpnManager:
         Returns:
             Dictionary with server status information
         """
-        # Check if service is running
-        stdout, _, _ = self._run_command(["systemctl", "is-active", self.service_name])
-        is_active = stdout.strip() == "active"
-
-        # Get uptime if active
-        uptime_seconds = 0
-        uptime_str = "0d 0h 0m"
-
-        if is_active:
-            # Get process start time
-            stdout, _, _ = self._run_command([
-                "systemctl", "show", self.service_name,
-                "--property=ExecMainStartTimestamp"
-            ])
+        try:
+            state = self.service.status()
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            self.logger.error(f"Error getting service status: {str(e)}")
+            state = ServiceState(unit=self.service_name)
 
-            if stdout:
-                # Parse the timestamp (format: ExecMainStartTimestamp=Day YYYY-MM-DD HH:MM:SS UTC)
-                match = re.search(r'ExecMainStartTimestamp=(.*)\n', stdout)
-                if match:
-                    try:
-                        start_time_str = match.group(1)
-                        start_time = datetime.datetime.strptime(
-                            start_time_str,
-                            "%a %Y-%m-%d %H:%M:%S %Z"
-                        )
-                        uptime = datetime.datetime.now() - start_time
-                        uptime_seconds = uptime.total_seconds()
-                        uptime_str = f"{uptime.days}d {uptime.seconds // 3600}h {(uptime.seconds // 60) % 60}m"
-                    except Exception as e:
-                        self.logger.error(f"Error parsing service start time: {str(e)}")
+        is_active = state.is_active
+        uptime_seconds = state.uptime_seconds()
+        uptime = datetime.timedelta(seconds=int(uptime_seconds))
+        uptime_str = f"{uptime.days}d {uptime.seconds // 3600}h {(uptime.seconds // 60) % 60}m"
 
         return {
             "status": "online" if is_active else "offline",
@@ -193,9 +181,14 @@ class VpnManager:
         Returns:
             List of dictionaries with client information
         """
+        # The live session table answers from memory while it is connected and seeded
+        sessions = self.sessions.sessions()
+        if sessions is not None:
+            return [self._session_client(session) for session in sessions]
+
         clients = []
 
-        # Try using management interface first
+        # Otherwise ask the management interface
         response = self._send_management_command("status")
 
         # Parse client connections from response
@@ -269,6 +262,33 @@ class VpnManager:
 
         return clients
 
+    @staticmethod
+    def _session_client(session: Session) -> Dict[str, Any]:
+        """get_active_clients entry for a live session"""
+        return {
+            "username": session.cn,
+            "full_name": session.cn,  # We might not have real names from OpenVPN
+            "ip_address": session.real_ip,
+            "virtual_ip": session.virtual_address,
+            "connected_since": VpnManager._format_time_ago(session.connected_since),
+            "download": round(session.bytes_received / (1024 * 1024 * 1024), 2),  # Convert to GB
+            "upload": round(session.bytes_sent / (1024 * 1024 * 1024), 2)  # Convert to GB
+        }
+
+    @staticmethod
+    def _format_time_ago(timestamp: Optional[datetime.datetime]) -> str:
+        """e.g. "5h 10m ago"; "unknown" without a timestamp"""
+        if timestamp is None:
+            return "unknown"
+        time_diff = datetime.datetime.now() - timestamp
+
+        if time_diff.days > 0:
+            return f"{time_diff.days}d ago"
+        elif time_diff.seconds // 3600 > 0:
+            return f"{time_diff.seconds // 3600}h {(time_diff.seconds // 60) % 60}m ago"
+        else:
+            return f"{time_diff.seconds // 60}m ago"
+
     def _get_client_connect_time(self, username: str) -> str:
         """
         Get the time since a client connected.
@@ -281,7 +301,7 @@ class VpnManager:
         """
         # Try to find connection time in logs
         try:
-            command = ["grep", f"'{username} Connection Initiated'", self.log_file]
+            command = ["grep", f"{username} Connection Initiated", self.log_file]
             stdout, _, _ = self._run_command(command)
 
             if stdout:
@@ -290,14 +310,7 @@ class VpnManager:
                 if match:
                     timestamp_str = match.group(1)
                     timestamp = datetime.datetime.strptime(timestamp_str, "%a %b %d %H:%M:%S %Y")
-                    time_diff = datetime.datetime.now() - timestamp
-
-                    if time_diff.days > 0:
-                        return f"{time_diff.days}d ago"
-                    elif time_diff.seconds // 3600 > 0:
-                        return f"{time_diff.seconds // 3600}h {(time_diff.seconds // 60) % 60}m ago"
-                    else:
-                        return f"{time_diff.seconds // 60}m ago"
+                    return self._format_time_ago(timestamp)
 
             return "unknown"
         except Exception as e:
@@ -311,19 +324,17 @@ class VpnManager:
         Returns:
             Dictionary with CPU, memory, disk, and bandwidth usage percentages
         """
+        sample = self.resource_monitor.latest()
         resource_usage = {
-            "cpu": 0.0,
-            "memory": 0.0,
-            "disk": 0.0,
+            "cpu": sample.cpu,
+            "memory": sample.memory,
+            "disk": sample.disk,
             "bandwidth": 0.0
         }
 
-        # Get CPU and memory usage for OpenVPN process
-        stdout, _, _ = self._run_command([
-            "ps", "-C", "openvpn", "-o", "%cpu,%mem", "--no-headers"
-        ])
-
-        if stdout:
+        if sample.pid is None:
+            # The OpenVPN process is not visible in our /proc (no pid: host), ask the host instead
+            stdout, _, _ = self._run_command(["ps", "-C", "openvpn", "-o", "%cpu,%mem", "--no-headers"])
             parts = stdout.strip().split()
             if len(parts) >= 2:
                 try:
@@ -332,32 +343,7 @@ class VpnManager:
                 except ValueError:
                     pass
 
-        # Get disk usage for OpenVPN directory
-        stdout, _, _ = self._run_command([
-            "df", "-h", self.config_dir
-        ])
-
-        if stdout:
-            lines = stdout.strip().split("\n")
-            if len(lines) >= 2:
-                parts = lines[1].split()
-                if len(parts) >= 5:
-                    try:
-                        # Parse percentage like '45%'
-                        disk_percent = parts[4].rstrip('%')
-                        resource_usage["disk"] = float(disk_percent)
-                    except ValueError:
-                        pass
-
-        # Estimate bandwidth usage based on active clients
-        clients = self.get_active_clients()
-        if clients:
-            # Calculate total bandwidth usage (arbitrary scale based on client count)
-            active_count = len(clients)
-            if active_count > 0:
-                # This is a very rough estimate - in a real scenario you'd want
-                # to monitor actual network interface traffic
-                resource_usage["bandwidth"] = min(active_count * 10, 100)
+        resource_usage["bandwidth"] = self.bandwidth.utilization()
 
         return resource_usage
 
@@ -369,65 +355,35 @@ class VpnManager:
             period: Time period for data ('day', 'week', 'month')
 
         Returns:
-            Dictionary with labels and traffic data
+            Dictionary with labels and traffic data (GB per bucket)
         """
-        # This would ideally come from a real monitoring system that tracks OpenVPN traffic
-        # For now, we'll provide a simple implementation that reads the current client data
+        now = datetime.datetime.now()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
 
-        # Get current client usage
-        clients = self.get_active_clients()
-        total_download = sum(client['download'] for client in clients)
-        total_upload = sum(client['upload'] for client in clients)
-
-        # Create simulated data based on period and current totals
-        if period == 'day':
-            labels = ['00:00', '03:00', '06:00', '09:00', '12:00', '15:00', '18:00', '21:00']
-            # Distribute total download/upload across hours with some variation
-            current_hour = datetime.datetime.now().hour
-            download = []
-            upload = []
-
-            for i, _ in enumerate(labels):
-                hour_block = i * 3
-                if hour_block <= current_hour:
-                    # For hours that have passed, create realistic looking data
-                    factor = 0.7 + 0.6 * (hour_block / 24)  # Traffic increases during the day
-                    download.append(round(total_download * factor / len(labels), 2))
-                    upload.append(round(total_upload * factor / len(labels), 2))
-                else:
-                    # For future hours, use zeros
-                    download.append(0)
-                    upload.append(0)
-
-        elif period == 'week':
+        if period == 'week':
             labels = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-            current_day = datetime.datetime.now().weekday()  # 0 = Monday
-
-            download = []
-            upload = []
-            for i in range(7):
-                if i <= current_day:
-                    # Weekdays have more traffic than weekends
-                    factor = 1.0 if i < 5 else 0.7
-                    download.append(round(total_download * factor / 5, 2))
-                    upload.append(round(total_upload * factor / 5, 2))
-                else:
-                    download.append(0)
-                    upload.append(0)
-
+            first = today - datetime.timedelta(days=today.weekday())
+            bounds = [(first + datetime.timedelta(days=i), first + datetime.timedelta(days=i + 1)) for i in range(7)]
         elif period == 'month':
             labels = [f'Week {i + 1}' for i in range(4)]
-            current_week = min(3, (datetime.datetime.now().day - 1) // 7)
-
-            download = []
-            upload = []
-            for i in range(4):
-                if i <= current_week:
-                    download.append(round(total_download * (i + 1) / 6, 2))
-                    upload.append(round(total_upload * (i + 1) / 6, 2))
-                else:
-                    download.append(0)
-                    upload.append(0)
+            first = today.replace(day=1)
+            bounds = [(first + datetime.timedelta(days=7 * i), first + datetime.timedelta(days=7 * (i + 1)))
+                      for i in range(3)]
+            # The last week runs to the end of the month
+            bounds.append((first + datetime.timedelta(days=21), (first + datetime.timedelta(days=32)).replace(day=1)))
+        else:
+            labels = ['00:00', '03:00', '06:00', '09:00', '12:00', '15:00', '18:00', '21:00']
+            bounds = [(today + datetime.timedelta(hours=3 * i), today + datetime.timedelta(hours=3 * (i + 1)))
+                      for i in range(8)]
+
+        download = []
+        upload = []
+        gb = 1024 * 1024 * 1024
+        for start, end in bounds:
+            # Bytes received on the tun device were sent by clients, and vice versa
+            rx, tx = self.bandwidth.totals_between(start, end)
+            download.append(round(tx / gb, 2))
+            upload.append(round(rx / gb, 2))
 
         return {
             "labels": labels,
@@ -496,8 +452,8 @@ class VpnManager:
         Returns:
             True if successful, False otherwise
         """
-        _, _, return_code = self._run_command(["systemctl", "restart", self.service_name])
-        success = return_code == 0
+        success = self.service.restart()
+        self.command_cache.invalidate("service")
 
         if success:
             self.logger.info("OpenVPN server restarted successfully")
@@ -506,62 +462,110 @@ class VpnManager:
 
         return success
 
-    def _get_user_list_internal(self) -> List[Dict[str, Any]]:
+    def _certificate_inventory(self, sync: bool = True) -> List[Tuple[str, str, bool]]:
         """
-        Internal method that does the actual work of getting the user list.
-        This is the original get_user_list implementation.
+        List client certificates as (username, expiry_date, valid).
+
+        A certificate is valid if it is neither revoked (index status or CRL) nor expired.
+        easy-rsa's index.txt is the primary source: one small file read covers every
+        certificate's status and expiry. Without it, fall back to parsing pki/issued.
+
+        Args:
+            sync: Bring the certificate store up to date first; False reads it as it is
+                (used while a sync is already running, e.g. from its on_chunk callback)
         """
-        users = []
-        cert_dir = os.path.join(self.config_dir, "server/easy-rsa/pki/issued")
-        ovpn_dir = os.path.join(self.config_dir, "client")
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if self.cert_index.exists:
+            return [
+                (entry.cn, entry.expiry_date,
+                 # "V" lines are only turned into "E" by `openssl ca -updatedb`, so check the date too
+                 entry.is_valid and not (entry.expires and entry.expires <= now) and not self._is_revoked(entry.serial))
+                for entry in self.cert_index.latest() if entry.cn and entry.cn != "server"
+            ]
 
-        if not os.path.exists(cert_dir):
-            self.logger.warning(f"Certificate directory not found: {cert_dir}")
-            return users
+        if not os.path.exists(self.cert_dir):
+            self.logger.warning(f"Certificate directory not found: {self.cert_dir}")
+            return []
+
+        if sync:
+            self.cert_store.sync()
+        return [
+            (username, record.expiry_date, record.not_after > now and not self._is_revoked(record.serial))
+            for username, record in self.cert_store.records().items() if username != "server"
+        ]
+
+    def _expiry_inventory(self) -> List[Tuple[str, str, datetime.datetime]]:
+        """(username, serial, notAfter) of every valid client certificate, for the expiry tracker"""
+        if self.cert_index.exists:
+            return [
+                (entry.cn, entry.serial, entry.expires)
+                for entry in self.cert_index.latest()
+                if entry.cn and entry.cn != "server" and entry.is_valid and not self._is_revoked(entry.serial)
+            ]
 
-        # Get list of certificate files
+        self.cert_store.sync()
+        return [
+            (username, record.serial, record.not_after)
+            for username, record in self.cert_store.records().items()
+            if username != "server" and not self._is_revoked(record.serial)
+        ]
+
+    def _expiry_version(self) -> tuple:
+        # index.txt changes on every issue and revoke; pki/issued's mtime covers PKIs without one
         try:
-            cert_files = [f for f in os.listdir(cert_dir) if f.endswith('.crt')]
+            issued = os.stat(self.cert_dir).st_mtime_ns
+        except OSError:
+            issued = None
+        return self.cert_index.version, self.revocations.mtime, issued
 
-            for cert_file in cert_files:
-                username = cert_file[:-4]  # Remove .crt extension
+    def _is_revoked(self, serial: str) -> bool:
+        """Whether the CRL lists serial; an unreadable CRL revokes nothing"""
+        try:
+            return self.revocations.is_revoked(serial)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Error reading CRL: {str(e)}")
+            return False
 
-                # Skip server certificate
-                if username == "server":
-                    continue
+    def _get_user_list_internal(self, usernames: Optional[set] = None, sync: bool = True) -> List[Dict[str, Any]]:
+        """
+        Internal method that does the actual work of getting the user list.
+        This is the original get_user_list implementation.
 
-                # Get certificate details
-                cert_path = os.path.join(cert_dir, cert_file)
-                stdout, _, _ = self._run_command(["openssl", "x509", "-in", cert_path, "-text"])
+        Args:
+            usernames: Only build these users (for incremental cache updates); None builds all
+            sync: Sync the certificate store first; False when called from inside a running sync
+        """
+        users = []
+        ovpn_dir = os.path.join(self.config_dir, "client")
 
-                # Extract expiry date
-                expiry_date = "unknown"
-                not_after_match = re.search(r"Not After\s*:\s*(.+)", stdout)
-                if not_after_match:
-                    expiry_date = not_after_match.group(1).strip()
+        try:
+            inventory = self._certificate_inventory(sync=sync)
+            if usernames is not None:
+                inventory = [item for item in inventory if item[0] in usernames]
+            records = self.cert_store.records(usernames)
 
-                # Check if user is active (has a valid certificate that's not revoked)
-                active = True
-                crl_path = os.path.join(self.config_dir, "server/easy-rsa/pki/crl.pem")
-                if os.path.exists(crl_path):
-                    stdout, _, _ = self._run_command(["openssl", "crl", "-in", crl_path, "-text"])
-                    if username in stdout:
-                        active = False
+            # One log read covers every user's last connection
+            last_connected = self._last_connection_times()
+
+            for username, expiry_date, valid in inventory:
+                record = records.get(username)
+                cert_path = os.path.join(self.cert_dir, f"{username}.crt")
+                if record is None and os.path.exists(cert_path):
+                    # Not in the store yet (first run): parse it directly
+                    record = self.cert_inspector.inspect(cert_path)
 
                 ovpn_file_path = os.path.join(ovpn_dir, f"{username}.ovpn")
                 has_ovpn_file = os.path.exists(ovpn_file_path)
 
-                # Get user's last connection from logs (if possible)
-                last_connected = self._get_last_connection_time(username)
-
                 users.append({
                     "username": username,
                     "full_name": username,  # We don't have this info in certs
                     "email": "",  # We don't have this info in certs
-                    "created_at": self._get_certificate_creation_time(cert_path),
-                    "last_connected": last_connected,
+                    "created_at": record.created_at if record else "",
+                    "last_connected": last_connected.get(username, ""),
                     "expiry_date": expiry_date,
-                    "active": active,
+                    # Check if user is active (has a valid certificate that's not revoked or expired)
+                    "active": valid,
                     "ip": "",  # Only available when connected
                     "download": 0,  # Only available when connected
                     "upload": 0,  # Only available when connected
@@ -600,48 +604,33 @@ class VpnManager:
             self.logger.warning(f"Certificate directory not found: {self.cert_dir}")
             return users
 
-        # Get revoked certificates list first (to avoid calling for each user)
-        revoked_users = set()
-        if os.path.exists(self.crl_path):
-            try:
-                stdout = self._run_command(["openssl", "crl", "-in", self.crl_path, "-text"])
-                # Extract all revoked certificate common names
-                revoked_matches = re.findall(
-                    r"Serial Number:.*?\n\s+Revocation Date:.*?\n\s+CRL entry extensions:.*?\n\s+X509v3 Subject Alternative Name:.*?\n\s+DNS:([\w\-]+)",
-                    stdout, re.DOTALL)
-                revoked_users = set(revoked_matches)
-            except Exception as e:
-                self.logger.error(f"Error reading CRL: {str(e)}")
-
         try:
             # Get certificate files
             cert_files = [f for f in os.listdir(self.cert_dir) if f.endswith('.crt') and f != "server.crt"]
 
-            # Get active clients data once (to avoid repeated calls)
+            # Get active clients data and connection history once (to avoid repeated calls)
             active_clients = {client["username"]: client for client in self.get_active_clients()}
+            last_connected = self._last_connection_times()
 
             for cert_file in cert_files:
                 username = cert_file[:-4]  # Remove .crt extension
 
                 try:
                     # Create basic user with available data
+                    cert_path = os.path.join(self.cert_dir, cert_file)
+                    record = self.cert_inspector.inspect(cert_path)
                     user = VPNUser(
                         username=username,
-                        active=username not in revoked_users,
-                        created_at=self._get_certificate_creation_time(os.path.join(self.cert_dir, cert_file))
+                        active=not (record and self._is_revoked(record.serial)),
+                        created_at=self._get_certificate_creation_time(cert_path)
                     )
 
                     # Get certificate details
-                    cert_path = os.path.join(self.cert_dir, cert_file)
-                    stdout = self._run_command(["openssl", "x509", "-in", cert_path, "-text"])
-
-                    # Extract expiry date
-                    not_after_match = re.search(r"Not After\s*:\s*(.+)", stdout)
-                    if not_after_match:
-                        user.expiry_date = not_after_match.group(1).strip()
+                    if record:
+                        user.expiry_date = record.expiry_date
 
                     # Get user's last connection from logs
-                    user.last_connected = self._get_last_connection_time(username)
+                    user.last_connected = last_connected.get(username, "")
 
                     # Update with connection status if active
                     if username in active_clients:
@@ -678,16 +667,15 @@ class VpnManager:
             # Return empty list for now - next request will have the data
             return []
 
-        # Update with active client information (this should be fast)
-        active_clients = self.get_active_clients()
-        for client in active_clients:
-            for user in users:
-                if user["username"] == client["username"]:
-                    user["active"] = True
-                    user["ip"] = client["ip_address"]
-                    user["download"] = client["download"]
-                    user["upload"] = client["upload"]
-                    break
+        # Update with active client information (from the live session table when it is up)
+        active_clients = {client["username"]: client for client in self.get_active_clients()}
+        for user in users:
+            client = active_clients.get(user["username"])
+            if client:
+                user["active"] = True
+                user["ip"] = client["ip_address"]
+                user["download"] = client["download"]
+                user["upload"] = client["upload"]
 
         return users
 
@@ -701,55 +689,44 @@ class VpnManager:
         Returns:
             ISO format timestamp string
         """
+        record = self.cert_inspector.inspect(cert_path)
+        if record:
+            return record.created_at
+
+        # Fall back to file creation time
         try:
-            stdout, _, _ = self._run_command(["openssl", "x509", "-in", cert_path, "-text"])
-            not_before_match = re.search(r"Not Before\s*:\s*(.+)", stdout)
-
-            if not_before_match:
-                date_str = not_before_match.group(1).strip()
-                # Parse OpenSSL date format
-                date_obj = datetime.datetime.strptime(date_str, "%b %d %H:%M:%S %Y %Z")
-                return date_obj.isoformat()
-
-            # Fall back to file creation time
-            ctime = os.path.getctime(cert_path)
-            return datetime.datetime.fromtimestamp(ctime).isoformat()
-        except Exception as e:
+            return datetime.datetime.fromtimestamp(os.path.getctime(cert_path)).isoformat()
+        except OSError as e:
             self.logger.error(f"Error getting certificate creation time: {str(e)}")
             return datetime.datetime.now().isoformat()
 
-    def _get_last_connection_time(self, username: str) -> str:
+    def _last_connection_times(self) -> Dict[str, str]:
         """
-        Get the last time a user connected to the VPN.
-
-        Args:
-            username: Username to search for
+        Last time each user connected to the VPN, from one read of the log.
 
         Returns:
-            ISO format timestamp string or empty string if not found
+            Dictionary of username to ISO format timestamp
         """
-        try:
-            # Look for the last successful connection in logs
-            stdout, _, _ = self._run_command([
-                "grep", "-a", f"'{username} Connection Initiated'", self.log_file
-            ])
-
-            if stdout:
-                # Get the most recent entry
-                lines = stdout.strip().split('\n')
-                last_line = lines[-1]
-
-                # Extract timestamp from log entry
-                match = re.search(r'(\w{3} \w{3} \d{1,2} \d{2}:\d{2}:\d{2} \d{4})', last_line)
-                if match:
-                    timestamp_str = match.group(1)
-                    timestamp = datetime.datetime.strptime(timestamp_str, "%a %b %d %H:%M:%S %Y")
-                    return timestamp.isoformat()
-
-            return ""
-        except Exception as e:
-            self.logger.error(f"Error getting last connection time: {str(e)}")
-            return ""
+        # One command for every user instead of a grep per user
+        stdout, _, _ = self._run_command(["grep", "-a", "Connection Initiated", self.log_file])
+        return self._parse_last_connection_times(stdout)
+
+    def _parse_last_connection_times(self, grep_output: str) -> Dict[str, str]:
+        """Timestamp of each user's last 'Connection Initiated' log line in grep output"""
+        times = {}
+        for line in grep_output.splitlines():
+            try:
+                # "<date> <ip:port> [alice] Peer Connection Initiated with ..." (or "... alice Connection Initiated")
+                name = re.search(r'\[([^\]]+)\] Peer Connection Initiated', line) or \
+                    re.search(r'(\S+) Connection Initiated', line)
+                match = re.search(r'(\w{3} \w{3} +\d{1,2} \d{2}:\d{2}:\d{2} \d{4})', line)
+                if name and match:
+                    timestamp = datetime.datetime.strptime(" ".join(match.group(1).split()), "%a %b %d %H:%M:%S %Y")
+                    # Later lines are more recent
+                    times[name.group(1).rsplit("/", 1)[-1]] = timestamp.isoformat()
+            except ValueError as e:
+                self.logger.error(f"Error getting last connection time: {str(e)}")
+        return times
 
     def add_client(self, username: str, email: str = "", full_name: str = "") -> bool:
         """
@@ -818,97 +795,38 @@ class VpnManager:
         #     return False
         # finally:
         vpnM.gen_cert(username)
+        self.command_cache.invalidate("certs")
+        self.expiry.refresh()
         return True
 
+    def add_clients(self, usernames: List[str]) -> List[Dict]:
+        """
+        Create client certificates and configs for many users in one call.
+
+        Args:
+            usernames: Usernames to provision
+
+        Returns:
+            One result per username with "success" and either "serial" or "error"
+        """
+        results = vpnM.gen_certs(usernames)
+        if any(result["success"] for result in results):
+            self.command_cache.invalidate("certs")
+            self.expiry.refresh()
+        return results
+
 
     def _create_client_config(self, username: str) -> None:
         """
         Create a client configuration file for OpenVPN.
 
+        Uses the same builder (and cached CA, ta.key and template) as certificate issuance.
+
         Args:
             username: Username for the client
         """
-        # Paths to required files
-        ca_path = os.path.join(self.server_conf_dir, "easy-rsa/pki/ca.crt")
-        cert_path = os.path.join(self.server_conf_dir, "easy-rsa/pki/issued", f"{username}.crt")
-        key_path = os.path.join(self.server_conf_dir, "easy-rsa/pki/private", f"{username}.key")
-        ta_path = os.path.join(self.server_conf_dir, "ta.key")
-
-        # Read server configuration to extract server address and port
-        server_config_path = os.path.join(self.server_conf_dir, "server.conf")
-        server_address = "your-vpn-server.com"  # Default address
-        server_port = "1194"  # Default port
-
-        if os.path.exists(server_config_path):
-            with open(server_config_path, 'r') as f:
-                for line in f:
-                    if line.startswith("port "):
-                        server_port = line.split()[1].strip()
-
-        # Read required certificate and key files
         try:
-            with open(ca_path, 'r') as f:
-                ca_content = f.read()
-
-            with open(cert_path, 'r') as f:
-                cert_content = f.read()
-
-            with open(key_path, 'r') as f:
-                key_content = f.read()
-
-            ta_content = ""
-            # if os.path.exists(ta_path):
-            #     with open(ta_path, 'r') as f:
-            #         ta_content = f.read()
-
-            # Generate client configuration
-            client_config = f"""# Client configuration for {username}
-client
-dev tun
-proto udp
-remote {server_address} {server_port}
-resolv-retry infinite
-nobind
-persist-key
-persist-tun
-cipher AES-256-CBC
-auth SHA1
-verb 3
-key-direction 1
-
-# CA certificate
-<ca>
-{ca_content}
-</ca>
-
-# Client certificate
-<cert>
-{cert_content}
-</cert>
-
-# Client key
-<key>
-{key_content}
-</key>
-"""
-
-            # Add TLS auth if available
-            if ta_content:
-                client_config += f"""
-# TLS auth key
-<tls-auth>
-{ta_content}
-</tls-auth>
-"""
-
-            # Write client configuration to file
-            client_dir = os.path.join(self.config_dir, "client-configs")
-            os.makedirs(client_dir, exist_ok=True)
-
-            config_path = os.path.join(client_dir, f"{username}.ovpn")
-            with open(config_path, 'w') as f:
-                f.write(client_config)
-
+            config_path = get_config_builder().build(username)
             print(f"Client configuration created: {config_path}")
         except Exception as e:
             print(f"Error creating client configuration: {str(e)}")
@@ -917,6 +835,9 @@ key-direction 1
         """
         Revoke a client certificate.
 
+        The new CRL is swapped in atomically and only this client's session is killed;
+        the server keeps running.
+
         Args:
             username: Username of the client to revoke
 
@@ -926,57 +847,43 @@ key-direction 1
         if not username:
             return False
 
-        # Change to easy-rsa directory
-        easy_rsa_dir = os.path.join(self.config_dir, "easy-rsa")
+        easy_rsa_dir = os.path.join(self.server_conf_dir, "easy-rsa")
         if not os.path.exists(easy_rsa_dir):
             self.logger.error(f"easy-rsa directory not found: {easy_rsa_dir}")
             return False
 
         try:
-            # First disconnect client if connected
-            self.disconnect_client(username)
-
-            # Navigate to easy-rsa directory
-            current_dir = os.getcwd()
-            os.chdir(easy_rsa_dir)
-
-            # Revoke certificate
-            _, _, return_code = self._run_command([
-                "./easyrsa", "revoke", username
-            ])
-
-            if return_code != 0:
-                self.logger.error(f"Failed to revoke certificate for user {username}")
-                return False
-
-            # Generate new CRL
-            _, _, return_code = self._run_command([
-                "./easyrsa", "gen-crl"
-            ])
-
-            if return_code != 0:
-                self.logger.error("Failed to generate new CRL")
-                return False
-
-            # Copy CRL to OpenVPN directory
-            crl_src = os.path.join(easy_rsa_dir, "pki/crl.pem")
-            crl_dst = os.path.join(self.config_dir, "crl.pem")
-            _, _, return_code = self._run_command([
-                "cp", crl_src, crl_dst
-            ])
-
-            if return_code != 0:
-                self.logger.error("Failed to copy CRL to OpenVPN directory")
+            result = self.revoke_clients([username])[0]
+            if not result["success"]:
+                self.logger.error(f"Failed to revoke certificate for user {username}: {result['error']}")
                 return False
+            if not result["disconnected"]:
+                self.logger.warning(f"Revoked {username}, but a session may still be up")
 
             self.logger.info(f"Successfully revoked client {username}")
             return True
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             self.logger.error(f"Error revoking client: {str(e)}")
             return False
+
+    def revoke_clients(self, usernames: List[str], reason: str = "") -> List[Dict]:
+        """
+        Revoke many client certificates with a single CRL rebuild and no server restart.
+
+        Args:
+            usernames: Usernames to revoke
+            reason: easy-rsa revocation reason (e.g. "keyCompromise"); empty for none
+
+        Returns:
+            One result per username with "success", "disconnected" and either "serial" or "error"
+        """
+        try:
+            return vpnM.revoke_many(usernames, reason)
         finally:
-            # Return to original directory
-            os.chdir(current_dir)
+            self.command_cache.invalidate("certs", "crl")
+            self.expiry.refresh()
 
     def get_recent_logs(self, limit: int = 10) -> List[Dict[str, Any]]:
         """
@@ -1106,8 +1013,16 @@ key-direction 1
         }
 
         try:
+            # Run all independent probes concurrently
+            probes = [
+                ["openvpn", "--version"],
+                ["openssl", "version"],
+                ["ufw", "status"]
+            ]
+            outputs = [stdout for stdout, _, _ in self.executor.run_all(probes)]
+
             # Check OpenVPN version
-            stdout, _, _ = self._run_command(["openvpn", "--version"])
+            stdout = outputs[0]
             if stdout:
                 # Extract version number
                 version_match = re.search(r'OpenVPN\s+(\d+\.\d+\.\d+)', stdout)
@@ -1119,7 +1034,7 @@ key-direction 1
                         results["outdated_packages"].append(f"openvpn-{version}")
 
             # Check OpenSSL version
-            stdout, _, _ = self._run_command(["openssl", "version"])
+            stdout = outputs[1]
             if stdout:
                 # Extract version number
                 version_match = re.search(r'OpenSSL\s+(\d+\.\d+\.\d+[a-z]*)', stdout)
@@ -1131,7 +1046,7 @@ key-direction 1
                         results["outdated_packages"].append(f"openssl-{version}")
 
             # Check firewall status (assuming ufw)
-            stdout, _, _ = self._run_command(["ufw", "status"])
+            stdout = outputs[2]
             if "inactive" in stdout.lower():
                 results["firewall_issues"].append("Firewall is inactive")
 
@@ -1141,35 +1056,20 @@ key-direction 1
                     results["firewall_issues"].append("OpenVPN port may not be open in firewall")
 
             # Check server certificate expiry
-            server_cert_path = os.path.join(self.config_dir, "easy-rsa/pki/issued/server.crt")
-            if os.path.exists(server_cert_path):
-                stdout, _, _ = self._run_command([
-                    "openssl", "x509", "-in", server_cert_path, "-noout", "-enddate"
-                ])
-
-                if stdout:
-                    # Extract expiry date
-                    expiry_match = re.search(r'notAfter=(.+)', stdout)
-                    if expiry_match:
-                        expiry_str = expiry_match.group(1).strip()
-                        try:
-                            # Parse OpenSSL date format
-                            expiry_date = datetime.datetime.strptime(
-                                expiry_str,
-                                "%b %d %H:%M:%S %Y %Z"
-                            )
-
-                            # Format as YYYY-MM-DD
-                            results["certificate_expiry"] = expiry_date.strftime("%Y-%m-%d")
-
-                            # Check if certificate is close to expiry
-                            days_to_expiry = (expiry_date - datetime.datetime.now()).days
-                            if days_to_expiry < 30:
-                                results["firewall_issues"].append(
-                                    f"Server certificate expires in {days_to_expiry} days"
-                                )
-                        except ValueError:
-                            results["certificate_expiry"] = expiry_str
+            server_cert = self.cert_inspector.inspect(os.path.join(self.cert_dir, "server.crt"))
+            if server_cert:
+                # Format as YYYY-MM-DD
+                results["certificate_expiry"] = server_cert.not_after.strftime("%Y-%m-%d")
+
+                # Check if certificate is close to expiry
+                days_to_expiry = (server_cert.not_after - datetime.datetime.now(datetime.timezone.utc)).days
+                if days_to_expiry < 30:
+                    results["firewall_issues"].append(
+                        f"Server certificate expires in {days_to_expiry} days"
+                    )
+
+            # Client certificates inside the warning window, from the expiry tracker
+            results["expiring_client_certificates"] = self.expiry.expiring_within(self.expiry.warning)
 
             # Determine overall status
             if results["outdated_packages"] or any(
@@ -1180,6 +1080,10 @@ key-direction 1
             else:
                 results["overall_status"] = "good"
 
+            return results
+        except DeadlineExceeded:
+            self.logger.warning("Deadline exceeded during security check")
+            results["partial"] = True
             return results
         except Exception as e:
             self.logger.error(f"Error during security check: {str(e)}")
@@ -1218,9 +1122,14 @@ key-direction 1
             Dictionary with data transfer statistics
         """
         # Get current client usage
-        clients = self.get_active_clients()
-        total_download = sum(client['download'] for client in clients)
-        total_upload = sum(client['upload'] for client in clients)
+        totals = self.sessions.totals()
+        if totals is not None:
+            total_download = totals["bytes_received"] / (1024 * 1024 * 1024)
+            total_upload = totals["bytes_sent"] / (1024 * 1024 * 1024)
+        else:
+            clients = self.get_active_clients()
+            total_download = sum(client['download'] for client in clients)
+            total_upload = sum(client['upload'] for client in clients)
 
         # Convert to TB
         total_transfer = (total_download + total_upload) / 1000
@@ -1267,27 +1176,29 @@ key-direction 1
         """
         Get basic server and usage information for the dashboard.
 
+        Sections are filled in order until the request's deadline runs out; the rest
+        are left as None and the result is marked "partial".
+
         Returns:
             Dictionary with server status and statistics
         """
-        # Get server status
-        server = self.get_server_status()
-
-        # Get active users stats
-        active_users = self.get_active_users_stats()
+        sections = [
+            ("server", self.get_server_status),
+            ("active_users", self.get_active_users_stats),
+            ("data_transfer", self.get_data_transfer_stats),
+            ("security", self.get_security_alerts),
+        ]
+        info = {name: None for name, _ in sections}
+        info["partial"] = False
 
-        # Get data transfer stats
-        data_transfer = self.get_data_transfer_stats()
-
-        # Get security alerts
-        security = self.get_security_alerts()
+        try:
+            for name, fetch in sections:
+                info[name] = fetch()
+        except DeadlineExceeded:
+            self.logger.warning("Deadline exceeded while building basic info, returning partial result")
+            info["partial"] = True
 
-        return {
-            "server": server,
-            "active_users": active_users,
-            "data_transfer": data_transfer,
-            "security": security
-        }
+        return info
 
     def apply_and_restart(self) -> Dict:
         """Save configuration and restart the service"""
@@ -16,3 +16,100 @@ CONFIG = {
     "connection_timeout": 10,  # Connection timeout in seconds
     "command_whitelist": None,  # Set to list of allowed commands or None to allow all
 }
+
+# SSH access from the container to the OpenVPN host
+HOST_SSH = {
+    "host": "host.docker.internal",
+    "username": os.environ.get("HOST_USER", "root"),
+    "key_path": os.environ.get("HOST_SSH_KEY", "/app/ssh/id_host_access"),
+    "max_transports": 2,  # Authenticated transports kept open per worker
+    "max_sessions": 8,  # Concurrent command channels per worker
+    "keepalive": 30,  # SSH keepalive interval in seconds
+    "connect_timeout": 10,  # Connection timeout in seconds
+}
+
+# OpenVPN management interface (management 127.0.0.1 7505 in the server config)
+MANAGEMENT = {
+    "host": os.environ.get("OPENVPN_MANAGEMENT_HOST", "127.0.0.1"),
+    "port": int(os.environ.get("OPENVPN_MANAGEMENT_PORT", 7505)),
+    # Unix socket the worker holding the management connection shares it on (default: in the temp dir)
+    "socket": os.environ.get("OPENVPN_MANAGEMENT_SOCKET"),
+    # Seconds between the per-client byte counts OpenVPN pushes to the session table
+    "bytecount_interval": 5,
+}
+
+# Unix socket of the host agent (host_agent.py); when set it replaces SSH for host commands
+HOST_AGENT_SOCKET = os.environ.get("HOST_AGENT_SOCKET")
+
+# How host commands run: "local" (app runs on the OpenVPN host), "ssh" or "agent"
+HOST_TRANSPORT = os.environ.get("HOST_TRANSPORT", "agent" if HOST_AGENT_SOCKET else "ssh")
+
+# Host systemd D-Bus socket (mounted into the container) used for service status and control
+SYSTEMD_BUS_ADDRESS = os.environ.get("SYSTEMD_BUS_ADDRESS", "unix:path=/run/dbus/system_bus_socket")
+
+# In-process resource sampling of the OpenVPN process (needs the host's /proc, see pid: host in docker-compose)
+METRICS = {
+    "interval": 5,  # Seconds between samples
+    "history": 120,  # Samples kept in the ring buffer
+    "proc_root": os.environ.get("PROC_ROOT", "/proc"),
+    "bandwidth_interval": 5,  # Seconds between /proc/net/dev reads
+    "interface_prefix": "tun",  # OpenVPN devices whose counters are summed
+    "link_capacity_mbps": float(os.environ.get("LINK_CAPACITY_MBPS", 100)),  # Uplink size for bandwidth %
+}
+
+# Independent host commands run concurrently by main.async_exec, at most this many at once per host
+HOST_COMMAND_CONCURRENCY = HOST_SSH["max_sessions"]
+
+# Seconds a host command (including the wait for a free session) may take when no request deadline bounds it
+HOST_COMMAND_TIMEOUT = 60
+
+# Total seconds one request may spend on outbound calls (kept well under gunicorn's 120s worker timeout)
+REQUEST_DEADLINE = float(os.environ.get("REQUEST_DEADLINE", 25))
+
+# Seconds between directory scans when inotify is unavailable for watching pki/issued, pki/revoked and crl.pem
+CERT_WATCH_POLL_INTERVAL = 30
+
+# Client certificate expiry tracking: "expiring" events fire this many days ahead of notAfter
+CERT_EXPIRY = {
+    "warning_days": 30,
+    "poll_interval": 300,  # Upper bound on seconds between inventory checks
+}
+
+# Full certificate scans (first build or rebuild) parse in a process pool once this many certificates need parsing
+CERT_SCAN = {
+    "workers": int(os.environ.get("CERT_SCAN_WORKERS", 0)) or None,  # None uses every CPU
+    "chunk_size": 500,  # Certificates per worker task
+    "parallel_threshold": 2000,
+}
+
+# In-process client certificate issuance with the easy-rsa CA (main.pki.issuer)
+PKI_ISSUE = {
+    "days": 3650,  # Same as easyrsa --days=3650
+    "key_size": 2048,  # RSA bits; EC CAs issue keys on the CA's curve
+    "ca_passphrase": os.environ.get("EASYRSA_CA_PASSPHRASE"),  # Only if ca.key is encrypted
+    "workers": None,  # Key generation processes for bulk issuance; None uses every CPU
+    "key_pool_size": int(os.environ.get("KEY_POOL_SIZE", 50)),  # Pre-generated keys kept in pki/private/keypool; 0 disables
+    "key_pool_low_water": 10,  # Refill once fewer keys than this are left
+    "crl_days": 3650,  # Same as easyrsa --days=3650 gen-crl
+}
+
+# Seconds a request waits for its turn on the PKI mutation queue (issue/revoke) plus the operation itself
+PKI_QUEUE_TIMEOUT = 90
+
+# Where OpenVPN reads the CRL (crl-verify), and who it reads it as
+CRL_INSTALL = {
+    "path": VPN_DIR / "server" / "crl.pem",
+    "owner": "nobody",
+    "group": "nogroup",
+}
+
+# Most identities one bulk provisioning request may create. Requests run synchronously, so this has to
+# fit REQUEST_DEADLINE: an RSA-2048 key takes ~0.1s per core when the key pool is empty, so 100
+# identities take ~10s on a single core, plus signing and writing configs
+BULK_PROVISION_LIMIT = 100
+
+# Template and options for generated client .ovpn files
+CLIENT_CONFIG = {
+    "template": BASE_PATH / "templates" / "cert.ovpn",
+    "tls_auth": False,  # Embed server/ta.key as <tls-auth>
+}
@@ -0,0 +1,48 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+from main.artifacts import stream_zip
+
+# archive name -> content
+FILES = [
+    {},
+    {"alice.ovpn": b"client\nremote 203.0.113.1 1194\n"},
+    {"alice.ovpn": b"a" * 10, "bob.ovpn": b"", "carol.ovpn": os.urandom(200 * 1024)},
+]
+
+
+def _write(tmp_path, files):
+    pairs = []
+    for name, data in files.items():
+        path = tmp_path / name
+        path.write_bytes(data)
+        pairs.append((name, path))
+    return pairs
+
+
+@pytest.mark.parametrize("files", FILES)
+@pytest.mark.parametrize("chunk_size", [7, 64 * 1024])
+def test_stream_zip(tmp_path, files, chunk_size):
+    chunks = list(stream_zip(_write(tmp_path, files), chunk_size=chunk_size))
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == list(files)
+        for name, data in files.items():
+            assert archive.read(name) == data
+
+
+def test_streams_large_files_in_pieces(tmp_path):
+    pairs = _write(tmp_path, {"big.ovpn": os.urandom(512 * 1024)})
+    chunks = [chunk for chunk in stream_zip(pairs, chunk_size=64 * 1024) if chunk]
+    assert len(chunks) > 4
+    assert max(len(chunk) for chunk in chunks) < 128 * 1024
+
+
+def test_skips_files_that_disappear(tmp_path):
+    pairs = _write(tmp_path, {"alice.ovpn": b"alice", "bob.ovpn": b"bob"})
+    os.unlink(pairs[0][1])
+    with zipfile.ZipFile(io.BytesIO(b"".join(stream_zip(pairs)))) as archive:
+        assert archive.namelist() == ["bob.ovpn"]
@@ -0,0 +1,61 @@
+import subprocess
+
+import pytest
+
+from main.command import _batch_marker, _build_batch_script, _split_batch_result
+
+# (command, stdout, stderr, exit code)
+CASES = [
+    ("echo hello", "hello\n", "", 0),
+    ("printf 'no newline'", "no newline", "", 0),
+    ("true", "", "", 0),
+    ("echo oops >&2; exit 3", "", "oops\n", 3),
+    ("printf 'a\\n\\nb\\n'", "a\n\nb\n", "", 0),
+    # exit stays inside the command's subshell, so the batch goes on
+    ("exit 1", "", "", 1),
+    ("echo after", "after\n", "", 0),
+]
+
+
+def _run(script):
+    proc = subprocess.run(["sh", "-c", script], capture_output=True, text=True)
+    return {"success": proc.returncode == 0, "stdout": proc.stdout, "stderr": proc.stderr,
+            "exit_code": proc.returncode}
+
+
+def test_batch_round_trip():
+    marker = _batch_marker()
+    results = _split_batch_result(_run(_build_batch_script([c[0] for c in CASES], marker)), len(CASES), marker)
+    assert [(r["stdout"], r["stderr"], r["exit_code"]) for r in results] == [c[1:] for c in CASES]
+    assert [r["success"] for r in results] == [c[3] == 0 for c in CASES]
+
+
+@pytest.mark.parametrize("command,stdout,stderr,exit_code", CASES)
+def test_single_command(command, stdout, stderr, exit_code):
+    marker = _batch_marker()
+    result, = _split_batch_result(_run(_build_batch_script([command], marker)), 1, marker)
+    assert (result["stdout"], result["stderr"], result["exit_code"]) == (stdout, stderr, exit_code)
+
+
+def test_output_that_looks_like_a_marker_of_another_batch():
+    marker = _batch_marker()
+    other = _batch_marker()
+    result, = _split_batch_result(_run(_build_batch_script([f"echo '{other}:0:end:0'"], marker)), 1, marker)
+    assert result["stdout"] == f"{other}:0:end:0\n"
+
+
+def test_truncated_output_fails_the_missing_commands():
+    marker = _batch_marker()
+    output = _run(_build_batch_script(["echo one", "echo two"], marker))
+    output["stdout"] = output["stdout"].split(f"{marker}:1:begin")[0]
+    output["error"] = "Connection lost"
+    first, second = _split_batch_result(output, 2, marker)
+    assert (first["stdout"], first["exit_code"]) == ("one\n", 0)
+    assert (second["success"], second["error"], second["exit_code"]) == (False, "Connection lost", -1)
+
+
+def test_failed_connection_fails_every_command():
+    error = {"success": False, "error": "Failed to connect to host", "exit_code": -1}
+    results = _split_batch_result(error, 3, _batch_marker())
+    assert results == [error] * 3
+    assert results[0] is not error
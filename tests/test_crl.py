@@ -0,0 +1,80 @@
+import datetime
+import os
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from main.pki.crl import RevocationList
+
+NAME = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "Test CA")])
+
+
+def _crl(serials, encoding=serialization.Encoding.PEM) -> bytes:
+    key = ec.generate_private_key(ec.SECP256R1())
+    now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    builder = (
+        x509.CertificateRevocationListBuilder()
+        .issuer_name(NAME)
+        .last_update(now)
+        .next_update(now + datetime.timedelta(days=30))
+    )
+    for serial in serials:
+        builder = builder.add_revoked_certificate(
+            x509.RevokedCertificateBuilder().serial_number(serial).revocation_date(now).build())
+    return builder.sign(key, hashes.SHA256()).public_bytes(encoding)
+
+
+@pytest.fixture
+def crl_path(tmp_path):
+    path = tmp_path / "crl.pem"
+    path.write_bytes(_crl([0x0A1B, 0x3E, 0xF]))
+    return path
+
+
+def test_serials(crl_path):
+    revocations = RevocationList(str(crl_path))
+    # Upper-case hex padded to whole bytes, as in index.txt
+    assert revocations.serials() == {"0A1B", "3E", "0F"}
+    assert len(revocations) == 3
+    assert revocations.next_update - revocations.last_update == datetime.timedelta(days=30)
+
+
+@pytest.mark.parametrize("serial,revoked", [
+    (0x0A1B, True),
+    ("0A1B", True),
+    ("0a1b", True),
+    ("A1B", True),  # Odd length, as some tools print it
+    ("F", True),
+    (0x3E, True),
+    ("3F", False),
+    (0x10, False),
+])
+def test_is_revoked(crl_path, serial, revoked):
+    assert RevocationList(str(crl_path)).is_revoked(serial) == revoked
+
+
+def test_der(tmp_path):
+    path = tmp_path / "crl.der"
+    path.write_bytes(_crl([0x01], serialization.Encoding.DER))
+    assert RevocationList(str(path)).serials() == {"01"}
+
+
+def test_reloads_only_on_change(crl_path):
+    revocations = RevocationList(str(crl_path))
+    assert revocations.refresh()
+    assert not revocations.refresh()
+
+    crl_path.write_bytes(_crl([0x0A1B, 0x3E, 0xF, 0x1234]))
+    os.utime(crl_path, ns=(0, 1))
+    assert revocations.refresh()
+    assert revocations.is_revoked("1234")
+
+
+def test_missing_file(tmp_path):
+    revocations = RevocationList(str(tmp_path / "crl.pem"))
+    assert revocations.serials() == frozenset()
+    assert revocations.mtime == 0
+    assert not revocations.is_revoked("01")
@@ -0,0 +1,135 @@
+import datetime
+import time
+
+import pytest
+
+from main.pki.expiry import EXPIRED, EXPIRING, ExpiryTracker
+
+NOW = datetime.datetime.now(datetime.timezone.utc)
+
+
+def days(n):
+    return NOW + datetime.timedelta(days=n)
+
+
+class _Inventory:
+    """(cn, serial, not_after) rows with a version bumped on every change"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.version = 0
+
+    def set(self, rows):
+        self.rows = list(rows)
+        self.version += 1
+
+
+def _tracker(tmp_path, rows, **kwargs):
+    inventory = _Inventory(rows)
+    kwargs.setdefault("warning", datetime.timedelta(days=30))
+    tracker = ExpiryTracker(lambda: inventory.rows, lambda: inventory.version,
+                            db_path=str(tmp_path / "cache.db"), **kwargs)
+    return inventory, tracker
+
+
+ROWS = [
+    ("alice", "01", days(90)),
+    ("bob", "02", days(10)),
+    ("carol", "03", days(-1)),  # Already expired
+    ("dave", "04", days(45)),
+    ("erin", "05", days(5)),
+    ("frank", "06", days(200)),
+]
+
+
+@pytest.mark.parametrize("k,expected", [
+    (1, ["erin"]),
+    (3, ["erin", "bob", "dave"]),
+    (10, ["erin", "bob", "dave", "alice", "frank"]),
+])
+def test_next_expiring(tmp_path, k, expected):
+    _, tracker = _tracker(tmp_path, ROWS)
+    assert [item["username"] for item in tracker.next_expiring(k)] == expected
+
+
+@pytest.mark.parametrize("window,count", [(1, 0), (7, 1), (30, 2), (60, 3), (365, 5)])
+def test_expiring_within(tmp_path, window, count):
+    _, tracker = _tracker(tmp_path, ROWS)
+    assert tracker.expiring_within(datetime.timedelta(days=window)) == count
+
+
+def test_expired(tmp_path):
+    _, tracker = _tracker(tmp_path, ROWS)
+    assert tracker.expired() == ["carol"]
+    stats = tracker.stats()
+    assert (stats["tracked"], stats["expired"]) == (5, 1)
+
+
+def test_reissue_and_removal_invalidate_lazily(tmp_path):
+    inventory, tracker = _tracker(tmp_path, ROWS)
+    tracker.refresh()
+
+    # erin and alice re-issued with new serials, bob removed, carol renewed
+    rows = [row for row in ROWS if row[0] in ("dave", "frank")]
+    inventory.set(rows + [("erin", "15", days(400)), ("carol", "13", days(20)), ("alice", "11", days(300))])
+    items = tracker.next_expiring(10)
+    assert [(item["username"], item["serial"]) for item in items] == \
+        [("carol", "13"), ("dave", "04"), ("frank", "06"), ("alice", "11"), ("erin", "15")]
+    assert tracker.expired() == []
+
+    # Superseded entries at the top are popped; the rest (alice's old one) stay until compaction,
+    # but are never returned
+    assert (days(90), "alice", "01") in tracker._heap
+    assert len(tracker._heap) > len(tracker._current)
+    assert tracker.expiring_within(datetime.timedelta(days=30)) == 1
+
+
+def test_unchanged_version_skips_the_inventory(tmp_path):
+    inventory, tracker = _tracker(tmp_path, ROWS)
+    assert tracker.refresh()
+    inventory.rows.append(("zed", "99", days(1)))  # Not announced through the version
+    assert not tracker.refresh()
+    assert "zed" not in [item["username"] for item in tracker.next_expiring(10)]
+
+
+def test_compaction_bounds_the_heap(tmp_path):
+    inventory, tracker = _tracker(tmp_path, ROWS[:1])
+    for i in range(200):
+        inventory.set([("alice", f"{i:04X}", days(100 + i))])
+        tracker.refresh()
+    assert len(tracker._heap) <= 2 * len(tracker._current) + 64
+    assert tracker.next_expiring(1)[0]["serial"] == f"{199:04X}"
+
+
+def test_due_events_fire_once(tmp_path):
+    soon = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=0.2)
+    rows = [("alice", "01", soon), ("bob", "02", days(90))]
+    _, tracker = _tracker(tmp_path, rows, warning=datetime.timedelta(seconds=0.1))
+    _, other = _tracker(tmp_path, rows, warning=datetime.timedelta(seconds=0.1))
+    fired = []
+    tracker.subscribe(fired.append)
+    other.subscribe(fired.append)
+    tracker.refresh()
+    other.refresh()
+
+    time.sleep(0.3)
+    tracker._fire_due()
+    assert [(event.kind, event.cn) for event in fired] == [(EXPIRING, "alice"), (EXPIRED, "alice")]
+
+    # Another process firing the same events (e.g. after taking over) does not repeat them
+    other._fire_due()
+    assert len(fired) == 2
+    assert {(event.kind, event.cn) for event in other.recent_events()} == {(EXPIRING, "alice"), (EXPIRED, "alice")}
+
+
+def test_events_are_dropped_when_not_leading(tmp_path):
+    soon = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=0.1)
+    _, tracker = _tracker(tmp_path, [("alice", "01", soon)], warning=datetime.timedelta(seconds=0.05))
+    fired = []
+    tracker.subscribe(fired.append)
+    tracker.refresh()
+
+    time.sleep(0.2)
+    assert tracker._fire_due(leading=False) is None
+    assert fired == []
+    assert tracker.recent_events() == []
@@ -0,0 +1,95 @@
+import datetime
+import os
+
+import pytest
+
+from main.pki.index import (EXPIRED, REVOKED, VALID, CertificateIndex, IndexEntry, format_index_time,
+                            parse_index_time)
+
+UTC = datetime.timezone.utc
+
+# As written by easy-rsa 3 (openssl ca): alice revoked and re-issued, bob expired, carol valid past 2050
+INDEX = (
+    "R\t340101000000Z\t240301120000Z,superseded\t0A1B\tunknown\t/CN=alice\n"
+    "V\t360301120000Z\t\t0C2D\tunknown\t/CN=alice\n"
+    "E\t240101000000Z\t\t3E\tunknown\t/C=US/O=Example/CN=bob\n"
+    "V\t20510101000000Z\t\tab12\tunknown\t/CN=carol\n"
+    "V\t340101000000Z\t\t0F\tunknown\t/CN=server\n"
+)
+
+
+@pytest.mark.parametrize("value,expected", [
+    ("340101000000Z", datetime.datetime(2034, 1, 1, tzinfo=UTC)),
+    ("240301120000Z", datetime.datetime(2024, 3, 1, 12, tzinfo=UTC)),
+    ("20510101000000Z", datetime.datetime(2051, 1, 1, tzinfo=UTC)),
+    ("", None),
+    ("not a time", None),
+])
+def test_parse_index_time(value, expected):
+    assert parse_index_time(value) == expected
+
+
+@pytest.mark.parametrize("value,expected", [
+    (datetime.datetime(2034, 1, 1, tzinfo=UTC), "340101000000Z"),
+    (datetime.datetime(2051, 1, 1, tzinfo=UTC), "20510101000000Z"),
+])
+def test_format_index_time(value, expected):
+    assert format_index_time(value) == expected
+    assert parse_index_time(expected) == value
+
+
+@pytest.mark.parametrize("line,status,cn,serial,reason", [
+    ("R\t340101000000Z\t240301120000Z,superseded\t0A1B\tunknown\t/CN=alice\n", REVOKED, "alice", "0A1B", "superseded"),
+    ("V\t360301120000Z\t\t0C2D\tunknown\t/CN=alice\n", VALID, "alice", "0C2D", ""),
+    ("E\t240101000000Z\t\t3E\tunknown\t/C=US/O=Example/CN=bob\n", EXPIRED, "bob", "3E", ""),
+    ("V\t340101000000Z\t\tab12\tunknown\t/CN=carol\n", VALID, "carol", "AB12", ""),
+])
+def test_parse_entry(line, status, cn, serial, reason):
+    entry = IndexEntry.parse(line)
+    assert (entry.status, entry.cn, entry.serial, entry.revocation_reason) == (status, cn, serial, reason)
+    assert entry.is_valid == (status == VALID)
+
+
+@pytest.mark.parametrize("line", [
+    "",
+    "X\t340101000000Z\t\t01\tunknown\t/CN=alice\n",
+    "V\t340101000000Z\t\t01\n",
+])
+def test_parse_rejects_malformed_lines(line):
+    assert IndexEntry.parse(line) is None
+
+
+def test_to_line_round_trip():
+    # Serials are normalised to upper case; everything else is written back as read
+    for line in INDEX.splitlines(keepends=True):
+        assert IndexEntry.parse(line).to_line() == line.replace("ab12", "AB12")
+
+
+def test_certificate_index(tmp_path):
+    path = tmp_path / "index.txt"
+    path.write_text(INDEX)
+    index = CertificateIndex(str(path))
+
+    assert len(index.entries()) == 5
+    assert {entry.cn: entry.serial for entry in index.latest()} == \
+        {"alice": "0C2D", "bob": "3E", "carol": "AB12", "server": "0F"}
+    assert index.by_cn("alice").is_valid
+    assert index.by_serial("0a1b").status == REVOKED
+    assert index.by_serial("FFFF") is None
+
+
+def test_certificate_index_reloads_on_change(tmp_path):
+    path = tmp_path / "index.txt"
+    path.write_text(INDEX)
+    index = CertificateIndex(str(path))
+    version = index.version
+    assert index.version == version  # Unchanged file: not re-read
+
+    path.write_text(INDEX + "V\t340101000000Z\t\t10\tunknown\t/CN=dave\n")
+    os.utime(path, ns=(0, 1))
+    assert index.version == version + 1
+    assert index.by_cn("dave").serial == "10"
+
+    path.unlink()
+    assert index.latest() == []
+    assert not index.exists
@@ -0,0 +1,160 @@
+import datetime
+
+from main.sessions import SessionTable
+
+# `status 3` of OpenVPN 2.5 with two clients, one of them still authenticating (no common name yet)
+STATUS_3 = [
+    "TITLE\tOpenVPN 2.5.5 x86_64-pc-linux-gnu [SSL (OpenSSL)] [LZO] [LZ4] [EPOLL] [PKCS11] [MH/PKTINFO] [AEAD]",
+    "TIME\t2024-03-18 10:15:02\t1710756902",
+    "HEADER\tCLIENT_LIST\tCommon Name\tReal Address\tVirtual Address\tVirtual IPv6 Address\tBytes Received"
+    "\tBytes Sent\tConnected Since\tConnected Since (time_t)\tUsername\tClient ID\tPeer ID\tData Channel Cipher",
+    "CLIENT_LIST\talice\t203.0.113.10:51234\t10.8.0.2\t\t183046\t402118\t2024-03-18 09:58:41\t1710755921"
+    "\tUNDEF\t0\t0\tAES-256-GCM",
+    "CLIENT_LIST\tbob\t198.51.100.7:1194\t10.8.0.3\t\t5320\t7712\t2024-03-18 10:14:55\t1710756895"
+    "\tUNDEF\t3\t1\tAES-256-GCM",
+    "CLIENT_LIST\tUNDEF\t192.0.2.99:40100\t\t\t1822\t0\t2024-03-18 10:15:01\t1710756901\tUNDEF\t4\t2\tnone",
+    "HEADER\tROUTING_TABLE\tVirtual Address\tCommon Name\tReal Address\tLast Ref\tLast Ref (time_t)",
+    "ROUTING_TABLE\t10.8.0.2\talice\t203.0.113.10:51234\t2024-03-18 10:15:01\t1710756901",
+    "ROUTING_TABLE\t10.8.0.3\tbob\t198.51.100.7:1194\t2024-03-18 10:14:58\t1710756898",
+    "GLOBAL_STATS\tMax bcast/mcast queue length\t0",
+    "END",
+]
+
+# The same from OpenVPN 2.3, which has no client IDs
+STATUS_3_NO_CID = [
+    "TITLE\tOpenVPN 2.3.10 x86_64-pc-linux-gnu [SSL (OpenSSL)] [LZO] [EPOLL] [PKCS11] [MH] [IPv6]",
+    "TIME\tMon Mar 18 10:15:02 2024\t1710756902",
+    "HEADER\tCLIENT_LIST\tCommon Name\tReal Address\tVirtual Address\tBytes Received\tBytes Sent"
+    "\tConnected Since\tConnected Since (time_t)\tUsername",
+    "CLIENT_LIST\talice\t203.0.113.10:51234\t10.8.0.2\t183046\t402118\tMon Mar 18 09:58:41 2024\t1710755921\tUNDEF",
+    "END",
+]
+
+ESTABLISHED = [
+    ">CLIENT:ESTABLISHED,7",
+    ">CLIENT:ENV,n_clients=2",
+    ">CLIENT:ENV,common_name=carol",
+    ">CLIENT:ENV,trusted_ip=192.0.2.44",
+    ">CLIENT:ENV,trusted_port=40022",
+    ">CLIENT:ENV,ifconfig_pool_remote_ip=10.8.0.6",
+    ">CLIENT:ENV,time_unix=1710757000",
+    ">CLIENT:ENV,END",
+]
+
+DISCONNECT = [
+    ">CLIENT:DISCONNECT,7",
+    ">CLIENT:ENV,common_name=carol",
+    ">CLIENT:ENV,bytes_received=3000",
+    ">CLIENT:ENV,bytes_sent=2500",
+    ">CLIENT:ENV,END",
+]
+
+
+class _Client:
+    """Stands in for the management connection: always connected, answers with canned output"""
+
+    connected = True
+    generation = 1
+
+    def __init__(self, status):
+        self.status = status
+
+    def subscribe(self, callback):
+        self.notify = callback
+
+    def on_connect(self, callback):
+        self.seed = callback
+
+    def start(self):
+        pass
+
+    def wait_connected(self, timeout):
+        return True
+
+    def request(self, commands, timeout=5):
+        return [["SUCCESS: bytecount interval changed"], self.status]
+
+
+def _table(status=STATUS_3):
+    client = _Client(status)
+    table = SessionTable(client)
+    client.seed()
+    return client, table
+
+
+def test_parse_status():
+    sessions = SessionTable._parse_status(STATUS_3)
+    assert [(s.cid, s.cn) for s in sessions] == [(0, "alice"), (3, "bob")]
+    alice = sessions[0]
+    assert alice.real_address == "203.0.113.10:51234"
+    assert alice.real_ip == "203.0.113.10"
+    assert alice.virtual_address == "10.8.0.2"
+    assert (alice.bytes_received, alice.bytes_sent) == (183046, 402118)
+    assert alice.connected_since == datetime.datetime.fromtimestamp(1710755921)
+
+
+def test_parse_status_without_client_ids():
+    assert SessionTable._parse_status(STATUS_3_NO_CID) is None
+
+
+def test_seed():
+    _, table = _table()
+    assert table.live
+    assert [s.cn for s in table.sessions()] == ["alice", "bob"]
+    assert [s.cid for s in table.by_cn("bob")] == [3]
+    assert table.by_cn("carol") == []
+
+
+def test_seed_without_client_ids_is_not_live():
+    _, table = _table(STATUS_3_NO_CID)
+    assert not table.live
+    assert table.sessions() is None
+
+
+def test_established_and_disconnect():
+    client, table = _table()
+    for line in ESTABLISHED:
+        client.notify(line)
+    carol, = table.by_cn("carol")
+    assert carol.cid == 7
+    assert carol.real_address == "192.0.2.44:40022"
+    assert carol.virtual_address == "10.8.0.6"
+    assert carol.connected_since == datetime.datetime.fromtimestamp(1710757000)
+
+    for line in DISCONNECT:
+        client.notify(line)
+    assert table.by_cn("carol") == []
+    assert [s.cn for s in table.sessions()] == ["alice", "bob"]
+
+
+def test_bytecount():
+    client, table = _table()
+    for line in ESTABLISHED:
+        client.notify(line)
+    client.notify(">BYTECOUNT_CLI:7,1000,2000")
+    client.notify(">BYTECOUNT_CLI:7,3000,2500")
+    carol, = table.by_cn("carol")
+    assert (carol.bytes_received, carol.bytes_sent) == (3000, 2500)
+    assert (carol.interval_received, carol.interval_sent) == (2000, 500)
+    assert carol.interval_seconds > 0
+
+    totals = table.totals()
+    assert totals["sessions"] == 3
+    assert totals["bytes_received"] == 183046 + 5320 + 3000
+
+
+def test_address_notification():
+    client, table = _table()
+    client.notify(">CLIENT:ADDRESS,3,10.8.0.10,1")
+    bob, = table.by_cn("bob")
+    assert bob.virtual_address == "10.8.0.10"
+
+
+def test_reconcile_drops_clients_gone_without_disconnect():
+    # Without --management-client-auth OpenVPN sends no >CLIENT:DISCONNECT; the periodic status 3 catches it
+    client, table = _table()
+    client.status = [line for line in STATUS_3 if "\tbob\t" not in line]
+    table._seed(reconnected=False)
+    assert table.live
+    assert [s.cn for s in table.sessions()] == ["alice"]
+    assert table.by_cn("bob") == []